@@ -0,0 +1,100 @@
+"""Benchmark of the IVF candidate blocking.
+
+Usage (from the repository root):
+    python -m api.benchmarks.blocking [--targets 700 5000 20000] [--sources 200]
+        [--shortlist 50] [--top-k 20]
+
+Column embeddings are simulated as noisy copies of topic vectors, themselves
+grouped in domains, in 768 dimensions like the clustering model's. For every
+target dictionary size, the "full run" is the exact top-k target columns of
+each source column by cosine similarity, what an embedding matcher comparing
+all pairs returns. The report gives how many of those pairs the shortlists keep
+(recall), the share of pairs left to the matchers, and the index timings.
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from ..candidate_blocking import CandidateBlocker, shortlist_recall
+
+DIM = 768
+N_DOMAINS = 30
+TOPICS_PER_DOMAIN = 10
+
+
+def make_topics(rng: np.random.Generator) -> np.ndarray:
+    domains = rng.normal(size=(N_DOMAINS, DIM))
+    return np.repeat(domains, TOPICS_PER_DOMAIN, axis=0) + 0.8 * rng.normal(
+        size=(N_DOMAINS * TOPICS_PER_DOMAIN, DIM)
+    )
+
+
+def make_embeddings(
+    n: int, topics: np.ndarray, rng: np.random.Generator, noise: float = 0.8
+) -> np.ndarray:
+    picked = topics[rng.integers(0, len(topics), size=n)]
+    return picked + noise * rng.normal(size=(n, DIM))
+
+
+def full_run(
+    blocker: CandidateBlocker,
+    source_embeddings: np.ndarray,
+    source_columns: List[str],
+    top_k: int,
+) -> List[Dict[str, str]]:
+    ids, _ = blocker.index.exact_search(source_embeddings, top_k)
+    return [
+        {"sourceColumn": col, "targetColumn": blocker.target_columns[i]}
+        for col, row in zip(source_columns, ids)
+        for i in row
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, nargs="+", default=[700, 5000, 20000])
+    parser.add_argument("--sources", type=int, default=200)
+    parser.add_argument("--shortlist", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    topics = make_topics(rng)
+    source_embeddings = make_embeddings(args.sources, topics, rng)
+    source_columns = [f"source_{i}" for i in range(args.sources)]
+
+    print(
+        f"{'targets':>8}  {'lists':>5}  {'blocks':>6}  {'recall':>6}  "
+        f"{'pairs':>6}  {'build [s]':>9}  {'search [s]':>10}  {'exact [s]':>9}"
+    )
+    for n_targets in args.targets:
+        target_embeddings = make_embeddings(n_targets, topics, rng)
+        target_columns = [f"target_{i}" for i in range(n_targets)]
+
+        start = time.perf_counter()
+        blocker = CandidateBlocker(target_embeddings, target_columns, args.shortlist)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        shortlists = blocker.shortlists(source_embeddings, source_columns)
+        search = time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidates = full_run(blocker, source_embeddings, source_columns, args.top_k)
+        exact = time.perf_counter() - start
+
+        blocks = blocker.blocks(source_embeddings, source_columns, shortlists)
+        report = blocker.report(source_embeddings, source_columns, shortlists, blocks)
+        recall = shortlist_recall(shortlists, candidates)
+        print(
+            f"{n_targets:>8}  {report['lists']:>5}  {report['blocks']:>6}  "
+            f"{recall:>6.3f}  {report['pairRatio']:>6.3f}  {build:>9.3f}  "
+            f"{search:>10.3f}  {exact:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
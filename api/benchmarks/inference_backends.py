@@ -0,0 +1,65 @@
+"""Speed and drift of the ONNX int8 inference backend against torch.
+
+Usage (from the repository root):
+    python -m api.benchmarks.inference_backends [--source .source.csv]
+        [--model Snowflake/snowflake-arctic-embed-m]
+
+Embeds the columns of the source and of the GDC target with both backends of
+EmbeddingClusterer, the model being exported to .cache/onnx on first use,
+and prints both timings and the drift_report of the ONNX embeddings.
+Needs torch, transformers and onnxruntime.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..clusterer.embedding_clusterer import EmbeddingClusterer
+from ..clusterer.onnx_backend import drift_report
+from ..column_profile import GDC_TARGET_PROFILES, ProfileStore
+from ..matching_task import DEFAULT_PARAMS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default=".source.csv")
+    parser.add_argument("--model", default="Snowflake/snowflake-arctic-embed-m")
+    args = parser.parse_args()
+
+    source = pd.read_csv(args.source)
+    source_profiles = ProfileStore(source).build()
+    target_profiles = GDC_TARGET_PROFILES.get()
+
+    embeddings = {}
+    for backend in ["torch", "onnx"]:
+        clusterer = EmbeddingClusterer(
+            params={
+                **DEFAULT_PARAMS,
+                "embedding_model": args.model,
+                "inference_backend": backend,
+            }
+        )
+        if backend == "onnx":
+            # Export (and its drift report) outside of the timing
+            clusterer._get_embeddings(list(source.columns))
+            if clusterer.inference_backend != "onnx":
+                raise SystemExit("The ONNX backend is unavailable, see the log.")
+
+        start = time.perf_counter()
+        source_embeddings, target_embeddings = clusterer.get_embeddings(
+            source, target_profiles.df, source_profiles, target_profiles
+        )
+        seconds = time.perf_counter() - start
+        embeddings[backend] = np.vstack([source_embeddings, target_embeddings])
+        print(f"{backend:<6} {len(embeddings[backend])} columns in {seconds:.2f}s")
+
+    report = drift_report(embeddings["torch"], embeddings["onnx"])
+    for key, value in report.items():
+        value = f"{value:.4f}" if isinstance(value, float) else value
+        print(f"  {key:<18}{value}")
+
+
+if __name__ == "__main__":
+    main()
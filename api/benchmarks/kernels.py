@@ -0,0 +1,418 @@
+"""Micro-benchmarks of the hot kernels, against their reference implementations.
+
+Usage (from the repository root):
+    python -m api.benchmarks.kernels [--kernels get_samples detect_column_type]
+        [--sizes 1000 100000] [--cardinalities 10 100 1000 100000] [--repeat 5]
+        [--output kernels.json]
+
+Every kernel runs on inputs generated for each size x cardinality, skipping
+cardinalities above the size, and is timed (best of --repeat, inputs built
+and copied outside of the timings) next to its copy in references.py. Both
+results must be identical, random draws being seeded the same way: the exit
+status is 1 when any differ.
+
+What size and cardinality mean depends on the kernel:
+- column kernels (get_samples per mode, detect_column_type,
+  ColumnEncoder.encode, bucket_column): rows and distinct values per column
+- value kernels (_get_value_matching_score, _generate_value_matches): the
+  number of source and target values, size is not used
+- candidate kernels (WeightUpdater.update_weights, the status mutators):
+  candidates, and source columns they are spread over
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..clusterer.column_encoder import ColumnEncoder, sampling_modes
+from ..clusterer.utils import detect_column_types, get_samples
+from ..column_profile import ProfileStore, bucket_column
+from ..matcher.rapidfuzz_value import RapidFuzzValueMatcher
+from ..matcher_weight.weight_updater import WeightUpdater
+from ..matching_task import MatchingTask
+from . import references
+
+MATCHERS = ["candidate_quadrants", "ct_learning", "magneto_zs", "magneto_ft"]
+# Operations per candidate kernel run, like a user working through a session
+OPERATIONS = 100
+N_SAMPLES = 10
+TOKENIZER = SimpleNamespace(cls_token="[CLS]", sep_token="[SEP]", eos_token="")
+
+
+class Kernel:
+    """
+    A kernel and its reference implementation.
+
+    make_inputs(size, cardinality) builds the inputs once. prepare(inputs),
+    untimed, gives each call its own copy when the kernel mutates them, and
+    prepare_reference does the same for the reference when it differs.
+    current and reference take the prepared inputs and return results that
+    must be equal.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        make_inputs: Callable[[int, int], Any],
+        current: Callable[[Any], Any],
+        reference: Callable[[Any], Any],
+        prepare: Callable[[Any], Any] = lambda inputs: inputs,
+        prepare_reference: Optional[Callable[[Any], Any]] = None,
+        uses_size: bool = True,
+        max_cardinality: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.make_inputs = make_inputs
+        self.implementations = {
+            "current": (current, prepare),
+            "reference": (reference, prepare_reference or prepare),
+        }
+        self.uses_size = uses_size
+        self.max_cardinality = max_cardinality
+
+    def run(self, implementation: str, inputs: Any) -> Any:
+        func, prepare = self.implementations[implementation]
+        prepared = prepare(inputs)
+        # Same draws for the random sampling modes and value matching
+        np.random.seed(0)
+        random.seed(0)
+        return func(prepared)
+
+    def best_of(self, implementation: str, inputs: Any, repeat: int) -> float:
+        func, prepare = self.implementations[implementation]
+        timings = []
+        for _ in range(repeat):
+            prepared = prepare(inputs)
+            np.random.seed(0)
+            random.seed(0)
+            start = time.perf_counter()
+            func(prepared)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+
+def make_column_values(
+    size: int, cardinality: int, rng: np.random.Generator
+) -> np.ndarray:
+    """`size` draws of `cardinality` values, a few frequent and a long tail."""
+    weights = 1.0 / np.arange(1, cardinality + 1)
+    return rng.choice(cardinality, size=size, p=weights / weights.sum())
+
+
+def make_frame(size: int, cardinality: int, seed: int = 0) -> pd.DataFrame:
+    """Columns of the kinds type detection tells apart, 10% nulls in text."""
+    rng = np.random.default_rng(seed)
+    codes = make_column_values(size, cardinality, rng)
+    nulls = rng.random(size) < 0.1
+    text = np.array([f"Value {i}" for i in range(cardinality)], dtype=object)[codes]
+    text[nulls] = None
+    return pd.DataFrame(
+        {
+            "tumor_stage": text,
+            "sample_id": np.array([f"ID-{i:08d}" for i in rng.permutation(size)]),
+            "age_text": codes.astype(str).astype(object),
+            "weight_kg": (rng.normal(70, 15, size=cardinality).round(1))[codes],
+            "days_to_death": codes.astype(np.int64),
+            "gene_name": np.array([f"GENE{i}" for i in range(cardinality)])[codes],
+            "is_smoker": np.where(codes % 2 == 0, "yes", "no").astype(object),
+        }
+    )
+
+
+def make_values(cardinality: int, seed: int = 0) -> Dict[str, List[str]]:
+    """Source values and GDC-like target values, close but not identical."""
+    rng = np.random.default_rng(seed)
+    words = ["stage", "grade", "tumor", "primary", "recurrent", "normal", "unknown"]
+    source = [
+        f"{words[i % len(words)]} {i} {rng.choice(words)}".title()
+        for i in range(cardinality)
+    ]
+    target = [
+        f"{rng.choice(words)} {words[i % len(words)]} {i}" for i in range(cardinality)
+    ]
+    return {"source": source, "target": target}
+
+
+def make_candidates(size: int, cardinality: int, seed: int = 0) -> Dict[str, Any]:
+    """`size` candidates over `cardinality` source columns, and operations."""
+    rng = np.random.default_rng(seed)
+    candidates = [
+        {
+            "sourceColumn": f"source_{rng.integers(cardinality)}",
+            "targetColumn": f"target_{rng.integers(500)}",
+            "score": round(float(rng.random()), 4),
+            "matcher": MATCHERS[i % len(MATCHERS)],
+            "status": "idle",
+        }
+        for i in range(size)
+    ]
+    picked = rng.integers(0, size, size=OPERATIONS)
+    names = ["accept", "reject", "discard", "append"]
+    operations = [
+        (names[i % len(names)], candidates[index]) for i, index in enumerate(picked)
+    ]
+    return {"candidates": candidates, "operations": operations}
+
+
+class _ValueMatchingTask(MatchingTask):
+    """MatchingTask matching against given target values, not GDC enums."""
+
+    def __init__(self, target_values: List[str]) -> None:
+        super().__init__(update_matcher_weights=False)
+        self.target_values = target_values
+
+    def get_target_unique_values(self, target_col: str, n: int = 300) -> List[str]:
+        return self.target_values
+
+
+def _value_matching_task(inputs: Dict[str, List[str]]) -> MatchingTask:
+    task = _ValueMatchingTask(inputs["target"])
+    task.value_matches = {
+        "source": {"source_unique_values": inputs["source"], "targets": {}}
+    }
+    return task
+
+
+def _generate_value_matches(task: MatchingTask) -> List[str]:
+    task._generate_value_matches("source", "target", task.value_matches)
+    return task.value_matches["source"]["targets"]["target"]
+
+
+def _copy_candidates(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    candidates = [dict(candidate) for candidate in inputs["candidates"]]
+    return {**inputs, "candidates": candidates}
+
+
+def _matchers() -> Dict[str, Any]:
+    return {name: SimpleNamespace(weight=1.0) for name in MATCHERS}
+
+
+def _update_weights(inputs: Dict[str, Any]) -> List[float]:
+    matchers = inputs["matchers"]
+    updater = inputs["updater"]
+    for operation, candidate in inputs["operations"]:
+        if operation in ["accept", "reject"]:
+            updater.update_weights(
+                operation, candidate["sourceColumn"], candidate["targetColumn"]
+            )
+    return [matcher.weight for matcher in matchers.values()]
+
+
+def _prepare_weights(updater_class: type) -> Callable[[Dict], Dict]:
+    def prepare(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Built outside of the timings, once per get_candidates in the app
+        matchers = _matchers()
+        updater = updater_class(matchers, inputs["candidates"], alpha=0.1, beta=0.1)
+        return {**inputs, "matchers": matchers, "updater": updater}
+
+    return prepare
+
+
+def _status_task(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    inputs = _copy_candidates(inputs)
+    task = MatchingTask(update_matcher_weights=False)
+    task.set_cached_candidates(inputs["candidates"])
+    return {**inputs, "task": task}
+
+
+def _mutate_statuses(inputs: Dict[str, Any]) -> List[str]:
+    task = inputs["task"]
+    for operation, candidate in inputs["operations"]:
+        if operation == "accept":
+            task.accept_cached_candidate(candidate)
+        elif operation == "reject":
+            task.reject_cached_candidate(candidate)
+        elif operation == "discard":
+            task.discard_cached_column(candidate["sourceColumn"])
+        else:
+            task.append_cached_column(candidate["sourceColumn"])
+    return [candidate["status"] for candidate in task.get_cached_candidates()]
+
+
+def _mutate_statuses_reference(inputs: Dict[str, Any]) -> List[str]:
+    candidates = inputs["candidates"]
+    for operation, candidate in inputs["operations"]:
+        if operation == "accept":
+            references.accept_cached_candidate(candidates, candidate)
+        elif operation == "reject":
+            references.reject_cached_candidate(candidates, candidate)
+        elif operation == "discard":
+            references.discard_cached_column(candidates, candidate["sourceColumn"])
+        else:
+            references.append_cached_column(candidates, candidate["sourceColumn"])
+    return [candidate["status"] for candidate in candidates]
+
+
+def _encoder() -> ColumnEncoder:
+    return ColumnEncoder(
+        TOKENIZER,
+        encoding_mode="header_values_verbose",
+        sampling_mode="mixed",
+        n_samples=N_SAMPLES,
+    )
+
+
+def _encode_all(df: pd.DataFrame) -> List[str]:
+    # As EmbeddingClusterer does: profiles built once, then every column encoded
+    encoder = _encoder()
+    profiles = ProfileStore(df).build()
+    return [encoder.encode(df, col, profiles.get(col)) for col in df.columns]
+
+
+def _encode_all_reference(df: pd.DataFrame) -> List[str]:
+    encoder = _encoder()
+    return [references.encode(encoder, df, col) for col in df.columns]
+
+
+def _sample_column(size: int, cardinality: int) -> pd.Series:
+    return make_frame(size, cardinality)["tumor_stage"]
+
+
+def kernels() -> List[Kernel]:
+    result = [
+        Kernel(
+            f"get_samples[{mode}]",
+            _sample_column,
+            lambda series, mode=mode: get_samples(series, n=N_SAMPLES, mode=mode),
+            lambda series, mode=mode: references.get_samples(
+                series, n=N_SAMPLES, mode=mode
+            ),
+        )
+        for mode in sampling_modes
+    ]
+    value_matcher = RapidFuzzValueMatcher("quad_value")
+    result += [
+        Kernel(
+            "detect_column_type",
+            make_frame,
+            lambda df: list(detect_column_types(df).values()),
+            lambda df: [references.detect_column_type(df[col]) for col in df.columns],
+        ),
+        Kernel("ColumnEncoder.encode", make_frame, _encode_all, _encode_all_reference),
+        Kernel(
+            "bucket_column",
+            make_frame,
+            lambda df: [bucket_column(df[col].dropna()) for col in df.columns],
+            lambda df: [references.bucket_column(df, col) for col in df.columns],
+        ),
+        Kernel(
+            "_get_value_matching_score",
+            lambda size, cardinality: make_values(cardinality),
+            lambda values: value_matcher._get_value_matching_score(
+                values["source"], values["target"]
+            ),
+            lambda values: references.value_matching_score(
+                values["source"], values["target"]
+            ),
+            uses_size=False,
+            max_cardinality=10000,
+        ),
+        Kernel(
+            "_generate_value_matches",
+            lambda size, cardinality: make_values(cardinality),
+            _generate_value_matches,
+            lambda values: references.value_matches(values["source"], values["target"]),
+            prepare=_value_matching_task,
+            prepare_reference=lambda values: values,
+            uses_size=False,
+            # difflib compares every pair, GDC enums have at most a few hundred
+            max_cardinality=300,
+        ),
+        Kernel(
+            "WeightUpdater.update_weights",
+            make_candidates,
+            _update_weights,
+            _update_weights,
+            prepare=_prepare_weights(WeightUpdater),
+            prepare_reference=_prepare_weights(references.WeightUpdater),
+            max_cardinality=10000,
+        ),
+        Kernel(
+            "candidate status mutators",
+            make_candidates,
+            _mutate_statuses,
+            _mutate_statuses_reference,
+            prepare=_status_task,
+            prepare_reference=_copy_candidates,
+            max_cardinality=10000,
+        ),
+    ]
+    return result
+
+
+def run(
+    selected: List[Kernel], sizes: List[int], cardinalities: List[int], repeat: int
+) -> List[Dict[str, Any]]:
+    rows = []
+    for kernel in selected:
+        for size in sizes if kernel.uses_size else sizes[:1]:
+            for cardinality in cardinalities:
+                if (kernel.uses_size and cardinality > size) or (
+                    kernel.max_cardinality and cardinality > kernel.max_cardinality
+                ):
+                    continue
+                inputs = kernel.make_inputs(size, cardinality)
+                equal = kernel.run("current", inputs) == kernel.run("reference", inputs)
+                reference = kernel.best_of("reference", inputs, repeat)
+                current = kernel.best_of("current", inputs, repeat)
+                rows.append(
+                    {
+                        "kernel": kernel.name,
+                        "size": size if kernel.uses_size else None,
+                        "cardinality": cardinality,
+                        "reference_seconds": reference,
+                        "current_seconds": current,
+                        "speedup": reference / current if current else float("inf"),
+                        "equal": equal,
+                    }
+                )
+                print(
+                    f"{kernel.name:<32}{size if kernel.uses_size else '':>9}"
+                    f"{cardinality:>10}{reference:>14.5f}{current:>13.5f}"
+                    f"{rows[-1]['speedup']:>8.1f}x  {'yes' if equal else 'NO'}"
+                )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kernels", nargs="*", default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument(
+        "--cardinalities", type=int, nargs="+", default=[10, 100, 1000, 100000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    selected = [
+        kernel
+        for kernel in kernels()
+        if not args.kernels
+        or any(kernel.name.startswith(name) for name in args.kernels)
+    ]
+    print(
+        f"{'kernel':<32}{'size':>9}{'distinct':>10}{'reference [s]':>14}"
+        f"{'current [s]':>13}{'speedup':>9}  equal"
+    )
+    rows = run(selected, args.sizes, args.cardinalities, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=4)
+    different = [row for row in rows if not row["equal"]]
+    if different:
+        print(f"{len(different)} results differ from the reference implementation.")
+        sys.exit(1)
+    print("All results identical to the reference implementations.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""End-to-end benchmark of the matching pipeline, with regression thresholds.
+
+Usage (from the repository root):
+    python -m api.benchmarks.pipeline [--sources .source.csv]
+        [--widths 50 500 2000] [--heights 1000 100000] [--max-cells 100000000]
+        [--sample-rows 0] [--blocking 0] [--repeat 1]
+        [--output .cache/benchmarks/pipeline.json]
+        [--baseline .cache/benchmarks/pipeline.baseline.json] [--save-baseline]
+
+Every source, the bundled sample sources and a synthetic source per width x
+height, goes through MatchingTask.update_dataframe and get_candidates against
+the GDC target (cptac-3), cold and then from the in-memory candidate cache.
+Synthetic columns are resampled from the columns of the sample sources and of
+the target, under varied names. Hugging Face models are only loaded from the
+local cache, run the app once to download them.
+
+For every step, and every stage of candidate generation timed in
+api.metrics, the results hold the wall time, the peak RSS and the number of
+candidates (best of --repeat runs), written as JSON to --output. Against a
+baseline, stages slower or heavier than the thresholds, or whose candidate
+counts changed, are listed and the exit status is 1. Heights up to 1e7 rows
+work, with --max-cells (rows x columns) raised to fit the memory available.
+"""
+
+import argparse
+import bisect
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Before transformers is first imported: no downloads during the benchmark
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np
+import pandas as pd
+
+from ..matching_task import MatchingTask
+from ..metrics import MATCHER_SECONDS, SPAN_LISTENERS, STAGE_SECONDS
+from ..utils import CACHE_DIR, SOURCE_CSV_PATH, load_gdc_target
+
+BENCHMARK_DIR = os.path.join(CACHE_DIR, "benchmarks")
+RSS_INTERVAL = 0.02
+# Regressions are relative to the baseline, and ignored below the minimums
+TIME_THRESHOLD = 0.25
+MEMORY_THRESHOLD = 0.2
+MIN_SECONDS_DELTA = 0.5
+MIN_RSS_MB_DELTA = 64
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # Not Linux: the peak so far instead, in bytes on macOS and kB elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class RssMonitor:
+    """RSS of the process sampled in the background, for peak_rss of any span."""
+
+    def __init__(self, interval: float = RSS_INTERVAL) -> None:
+        self.interval = interval
+        self.times: List[float] = []
+        self.values: List[float] = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "RssMonitor":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self) -> None:
+        rss = current_rss_mb()
+        with self.lock:
+            self.times.append(time.perf_counter())
+            self.values.append(rss)
+
+    def peak_rss(self, start: float, end: float) -> float:
+        """Peak between start and end, from the last sample before start."""
+        self.sample()
+        with self.lock:
+            first = max(bisect.bisect_left(self.times, start) - 1, 0)
+            last = bisect.bisect_right(self.times, end)
+            return max(self.values[first:max(last, first + 1)])
+
+    def _run(self) -> None:
+        while True:
+            self.sample()
+            if self.stopped.wait(self.interval):
+                return
+
+
+class OfflineMatchingTask(MatchingTask):
+    """MatchingTask leaving the app's matching_results.json alone, so every
+    cold run generates the candidates."""
+
+    def _export_cache_to_json(self, json_obj: Dict) -> None:
+        pass
+
+    def _import_cache_from_json(self) -> Optional[Dict]:
+        return None
+
+
+def synthetic_source(
+    pool: Dict[str, np.ndarray], width: int, height: int, seed: int = 0
+) -> pd.DataFrame:
+    """
+    `width` columns of `height` rows, each resampled (with its nulls) from a
+    column of `pool`. Pool columns are reused under varied names once all
+    were taken, e.g. "tumor_grade" then "tumor grade 1".
+    """
+    rng = np.random.default_rng(seed)
+    names = [list(pool)[i] for i in rng.permutation(len(pool))]
+    columns = {}
+    for i in range(width):
+        name = names[i % len(names)]
+        values = pool[name]
+        repeat = i // len(names)
+        if repeat:
+            name = f"{name.replace('_', ' ')} {repeat}"
+        columns[name] = values[rng.integers(0, len(values), size=height)]
+    return pd.DataFrame(columns)
+
+
+def column_pool(frames: List[pd.DataFrame]) -> Dict[str, np.ndarray]:
+    pool = {}
+    for df in frames:
+        for column in df.columns:
+            if column not in pool:
+                pool[column] = df[column].to_numpy()
+    return pool
+
+
+def run_case(
+    source: pd.DataFrame, target: pd.DataFrame, monitor: RssMonitor, task_params: Dict
+) -> Dict[str, Dict[str, Any]]:
+    """The stages of one update_dataframe + get_candidates (cold, cached) run."""
+    stages: Dict[str, Dict[str, Any]] = {}
+    step = [None]
+
+    def record(stage: str, start: float, end: float) -> Dict[str, Any]:
+        entry = stages.setdefault(stage, {"seconds": 0.0, "peak_rss_mb": 0.0})
+        # A matcher runs once per block
+        entry["seconds"] += end - start
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], monitor.peak_rss(start, end))
+        return entry
+
+    def on_span(metric: str, labels: Dict[str, str], start: float, end: float):
+        if step[0] != "get_candidates":
+            return
+        if metric == STAGE_SECONDS.name:
+            record(labels["stage"], start, end)
+        elif metric == MATCHER_SECONDS.name:
+            record(f"matcher:{labels['matcher']}", start, end)
+
+    task = OfflineMatchingTask(**task_params)
+    SPAN_LISTENERS.append(on_span)
+    try:
+        for name, call in [
+            ("update_dataframe", lambda: task.update_dataframe(source, target)),
+            ("get_candidates", lambda: task.get_candidates()),
+            ("get_candidates_cached", lambda: task.get_candidates()),
+        ]:
+            step[0] = name
+            start = time.perf_counter()
+            result = call()
+            entry = record(name, start, time.perf_counter())
+            if result is not None:
+                entry["candidates"] = len(result)
+            if name == "get_candidates":
+                by_matcher = Counter(candidate["matcher"] for candidate in result)
+                for matcher, count in by_matcher.items():
+                    stage = (
+                        "quadrants"
+                        if matcher == "candidate_quadrants"
+                        else f"matcher:{matcher}"
+                    )
+                    if stage in stages:
+                        stages[stage]["candidates"] = count
+    finally:
+        SPAN_LISTENERS.remove(on_span)
+        del task
+        gc.collect()
+    return stages
+
+
+def best_of(runs: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    stages = {}
+    for stage in runs[0]:
+        entries = [run[stage] for run in runs if stage in run]
+        stages[stage] = {
+            **entries[0],
+            "seconds": min(entry["seconds"] for entry in entries),
+            "peak_rss_mb": min(entry["peak_rss_mb"] for entry in entries),
+        }
+    return stages
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    time_threshold: float = TIME_THRESHOLD,
+    memory_threshold: float = MEMORY_THRESHOLD,
+) -> List[str]:
+    """The regressions of `results` against `baseline`, one line each."""
+    regressions = []
+    for case, result in results["cases"].items():
+        base_stages = baseline["cases"].get(case, {}).get("stages", {})
+        for stage, entry in result["stages"].items():
+            base = base_stages.get(stage)
+            if base is None:
+                continue
+            seconds, base_seconds = entry["seconds"], base["seconds"]
+            if (
+                seconds > base_seconds * (1 + time_threshold)
+                and seconds - base_seconds > MIN_SECONDS_DELTA
+            ):
+                regressions.append(
+                    f"{case} {stage}: {base_seconds:.2f}s -> {seconds:.2f}s"
+                )
+            rss, base_rss = entry["peak_rss_mb"], base["peak_rss_mb"]
+            if (
+                rss > base_rss * (1 + memory_threshold)
+                and rss - base_rss > MIN_RSS_MB_DELTA
+            ):
+                regressions.append(f"{case} {stage}: {base_rss:.0f}MB -> {rss:.0f}MB")
+            if "candidates" in base and entry.get("candidates") != base["candidates"]:
+                regressions.append(
+                    f"{case} {stage}: {base['candidates']} -> "
+                    f"{entry.get('candidates')} candidates"
+                )
+    return regressions
+
+
+def cases(
+    sources: List[str],
+    target: pd.DataFrame,
+    widths: List[int],
+    heights: List[int],
+    max_cells: int,
+) -> List[Tuple[str, pd.DataFrame]]:
+    samples = [(os.path.basename(path), pd.read_csv(path)) for path in sources]
+    result = list(samples)
+    pool = column_pool([df for _, df in samples] + [target])
+    for width in widths:
+        for height in heights:
+            if width * height > max_cells:
+                print(f"Skipping {width} columns x {height} rows, above --max-cells")
+                continue
+            name = f"synthetic-{width}x{height}"
+            result.append((name, synthetic_source(pool, width, height)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", nargs="*", default=[SOURCE_CSV_PATH])
+    parser.add_argument("--widths", type=int, nargs="*", default=[50, 500, 2000])
+    parser.add_argument("--heights", type=int, nargs="*", default=[1000, 100000])
+    parser.add_argument("--max-cells", type=int, default=100_000_000)
+    parser.add_argument("--sample-rows", type=int, default=0)
+    parser.add_argument("--blocking", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--output", default=os.path.join(BENCHMARK_DIR, "pipeline.json")
+    )
+    parser.add_argument(
+        "--baseline", default=os.path.join(BENCHMARK_DIR, "pipeline.baseline.json")
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    args = parser.parse_args()
+
+    task_params = {
+        "profile_sample_size": args.sample_rows,
+        "blocking_shortlist_size": args.blocking,
+    }
+    target = load_gdc_target()
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": task_params,
+        },
+        "cases": {},
+    }
+
+    with RssMonitor() as monitor:
+        # Load the models and the target profiles outside of the timings
+        run_case(pd.read_csv(args.sources[0]).head(20), target, monitor, task_params)
+
+        for name, source in cases(
+            args.sources, target, args.widths, args.heights, args.max_cells
+        ):
+            print(f"\n{name}: {source.shape[1]} columns x {source.shape[0]} rows")
+            stages = best_of(
+                [
+                    run_case(source, target, monitor, task_params)
+                    for _ in range(args.repeat)
+                ]
+            )
+            results["cases"][name] = {
+                "rows": source.shape[0],
+                "columns": source.shape[1],
+                "stages": stages,
+            }
+            print(f"  {'stage':<30}{'seconds':>10}  {'peak RSS [MB]':>13}  candidates")
+            for stage, entry in stages.items():
+                print(
+                    f"  {stage:<30}{entry['seconds']:>10.2f}  "
+                    f"{entry['peak_rss_mb']:>13.0f}  {entry.get('candidates', '')}"
+                )
+            del source
+            gc.collect()
+
+    path = args.baseline if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {path}")
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"]["params"] != task_params:
+        print(f"Warning: the baseline was run with {baseline['meta']['params']}")
+    regressions = compare(
+        results, baseline, args.time_threshold, args.memory_threshold
+    )
+    if regressions:
+        print(f"{len(regressions)} regressions against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Reference implementations of the kernels benchmarked in kernels.py.
+
+Copies of the code as it was before each kernel was optimized (or, for the
+kernels not optimized yet, as it is now), kept unchanged so that every
+optimization is timed against, and checked equivalent to, the original.
+Do not optimize these.
+"""
+
+import difflib
+import logging
+import random
+from typing import Any, Dict, List, Tuple
+
+import mmh3
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, utils
+
+from ..clusterer.constants import KEY_REPRESENTATIONS
+from ..clusterer.utils import fibonacci_hash, is_binary_value
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+
+def get_samples(values, n=15, mode="priority_sampling"):
+    """clusterer.utils.get_samples, counting the values itself."""
+    unique_values = values.dropna().unique()
+    total_unique = len(unique_values)
+
+    # If total unique values are fewer than n, return them all
+    if total_unique <= n:
+        return sorted([str(val) for val in unique_values])
+
+    if mode == "random":
+        # Completely random sampling
+        random_indices = np.random.choice(total_unique, size=n, replace=False)
+        sampled_values = unique_values[random_indices]
+        tokens = sorted(sampled_values)
+
+    elif mode == "frequent":
+        # Only most frequent values
+        value_counts = values.dropna().value_counts()
+        tokens = value_counts.head(n).index.tolist()
+        tokens.sort()
+
+    elif mode == "mixed":
+        # Mix of most frequent and evenly spaced values
+        n_frequent = n // 2
+        value_counts = values.dropna().value_counts()
+        most_frequent_values = value_counts.head(n_frequent).index.tolist()
+
+        # Calculate evenly spaced samples for diversity
+        n_diverse = n - n_frequent
+        spacing_interval = max(1, total_unique // n_diverse)
+        diverse_values = unique_values[::spacing_interval][:n_diverse]
+
+        # Combine frequent and diverse samples, remove duplicates
+        tokens = sorted(set(map(str, most_frequent_values + list(diverse_values))))
+
+    elif mode == "weighted":
+        # Weighted sampling based on value counts
+        value_counts = values.dropna().value_counts(sort=False)
+        weights = value_counts / value_counts.sum()
+        sampled_indices = np.random.choice(
+            total_unique, size=n, replace=False, p=weights
+        )
+        sampled_values = unique_values[sampled_indices]
+        tokens = sampled_values
+
+    elif mode == "priority_sampling":
+        value_counts = values.dropna().value_counts(sort=False)
+
+        # Calculate priorities: qi = freq / hash(value)
+        priorities = pd.Series(
+            {
+                val: freq / fibonacci_hash(mmh3.hash(str(val), 42))
+                for val, freq in value_counts.items()
+            }
+        )
+
+        # Select the top elements based on priority scores
+        sampled_values = priorities.nlargest(n).index.tolist()
+        tokens = sampled_values
+
+    elif mode == "consistent_sampling":
+        value_counts = values.dropna().value_counts(sort=False)
+
+        priorities = pd.Series(
+            {
+                val: fibonacci_hash(mmh3.hash(str(val), 42))
+                for val in value_counts.keys()
+            }
+        )
+
+        # Select the top elements based on priority scores
+        sampled_values = priorities.nlargest(n).index.tolist()
+        tokens = sampled_values
+
+    else:
+        raise ValueError(f"Unsupported mode: {mode}.")
+
+    return [str(token) for token in tokens]
+
+
+def detect_column_type(col, key_threshold=0.8, numeric_threshold=0.90):
+    """clusterer.utils.detect_column_type, one column at a time."""
+    # Try converting to numeric (int or float)
+    temp_col = pd.to_numeric(col, errors="coerce")
+    if not temp_col.isnull().all():
+        return "numerical"
+
+    if "gene" in col.name.lower():
+        return "gene"
+
+    if "date" in col.name.lower():
+        return "date"
+
+    unique_values = col.dropna().unique()
+    if len(unique_values) / len(col) > key_threshold and col.dtype not in [
+        np.float64,
+        np.float32,
+        np.float16,
+    ]:
+        # columns with many distinct values are considered as "keys"
+        return "key"
+
+    if len(unique_values) == 0:
+        return "unknown"
+
+    col_name = col.name.lower()
+    if any(
+        col_name.startswith(rep) or col_name.endswith(rep)
+        for rep in KEY_REPRESENTATIONS
+    ):
+        return "key"
+
+    if col.dtype in [np.float64, np.int64]:
+        return "numerical"
+
+    numeric_unique_values = pd.Series(pd.to_numeric(unique_values, errors="coerce"))
+    numeric_unique_values = numeric_unique_values.dropna()
+
+    if not numeric_unique_values.empty:
+        if len(numeric_unique_values) / len(unique_values) > numeric_threshold:
+            if len(numeric_unique_values) > 2:
+                return "numerical"
+            else:
+                unique_values_as_int = set(map(int, unique_values))
+                if unique_values_as_int.issubset({0, 1}):
+                    return "binary"
+                else:
+                    return "numerical"
+
+    if len(unique_values) == 2 and all(is_binary_value(val) for val in unique_values):
+        return "binary"
+    else:
+        return "categorical"
+
+
+def encode(encoder, df: pd.DataFrame, col: str) -> str:
+    """ColumnEncoder.encode without a ColumnProfile."""
+    tokens = get_samples(df[col], n=encoder.n_samples, mode=encoder.sampling_mode)
+    data_type = detect_column_type(df[col])
+    return encoder._serialization_methods[encoder.encoding_mode](
+        col, data_type, tokens
+    )
+
+
+def bucket_column(df: pd.DataFrame, col: str) -> List[Dict[str, Any]]:
+    """MatchingTask._bucket_column, which column_profile.bucket_column replaced."""
+    col_obj = df[col].dropna()
+    if col_obj.dtype in ["object", "category", "bool"]:
+        counter = col_obj.value_counts()[:10].to_dict()
+        return [
+            {"value": str(key), "count": int(value)}
+            for key, value in counter.items()
+            if value >= 1
+        ]
+    elif col_obj.dtype in ["int64", "float64"]:
+        col_obj = col_obj.dropna()  # Drop NaN values
+        if len(col_obj) == 0:
+            return []
+        unique_vals = col_obj.unique()
+        # If the integer column has few unique values, treat it as categorical
+        if col_obj.dtype == "int64" and len(unique_vals) <= 10:
+            counter = col_obj.value_counts().sort_index()
+            return [
+                {"value": str(val), "count": int(count)}
+                for val, count in counter.items()
+            ]
+        else:
+            min_val = col_obj.min()
+            max_val = col_obj.max()
+            bins = np.linspace(min_val, max_val, num=10)
+            counter = np.histogram(col_obj, bins=bins)[0]
+            if col_obj.dtype == "float64":
+                return [
+                    {
+                        "value": f"{bins[i]:.2f}-{bins[i+1]:.2f}",
+                        "count": int(counter[i]),
+                    }
+                    for i in range(len(counter))
+                ]
+            else:
+                return [
+                    {
+                        "value": f"{int(bins[i])}-{int(bins[i+1])}",
+                        "count": int(counter[i]),
+                    }
+                    for i in range(len(counter))
+                ]
+    else:
+        logger.warning(f"Column {col} is of type {col_obj.dtype}.")
+        return []
+
+
+def value_matching_score(source_values: List, target_values: List) -> float:
+    """RapidFuzzValueMatcher._get_value_matching_score."""
+    if len(target_values) >= 50:
+        target_values = random.sample(target_values, 50)
+
+    total_score = 0
+
+    for source_v in source_values:
+        scores = [
+            fuzz.ratio(source_v, target_v, processor=utils.default_process) / 100
+            for target_v in target_values
+        ]
+        max_score = max(scores)
+
+        total_score += max_score
+    return total_score / len(source_values)
+
+
+def value_matches(source_values: List[str], target_values: List[str]) -> List[str]:
+    """The "To" values of MatchingTask._generate_value_matches."""
+    matches = []
+    for source_v in source_values:
+        best_matches = difflib.get_close_matches(
+            source_v.lower(),
+            [val.lower() for val in target_values],
+            n=1,
+            cutoff=0.1,
+        )
+        if best_matches:
+            best_match_index = [val.lower() for val in target_values].index(
+                best_matches[0]
+            )
+            matches.append(target_values[best_match_index])
+        else:
+            matches.append("")
+    return matches
+
+
+class WeightUpdater:
+    """matcher_weight.WeightUpdater."""
+
+    def __init__(
+        self,
+        matchers: Dict[str, Any],
+        candidates: List[Dict[str, Any]],
+        alpha: float = 0.5,
+        beta: float = 0.5,
+    ):
+        self.matchers = matchers
+        self.alpha = alpha
+        self.beta = beta
+
+        self.candidates = self._preprocess_candidates(candidates)
+        self._normalize_weights()
+
+    def update_weights(self, operation: str, source_column: str, target_column: str):
+        if operation == "accept":
+            self._handle_accept(source_column, target_column)
+        elif operation == "reject":
+            self._handle_reject(source_column, target_column)
+
+    def _handle_accept(self, source_column: str, target_column: str):
+        for matcher, candidates in self.candidates.items():
+            if matcher not in self.matchers:
+                continue
+            for rank, candidate in enumerate(candidates):
+                if candidate[0] == source_column and candidate[1] == target_column:
+                    logger.info(
+                        f"[Accept] Updating weight for matcher {matcher} "
+                        f"from {self.matchers[matcher].weight}....."
+                    )
+                    self.matchers[matcher].weight += (
+                        self.alpha * candidate[2] / (rank + 1)
+                    )
+                    logger.info(
+                        f"[Accept] Updated weight for matcher {matcher} "
+                        f"to {self.matchers[matcher].weight}"
+                    )
+                    break
+        self._normalize_weights()
+
+    def _handle_reject(self, source_column: str, target_column: str):
+        for matcher, candidates in self.candidates.items():
+            if matcher not in self.matchers:
+                continue
+            for rank, candidate in enumerate(candidates):
+                if candidate[0] == source_column and candidate[1] == target_column:
+                    logger.info(
+                        f"[Reject] Updating weight for matcher {matcher} "
+                        f"from {self.matchers[matcher].weight}....."
+                    )
+                    self.matchers[matcher].weight -= (
+                        self.beta * candidate[2] / (rank + 1)
+                    )
+                    logger.info(
+                        f"[Reject] Updated weight for matcher {matcher} "
+                        f"to {self.matchers[matcher].weight}"
+                    )
+                    break
+        self._normalize_weights()
+
+    def _normalize_weights(self):
+        total_weight = sum([matcher.weight for matcher in self.matchers.values()])
+        for matcher in self.matchers.values():
+            matcher.weight /= total_weight
+
+    def _preprocess_candidates(
+        self, candidates: List[Dict[str, Any]]
+    ) -> Dict[str, List[Tuple[str, str, float]]]:
+        processed_candidates = {}
+        for candidate in candidates:
+            matcher = candidate["matcher"]
+            if matcher not in processed_candidates:
+                processed_candidates[matcher] = []
+            processed_candidates[matcher].append(
+                [
+                    candidate["sourceColumn"],
+                    candidate["targetColumn"],
+                    candidate["score"],
+                ]
+            )
+
+        for matcher, candidates in processed_candidates.items():
+            processed_candidates[matcher] = sorted(
+                candidates, key=lambda x: x[2], reverse=True
+            )
+
+        return processed_candidates
+
+
+# The MatchingTask status mutators, on a list of candidates. Each returns the
+# candidates that changed.
+
+
+def accept_cached_candidate(
+    cached_candidates: List[Dict[str, Any]], candidate: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    changed = []
+    for cached_candidate in cached_candidates:
+        if (
+            cached_candidate["sourceColumn"] == candidate["sourceColumn"]
+            and cached_candidate["targetColumn"] == candidate["targetColumn"]
+        ):
+            cached_candidate["status"] = "accepted"
+            changed.append(cached_candidate)
+    return changed
+
+
+def reject_cached_candidate(
+    cached_candidates: List[Dict[str, Any]], candidate: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    changed = []
+    for cached_candidate in cached_candidates:
+        if (
+            cached_candidate["sourceColumn"] == candidate["sourceColumn"]
+            and cached_candidate["targetColumn"] == candidate["targetColumn"]
+        ):
+            cached_candidate["status"] = "rejected"
+            changed.append(cached_candidate)
+    return changed
+
+
+def discard_cached_column(
+    cached_candidates: List[Dict[str, Any]], source_col: str
+) -> List[Dict[str, Any]]:
+    changed = []
+    for candidate in cached_candidates:
+        if candidate["sourceColumn"] == source_col:
+            candidate["status"] = "discarded"
+            changed.append(candidate)
+    return changed
+
+
+def append_cached_column(
+    cached_candidates: List[Dict[str, Any]], column_name: str
+) -> List[Dict[str, Any]]:
+    changed = []
+    for candidate in cached_candidates:
+        if (
+            column_name == candidate["sourceColumn"]
+            and candidate["status"] == "discarded"
+        ):
+            if candidate["matcher"] in ["candidate_quadrants"]:
+                candidate["status"] = "accepted"
+            else:
+                candidate["status"] = "idle"
+            changed.append(candidate)
+    return changed
@@ -0,0 +1,128 @@
+"""Benchmark of the hash-based sampling modes of get_samples.
+
+Usage (from the repository root):
+    python -m api.benchmarks.sampling [--sizes 1000 100000 1000000] [--repeat 3]
+
+For each column size, the vectorized sampler is timed against the previous
+per-value implementation (a dict of one priority per distinct value, then
+pd.Series.nlargest), and both outputs are checked to be identical. Both get
+the value counts precomputed, as ColumnProfile.samples passes them, so the
+timings cover hashing and top-n selection only.
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import mmh3
+import numpy as np
+import pandas as pd
+
+from ..clusterer.utils import SAMPLING_HASH_SEED, fibonacci_hash, get_samples
+
+MODES = ["priority_sampling", "consistent_sampling"]
+
+
+def legacy_get_samples(counts: pd.Series, n: int, mode: str) -> List[str]:
+    """The per-value sampler that get_samples replaced, kept as the reference."""
+    if mode == "priority_sampling":
+        priorities = pd.Series(
+            {
+                val: freq / fibonacci_hash(mmh3.hash(str(val), SAMPLING_HASH_SEED))
+                for val, freq in counts.items()
+            }
+        )
+    else:
+        priorities = pd.Series(
+            {
+                val: fibonacci_hash(mmh3.hash(str(val), SAMPLING_HASH_SEED))
+                for val in counts.keys()
+            }
+        )
+    return [str(token) for token in priorities.nlargest(n).index.tolist()]
+
+
+def make_columns(size: int, seed: int = 0) -> Dict[str, pd.Series]:
+    """ID-like, float, skewed categorical and unicode columns with `size` rows."""
+    rng = np.random.default_rng(seed)
+    return {
+        "ids": pd.Series([f"ID-{i:08d}" for i in rng.permutation(size)]),
+        "floats": pd.Series(rng.normal(size=size).round(4)),
+        "skewed": pd.Series([f"category_{i}" for i in rng.zipf(1.5, size=size) % 5000]),
+        "unicode": pd.Series(
+            [f"échantillon-{i % (size // 2 + 1)}-€" for i in range(size)]
+        ),
+    }
+
+
+def best_of(func: Callable[[], List[str]], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes: List[int], n: int = 15, repeat: int = 3) -> List[Dict]:
+    rows = []
+    for size in sizes:
+        for name, values in make_columns(size).items():
+            non_null = values.dropna()
+            unique_values = non_null.unique()
+            counts = non_null.value_counts(sort=False)
+
+            def sample(mode: str) -> List[str]:
+                return get_samples(
+                    None,
+                    n=n,
+                    mode=mode,
+                    unique_values=unique_values,
+                    value_counts=counts,
+                )
+
+            for mode in MODES:
+                expected = legacy_get_samples(counts, n, mode)
+                actual = sample(mode)
+                if actual != expected:
+                    raise AssertionError(
+                        f"{mode} on {name} ({size} rows) differs from the reference:\n"
+                        f"{actual}\n{expected}"
+                    )
+                legacy = best_of(lambda: legacy_get_samples(counts, n, mode), repeat)
+                vectorized = best_of(lambda: sample(mode), repeat)
+                rows.append(
+                    {
+                        "size": size,
+                        "column": name,
+                        "distinct": len(counts),
+                        "mode": mode,
+                        "legacy_seconds": legacy,
+                        "vectorized_seconds": vectorized,
+                        "speedup": legacy / vectorized,
+                    }
+                )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--n", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>9}  {'column':<8}  {'distinct':>9}  {'mode':<20}"
+        f"{'legacy [s]':>11}  {'vectorized [s]':>14}  {'speedup':>8}"
+    )
+    for row in run(args.sizes, args.n, args.repeat):
+        print(
+            f"{row['size']:>9}  {row['column']:<8}  {row['distinct']:>9}  {row['mode']:<20}"
+            f"{row['legacy_seconds']:>11.4f}  {row['vectorized_seconds']:>14.4f}  {row['speedup']:>7.1f}x"
+        )
+    print("All samples identical to the reference implementation.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+from .candidate_blocker import (
+    DEFAULT_SHORTLIST_SIZE,
+    CandidateBlocker,
+    shortlist_recall,
+)
+from .ivf_index import IVFIndex
@@ -0,0 +1,141 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .ivf_index import IVFIndex, normalize
+
+DEFAULT_SHORTLIST_SIZE = 50
+# A block's target columns, the union of its shortlists, stay below this
+# many shortlists
+MAX_BLOCK_SHORTLISTS = 8
+
+# (source columns, target columns) that a matcher is run on together
+Block = Tuple[List[str], List[str]]
+
+
+class CandidateBlocker:
+    """
+    Pre-selects the target columns each source column is matched against.
+
+    An IVFIndex over the target column embeddings gives every source column
+    a shortlist of its `shortlist_size` nearest target columns. Matchers
+    compare whole DataFrames, so source columns are then grouped into blocks
+    by their closest IVF list, and each block is matched against the union
+    of its shortlists only. Matching cost becomes roughly
+    source columns x (block union) instead of source x target columns.
+    """
+
+    def __init__(
+        self,
+        target_embeddings: np.ndarray,
+        target_columns: List[str],
+        shortlist_size: int = DEFAULT_SHORTLIST_SIZE,
+        n_lists: Optional[int] = None,
+        n_probe: Optional[int] = None,
+    ) -> None:
+        if len(target_embeddings) != len(target_columns):
+            raise ValueError(
+                f"Got {len(target_embeddings)} embeddings for "
+                f"{len(target_columns)} target columns."
+            )
+        self.target_columns = list(target_columns)
+        self.shortlist_size = min(shortlist_size, len(self.target_columns))
+        self.index = IVFIndex(target_embeddings, n_lists=n_lists, n_probe=n_probe)
+
+    def shortlists(
+        self, source_embeddings: np.ndarray, source_columns: List[str]
+    ) -> Dict[str, List[str]]:
+        """The nearest target columns of every source column, best first."""
+        ids, _ = self.index.search(source_embeddings, self.shortlist_size)
+        return {
+            source_col: [self.target_columns[i] for i in row]
+            for source_col, row in zip(source_columns, ids)
+        }
+
+    def blocks(
+        self,
+        source_embeddings: np.ndarray,
+        source_columns: List[str],
+        shortlists: Optional[Dict[str, List[str]]] = None,
+    ) -> List[Block]:
+        """
+        Source columns grouped by their closest IVF list, with the target
+        columns of their shortlists. Groups of neighbouring lists are merged
+        while the union of their shortlists stays small, to keep the number of
+        matcher runs low.
+
+        Returns:
+            List[Block]: (source columns, target columns) pairs, together
+            covering every source column once.
+        """
+        if shortlists is None:
+            shortlists = self.shortlists(source_embeddings, source_columns)
+        primary = (normalize(source_embeddings) @ self.index.centroids.T).argmax(
+            axis=1
+        )
+
+        max_targets = MAX_BLOCK_SHORTLISTS * self.shortlist_size
+        blocks: List[Block] = []
+        sources: List[str] = []
+        targets: Dict[str, None] = {}
+        for list_id in np.unique(primary):
+            group = [col for col, p in zip(source_columns, primary) if p == list_id]
+            group_targets = dict.fromkeys(
+                target_col for col in group for target_col in shortlists[col]
+            )
+            if sources and len({**targets, **group_targets}) > max_targets:
+                blocks.append((sources, list(targets)))
+                sources, targets = [], {}
+            sources.extend(group)
+            targets.update(group_targets)
+        if sources:
+            blocks.append((sources, list(targets)))
+        return blocks
+
+    def report(
+        self,
+        source_embeddings: np.ndarray,
+        source_columns: List[str],
+        shortlists: Dict[str, List[str]],
+        blocks: List[Block],
+        recall_k: int = 10,
+    ) -> Dict[str, Any]:
+        """
+        How much the blocking saves and what it may miss:
+        - recall: mean fraction of the exact `recall_k` nearest target columns
+          of a source column that are in its shortlist
+        - pairRatio: (source, target) pairs left to the matchers, relative to
+          every pair
+        """
+        exact, _ = self.index.exact_search(source_embeddings, recall_k)
+        hits = sum(
+            len(set(shortlists[col]) & {self.target_columns[i] for i in row})
+            for col, row in zip(source_columns, exact)
+        )
+        pairs = sum(len(sources) * len(targets) for sources, targets in blocks)
+        all_pairs = len(source_columns) * len(self.target_columns)
+        return {
+            "shortlistSize": self.shortlist_size,
+            "lists": self.index.n_lists,
+            "blocks": len(blocks),
+            "recall": hits / max(1, exact.size),
+            "pairs": pairs,
+            "pairRatio": pairs / max(1, all_pairs),
+        }
+
+
+def shortlist_recall(
+    shortlists: Dict[str, List[str]], candidates: List[Dict[str, Any]]
+) -> float:
+    """
+    Fraction of the candidates of a full (unblocked) run whose target column
+    is in the shortlist of their source column.
+    """
+    pairs = {(c["sourceColumn"], c["targetColumn"]) for c in candidates}
+    if not pairs:
+        return 1.0
+    hits = sum(
+        target_col in shortlists.get(source_col, ())
+        for source_col, target_col in pairs
+    )
+    return hits / len(pairs)
@@ -0,0 +1,167 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+IVF_SEED = 42
+
+
+class IVFIndex:
+    """
+    Inverted file index for approximate cosine nearest neighbours, in numpy.
+
+    The vectors are partitioned into `n_lists` lists by spherical KMeans. A
+    query only scores the vectors of the `n_probe` lists whose centroids are
+    closest to it, instead of every vector. Defaults: sqrt(n) lists, a
+    quarter of them probed.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: Optional[int] = None,
+        seed: int = IVF_SEED,
+    ) -> None:
+        self.vectors = normalize(vectors)
+        n_lists = n_lists or int(round(np.sqrt(len(self.vectors))))
+        n_lists = max(1, min(n_lists, len(self.vectors)))
+        self.n_probe = max(1, min(n_probe or n_lists // 4, n_lists))
+
+        self.centroids, labels = spherical_kmeans(self.vectors, n_lists, seed=seed)
+        # Vector ids grouped by list, list i is ids[offsets[i]:offsets[i + 1]],
+        # and the vectors in the same order so that a list is a contiguous slice
+        self.ids = np.argsort(labels, kind="stable")
+        self.offsets = np.searchsorted(labels[self.ids], np.arange(n_lists + 1))
+        self.list_vectors = self.vectors[self.ids]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def search(
+        self, queries: np.ndarray, k: int, n_probe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k nearest vectors of every query. More than n_probe lists are
+        probed when those do not hold k vectors.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: ids and cosine similarities, both of
+            shape (len(queries), k), best first.
+        """
+        queries = normalize(queries)
+        k = min(k, len(self.vectors))
+        n_probe = n_probe or self.n_probe
+        list_sizes = np.diff(self.offsets)
+
+        # Lists to probe per query: the n_probe closest, more until k vectors
+        list_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+        covered = np.cumsum(list_sizes[list_order], axis=1)
+        n_probes = np.maximum(n_probe, (covered < k).sum(axis=1) + 1)
+        probed = np.zeros((len(queries), self.n_lists), dtype=bool)
+        for i, order in enumerate(list_order):
+            probed[i, order[: n_probes[i]]] = True
+
+        # Score list by list, every query probing a list at once
+        id_parts = [[] for _ in range(len(queries))]
+        score_parts = [[] for _ in range(len(queries))]
+        for l in range(self.n_lists):
+            query_ids = np.flatnonzero(probed[:, l])
+            if len(query_ids) == 0:
+                continue
+            start, end = self.offsets[l], self.offsets[l + 1]
+            list_scores = queries[query_ids] @ self.list_vectors[start:end].T
+            for q, row in zip(query_ids, list_scores):
+                id_parts[q].append(self.ids[start:end])
+                score_parts[q].append(row)
+
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for q in range(len(queries)):
+            ids[q], scores[q] = _top_k(
+                np.concatenate(id_parts[q]), np.concatenate(score_parts[q]), k
+            )
+        return ids, scores
+
+    def exact_search(
+        self, queries: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force counterpart of search, the reference for recall."""
+        queries = normalize(queries)
+        k = min(k, len(self.vectors))
+        similarities = queries @ self.vectors.T
+        ids = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarities, ids, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(ids, order, axis=1),
+            np.take_along_axis(scores, order, axis=1),
+        )
+
+    def recall(self, queries: np.ndarray, k: int) -> float:
+        """Mean fraction of the exact k nearest neighbours that search finds."""
+        if len(queries) == 0:
+            return 1.0
+        approximate, _ = self.search(queries, k)
+        exact, _ = self.exact_search(queries, k)
+        hits = sum(
+            len(np.intersect1d(a, e, assume_unique=True))
+            for a, e in zip(approximate, exact)
+        )
+        return hits / exact.size
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, k: int, n_iter: int = 20, seed: int = IVF_SEED
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    KMeans on the unit sphere (cosine similarity) of normalized vectors.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The normalized centroids, shape (k, dim),
+        and the list of every vector.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    labels = np.full(len(vectors), -1)
+    for _ in range(n_iter):
+        similarities = vectors @ centroids.T
+        new_labels = similarities.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        counts = np.bincount(labels, minlength=k)
+        starts = np.cumsum(counts) - counts
+        nonempty = np.flatnonzero(counts)
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(
+            vectors[np.argsort(labels, kind="stable")], starts[nonempty], axis=0
+        )
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed empty lists with the vectors farthest from their centroid
+            farthest = np.argsort(similarities[np.arange(len(vectors)), labels])
+            sums[empty] = vectors[farthest[: len(empty)]]
+            labels[farthest[: len(empty)]] = empty
+        centroids = normalize(sums)
+    return centroids, labels
+
+
+def _top_k(
+    ids: np.ndarray, scores: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    if len(ids) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[top], scores[top]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
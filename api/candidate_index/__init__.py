@@ -0,0 +1 @@
+from .candidate_index import DEFAULT_PAGE_SIZE, CandidateIndex, decode_cursor
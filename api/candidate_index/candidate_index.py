@@ -0,0 +1,239 @@
+import base64
+import bisect
+import json
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+STATUSES = ["idle", "accepted", "rejected", "discarded"]
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 5000
+
+
+class CandidateIndex:
+    """
+    Read-only index over the cached candidates of one state version.
+
+    Candidates are aggregated per (sourceColumn, targetColumn) the same way
+    the heatmap does it:
+    - score: the fused score, sum of score * matcher weight over matchers
+    - matchers: the matchers that proposed the pair
+    - status: accepted if any matcher's candidate is accepted, else rejected
+      if any is rejected, else discarded if all are, else idle
+    The rows are kept as numpy arrays sorted by (-score, source, target), with
+    dictionary codes for sources, statuses, GDC categories and nodes, and a
+    bitmask of matchers, so a query is a handful of vectorized comparisons.
+    """
+
+    def __init__(
+        self,
+        candidates: List[Dict[str, Any]],
+        matcher_weights: Dict[str, float],
+        ontology: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        ontology = ontology or {}
+
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for candidate in candidates:
+            key = (candidate["sourceColumn"], candidate["targetColumn"])
+            groups.setdefault(key, []).append(candidate)
+
+        rows = []
+        for (source_col, target_col), items in groups.items():
+            statuses = [item.get("status", "idle") for item in items]
+            if "accepted" in statuses:
+                status = "accepted"
+            elif "rejected" in statuses:
+                status = "rejected"
+            elif all(s == "discarded" for s in statuses):
+                status = "discarded"
+            else:
+                status = "idle"
+            rows.append(
+                {
+                    "sourceColumn": source_col,
+                    "targetColumn": target_col,
+                    "matchers": [
+                        item["matcher"] for item in items if item.get("matcher")
+                    ],
+                    "score": sum(
+                        item["score"] * matcher_weights.get(item.get("matcher"), 1)
+                        for item in items
+                    ),
+                    "status": status,
+                }
+            )
+        rows.sort(key=self._sort_key)
+        self.rows = rows
+        self.keys = [self._sort_key(row) for row in rows]
+        self.sources = self._summarize_sources(rows)
+
+        self.matcher_bits = {
+            matcher: 1 << i
+            for i, matcher in enumerate(
+                sorted({m for row in rows for m in row["matchers"]})
+            )
+        }
+        if len(self.matcher_bits) > 63:
+            raise ValueError("CandidateIndex supports at most 63 matchers.")
+
+        self.source_codes = self._codes([row["sourceColumn"] for row in rows])
+        self.category_codes = self._codes(
+            [ontology.get(row["targetColumn"], {}).get("category") for row in rows]
+        )
+        self.node_codes = self._codes(
+            [ontology.get(row["targetColumn"], {}).get("node") for row in rows]
+        )
+        for row in rows:
+            info = ontology.get(row["targetColumn"], {})
+            row["category"] = info.get("category")
+            row["node"] = info.get("node")
+
+        self.scores = np.array([row["score"] for row in rows], dtype=np.float64)
+        self.statuses = np.array(
+            [STATUSES.index(row["status"]) for row in rows], dtype=np.int8
+        )
+        self.matcher_masks = np.array(
+            [sum(self.matcher_bits[m] for m in set(row["matchers"])) for row in rows],
+            dtype=np.int64,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def query(
+        self,
+        source_columns: Optional[List[str]] = None,
+        matchers: Optional[List[str]] = None,
+        status: Optional[List[str]] = None,
+        threshold: Optional[float] = None,
+        categories: Optional[List[str]] = None,
+        nodes: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        Filter the aggregated candidates, sorted by fused score descending.
+
+        Args:
+            source_columns (List[str], optional): Only these source columns.
+            matchers (List[str], optional): Pairs proposed by any of these matchers.
+            status (List[str], optional): Only these aggregated statuses.
+            threshold (float, optional): Minimum fused score.
+            categories (List[str], optional): GDC categories of the target column.
+            nodes (List[str], optional): GDC nodes of the target column.
+            cursor (str, optional): The nextCursor of the previous window.
+            limit (int): Window size, at most MAX_PAGE_SIZE.
+
+        Returns:
+            Dict[str, Any]: {"candidates": [...], "total": int, "nextCursor": ...},
+            nextCursor is None on the last window.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        mask = np.ones(len(self.rows), dtype=bool)
+        if source_columns is not None:
+            mask &= self._isin(self.source_codes, source_columns)
+        if matchers is not None:
+            bits = sum(self.matcher_bits.get(m, 0) for m in set(matchers))
+            mask &= (self.matcher_masks & bits) != 0
+        if status is not None:
+            codes = [STATUSES.index(s) for s in status if s in STATUSES]
+            mask &= np.isin(self.statuses, codes)
+        if threshold is not None:
+            mask &= self.scores >= float(threshold)
+        if categories is not None:
+            mask &= self._isin(self.category_codes, categories)
+        if nodes is not None:
+            mask &= self._isin(self.node_codes, nodes)
+
+        # Keyset pagination: resume right after the last row of the window
+        start = 0
+        if cursor:
+            start = bisect.bisect_right(self.keys, decode_cursor(cursor))
+
+        positions = np.flatnonzero(mask[start:])[: limit + 1] + start
+        next_cursor = None
+        if len(positions) > limit:
+            positions = positions[:limit]
+            next_cursor = encode_cursor(self.keys[positions[-1]])
+
+        return {
+            "candidates": [self.rows[i] for i in positions],
+            "total": int(mask.sum()),
+            "nextCursor": next_cursor,
+        }
+
+    def source_columns(self) -> List[Dict[str, Any]]:
+        """
+        One entry per source column, by best fused score first, as the
+        heatmap lists them:
+        - status: complete if a pair is accepted, ignored if all are
+          discarded, else incomplete
+        - maxScore: the best fused score, floored to a multiple of 0.1
+        """
+        return self.sources
+
+    @staticmethod
+    def _summarize_sources(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(row["sourceColumn"], []).append(row)
+
+        sources = []
+        for name, items in groups.items():
+            statuses = [item["status"] for item in items]
+            if "accepted" in statuses:
+                status = "complete"
+            elif all(s == "discarded" for s in statuses):
+                status = "ignored"
+            else:
+                status = "incomplete"
+            sources.append(
+                {
+                    "name": name,
+                    "status": status,
+                    # Rows are sorted by score, the first is the best
+                    "maxScore": math.floor(items[0]["score"] / 0.1) * 0.1,
+                }
+            )
+        return sources
+
+    @staticmethod
+    def _sort_key(row: Dict[str, Any]) -> Tuple[float, str, str]:
+        return (-row["score"], row["sourceColumn"], row["targetColumn"])
+
+    @staticmethod
+    def _codes(values: List[Optional[str]]) -> Tuple[np.ndarray, Dict[Any, int]]:
+        vocab: Dict[Any, int] = {}
+        codes = np.array(
+            [vocab.setdefault(value, len(vocab)) for value in values], dtype=np.int32
+        )
+        return codes, vocab
+
+    @staticmethod
+    def _isin(
+        codes: Tuple[np.ndarray, Dict[Any, int]], values: List[str]
+    ) -> np.ndarray:
+        array, vocab = codes
+        return np.isin(array, [vocab[v] for v in set(values) if v in vocab])
+
+
+def encode_cursor(key: Tuple[float, str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode(
+        "ascii"
+    )
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, str]:
+    try:
+        neg_score, source_col, target_col = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+        return (float(neg_score), source_col, target_col)
+    except (AttributeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -24,9 +24,17 @@ class CandidateQuadrants:
         top_k: int = 20,
         column_name_threshold: float = 0.7,
         value_threshold: float = 0.4,
+        source_profiles=None,
+        target_profiles=None,
+        blocks: Optional[List[Tuple[List[str], List[str]]]] = None,
     ) -> None:
         self.source = source
         self.target = target
+        # (source columns, target columns) the value scores are limited to,
+        # see CandidateBlocker.blocks
+        self.blocks = blocks
+        self.source_profiles = source_profiles
+        self.target_profiles = target_profiles
         self.top_k = top_k
         self.column_name_threshold_high = column_name_threshold + 0.25
         self.column_name_threshold = column_name_threshold
@@ -49,9 +57,20 @@ class CandidateQuadrants:
         col_name_matches = RapidFuzzMatcher("quad_col_name")._get_matches(
             self.source, self.target, self.top_k
         )
-        value_matches = RapidFuzzValueMatcher("quad_value")._get_matches(
-            self.source, self.target, self.top_k
-        )
+        value_matcher = RapidFuzzValueMatcher("quad_value")
+        value_matches = {}
+        for source_columns, target_columns in self.blocks or [
+            (self.source.columns, self.target.columns)
+        ]:
+            value_matches.update(
+                value_matcher._get_matches(
+                    self.source[source_columns],
+                    self.target[target_columns],
+                    self.top_k,
+                    source_profiles=self.source_profiles,
+                    target_profiles=self.target_profiles,
+                )
+            )
 
         for source_column in self.source.columns:
             col_name_matches_source = col_name_matches[source_column]
@@ -94,7 +113,7 @@ class CandidateQuadrants:
                 )
                 if col_score >= self.column_name_threshold_high
             ]
-            if not self.source[source_column].isna().all():
+            if not self._is_all_null(source_column):
                 ret += [
                     target_column
                     for target_column, _, val_score in self.get_quadrant(
@@ -110,7 +129,7 @@ class CandidateQuadrants:
 
     def get_potential_matches(self, source_column: str) -> List[str]:
         easy_matches = self.get_easy_matches(source_column)
-        if not self.source[source_column].isna().all():
+        if not self._is_all_null(source_column):
             matches = self.get_quadrant(source_column, True, False) + self.get_quadrant(
                 source_column, False, True
             )
@@ -124,6 +143,11 @@ class CandidateQuadrants:
             )
         )
 
+    def _is_all_null(self, source_column: str) -> bool:
+        if self.source_profiles is not None:
+            return self.source_profiles.get(source_column).is_all_null()
+        return self.source[source_column].isna().all()
+
     def get_unrelated_columns(self, source_column: str) -> List[str]:
         return list(set(self.get_quadrant(source_column, False, False)))
 
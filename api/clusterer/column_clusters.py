@@ -0,0 +1,122 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from ..metrics import record_cache
+
+# Targets with more columns than this are clustered with MiniBatchKMeans
+MINIBATCH_KMEANS_MIN_COLUMNS = 2000
+TARGET_CLUSTERS_CACHE_SIZE = 8
+
+_target_clusters_cache: "OrderedDict[str, List[List[str]]]" = OrderedDict()
+_target_clusters_lock = threading.Lock()
+
+
+def nearest_columns(
+    embeddings: np.ndarray, k: int, rows: Optional[Sequence[int]] = None
+) -> np.ndarray:
+    """
+    The k nearest columns of each column by cosine similarity, nearest first,
+    the column itself included (like NearestNeighbors(metric="cosine")).
+
+    Args:
+        embeddings (np.ndarray): One embedding per column.
+        k (int): Number of neighbours, at most the number of columns.
+        rows (Sequence[int], optional): Only these columns, all by default.
+
+    Returns:
+        np.ndarray: Column positions, shape (len(rows), k).
+    """
+    normalized = _normalize(embeddings)
+    queries = normalized if rows is None else normalized[np.asarray(rows, dtype=int)]
+    similarities = queries @ normalized.T
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.argsort(
+        -np.take_along_axis(similarities, top, axis=1), axis=1, kind="stable"
+    )
+    return np.take_along_axis(top, order, axis=1)
+
+
+def update_nearest_columns(
+    neighbours: np.ndarray, embeddings: np.ndarray, changed: Sequence[int]
+) -> np.ndarray:
+    """
+    nearest_columns after the embeddings of the `changed` columns changed,
+    recomputing only the rows that can differ: the changed columns, and the
+    columns that had a changed column as neighbour or that a changed column
+    is now closer to than their farthest neighbour.
+
+    Args:
+        neighbours (np.ndarray): nearest_columns of the previous embeddings.
+        embeddings (np.ndarray): The new embeddings, same columns.
+        changed (Sequence[int]): Positions of the columns whose embedding changed.
+    """
+    changed = np.asarray(changed, dtype=int)
+    if len(changed) == 0:
+        return neighbours
+    k = neighbours.shape[1]
+    normalized = _normalize(embeddings)
+
+    farthest = np.einsum("ij,ij->i", normalized, normalized[neighbours[:, -1]])
+    closest_changed = (normalized @ normalized[changed].T).max(axis=1)
+    stale = (
+        np.isin(neighbours, changed).any(axis=1) | (closest_changed > farthest)
+    )
+    stale[changed] = True
+
+    rows = np.flatnonzero(stale)
+    updated = neighbours.copy()
+    updated[rows] = nearest_columns(embeddings, k, rows)
+    return updated
+
+
+def cluster_target_columns(
+    embeddings: np.ndarray, columns: List[str], n_clusters: int = 20
+) -> List[List[str]]:
+    """
+    KMeans clusters of the target columns, cached by the embeddings so a
+    target (e.g. GDC) is only clustered once per process. Large targets use
+    MiniBatchKMeans.
+
+    Returns:
+        List[List[str]]: The columns of every cluster.
+    """
+    n_clusters = min(n_clusters, len(columns))
+    embeddings = np.ascontiguousarray(embeddings)
+    digest = hashlib.sha1(embeddings.tobytes())
+    digest.update("\0".join(columns).encode("utf-8"))
+    key = f"{digest.hexdigest()}-{n_clusters}"
+
+    with _target_clusters_lock:
+        if key in _target_clusters_cache:
+            _target_clusters_cache.move_to_end(key)
+            record_cache("target_clusters", True)
+            return _target_clusters_cache[key]
+    record_cache("target_clusters", False)
+
+    if len(columns) > MINIBATCH_KMEANS_MIN_COLUMNS:
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=3)
+    else:
+        kmeans = KMeans(n_clusters=n_clusters)
+    kmeans.fit(embeddings)
+
+    clusters = {}
+    for column, cluster_idx in zip(columns, kmeans.labels_):
+        clusters.setdefault(cluster_idx, []).append(column)
+    result = list(clusters.values())
+
+    with _target_clusters_lock:
+        _target_clusters_cache[key] = result
+        while len(_target_clusters_cache) > TARGET_CLUSTERS_CACHE_SIZE:
+            _target_clusters_cache.popitem(last=False)
+    return result
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
@@ -60,11 +60,18 @@ class ColumnEncoder:
         self.sampling_mode = sampling_mode
         self.n_samples = n_samples
 
-    def encode(self, df, col):
-        """Encodes the column of a DataFrame using the selected serialization method."""
+    def encode(self, df, col, profile=None):
+        """Encodes the column of a DataFrame using the selected serialization method.
+
+        If a ColumnProfile of the column is given, its cached samples and type are used.
+        """
         header = col
-        tokens = get_samples(df[col], n=self.n_samples, mode=self.sampling_mode)
-        data_type = detect_column_type(df[col])
+        if profile is not None:
+            tokens = profile.samples(self.n_samples, self.sampling_mode)
+            data_type = profile.data_type
+        else:
+            tokens = get_samples(df[col], n=self.n_samples, mode=self.sampling_mode)
+            data_type = detect_column_type(df[col])
         return self._serialization_methods[self.encoding_mode](
             header, data_type, tokens
         )
@@ -1,5 +1,6 @@
+import logging
 import os
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -7,13 +8,20 @@ import torch
 from sentence_transformers import SentenceTransformer
 from transformers import AutoModel, AutoTokenizer
 
+from ..metrics import record_cache
 from .column_encoder import ColumnEncoder
+from .onnx_backend import load_embedder, onnx_model_dir
+
+logger = logging.getLogger("bdiviz_flask.sub")
 
 DEFAULT_MODELS = [
     "sentence-transformers/all-mpnet-base-v2",
     "Snowflake/snowflake-arctic-embed-m",
 ]
 
+# "torch", or "onnx" for int8-quantized ONNX Runtime inference on CPU
+INFERENCE_BACKEND = os.environ.get("BDIVIZ_INFERENCE_BACKEND", "torch")
+
 
 class EmbeddingClusterer:
     def __init__(self, params):
@@ -25,6 +33,8 @@ class EmbeddingClusterer:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
         self.model_name = params["embedding_model"]
+        self.inference_backend = params.get("inference_backend", INFERENCE_BACKEND)
+        self._onnx_embedder = None
 
         if self.model_name in DEFAULT_MODELS:
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
@@ -57,11 +67,53 @@ class EmbeddingClusterer:
                 )
 
     def _get_embeddings(self, texts, batch_size=32):
+        if self.inference_backend == "onnx":
+            embedder = self._get_onnx_embedder(texts)
+            if embedder is not None:
+                return embedder.embed(texts)
+        return self._get_torch_embeddings(texts, batch_size)
+
+    def _get_torch_embeddings(self, texts, batch_size=32):
         if self.model_name in DEFAULT_MODELS:
             return self._get_embeddings_zs(texts, batch_size)
         else:
             return self._get_embeddings_ft(texts, batch_size)
 
+    def _get_onnx_embedder(self, texts: List[str]):
+        """
+        The int8 ONNX export of the model, created on first use with `texts`
+        as the calibration set of its drift report. Falls back to torch when
+        onnxruntime is missing or the export fails.
+        """
+        if self._onnx_embedder is not None:
+            return self._onnx_embedder
+        try:
+            if self.model_name in DEFAULT_MODELS:
+                model, normalize = self.model, False
+            else:
+                # SentenceTransformer: Transformer, Pooling and maybe Normalize
+                model = self.model[0].auto_model
+                normalize = any(
+                    type(module).__name__ == "Normalize" for module in self.model
+                )
+            self._onnx_embedder = load_embedder(
+                onnx_model_dir(self.model_name),
+                model,
+                self.tokenizer,
+                normalize=normalize,
+                reference=lambda batch: np.array(
+                    self._get_torch_embeddings(batch).cpu()
+                ),
+                calibration_texts=texts,
+            )
+        except ImportError as e:
+            logger.warning(f"[ONNX] {e}, using torch inference")
+            self.inference_backend = "torch"
+        except Exception as e:
+            logger.error(f"[ONNX] Export of {self.model_name} failed: {e}")
+            self.inference_backend = "torch"
+        return self._onnx_embedder
+
     def _get_embeddings_zs(self, texts: List[str], batch_size=32):
         embeddings = []
         for i in range(0, len(texts), batch_size):
@@ -75,7 +127,13 @@ class EmbeddingClusterer:
             ).to(self.device)
             with torch.no_grad():
                 outputs = self.model(**inputs)
-            embeddings.append(outputs.last_hidden_state.mean(dim=1))
+            # Mean over the real tokens only, like OnnxEmbedder, so that an
+            # embedding does not depend on the padding of its batch
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs[0].dtype)
+            embeddings.append(
+                (outputs.last_hidden_state * mask).sum(dim=1)
+                / mask.sum(dim=1).clamp(min=1e-9)
+            )
         return torch.cat(embeddings)
 
     def _get_embeddings_ft(self, texts, batch_size=32):
@@ -90,8 +148,25 @@ class EmbeddingClusterer:
         return torch.cat(embeddings)
 
     def get_embeddings(
-        self, source_df: pd.DataFrame, target_df: pd.DataFrame
-    ) -> np.ndarray:
+        self,
+        source_df: pd.DataFrame,
+        target_df: pd.DataFrame,
+        source_profiles=None,
+        target_profiles=None,
+        cache: Optional[Dict[str, np.ndarray]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embed the columns of the source and target DataFrames.
+
+        Args:
+            cache (Dict[str, np.ndarray], optional): Embeddings by column
+                representation, of this embedding model. It is read and filled
+                in, so only new or changed columns go through the model.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Source and target embeddings, one row
+            per column in column order.
+        """
         encoder = ColumnEncoder(
             self.tokenizer,
             encoding_mode=self.params["encoding_mode"],
@@ -99,17 +174,31 @@ class EmbeddingClusterer:
             n_samples=self.params["sampling_size"],
         )
 
-        input_col_repr_dict = {
-            encoder.encode(source_df, col): col for col in source_df.columns
-        }
-        target_col_repr_dict = {
-            encoder.encode(target_df, col): col for col in target_df.columns
-        }
-
-        cleaned_input_col_repr = list(input_col_repr_dict.keys())
-        cleaned_target_col_repr = list(target_col_repr_dict.keys())
-
-        embeddings_input = np.array(self._get_embeddings(cleaned_input_col_repr))
-        embeddings_target = np.array(self._get_embeddings(cleaned_target_col_repr))
+        source_reprs = [
+            encoder.encode(
+                source_df, col, source_profiles.get(col) if source_profiles else None
+            )
+            for col in source_df.columns
+        ]
+        target_reprs = [
+            encoder.encode(
+                target_df, col, target_profiles.get(col) if target_profiles else None
+            )
+            for col in target_df.columns
+        ]
+
+        cache = {} if cache is None else cache
+        embeddings_input = self._get_cached_embeddings(source_reprs, cache)
+        embeddings_target = self._get_cached_embeddings(target_reprs, cache)
 
         return embeddings_input, embeddings_target
+
+    def _get_cached_embeddings(
+        self, texts: List[str], cache: Dict[str, np.ndarray]
+    ) -> np.ndarray:
+        missing = list(dict.fromkeys(text for text in texts if text not in cache))
+        record_cache("embeddings", True, len(texts) - len(missing))
+        record_cache("embeddings", False, len(missing))
+        if missing:
+            cache.update(zip(missing, np.array(self._get_embeddings(missing))))
+        return np.array([cache[text] for text in texts])
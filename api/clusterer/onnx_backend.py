@@ -0,0 +1,303 @@
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..inference_scheduler import INFERENCE_SCHEDULER
+from ..utils import CACHE_DIR
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+ONNX_DIR = os.path.join(CACHE_DIR, "onnx")
+FP32_FILENAME = "model.onnx"
+INT8_FILENAME = "model.int8.onnx"
+META_FILENAME = "meta.json"
+OPSET_VERSION = 17
+MODEL_INPUTS = ["input_ids", "attention_mask", "token_type_ids"]
+
+MAX_LENGTH = 512
+# Adaptive batching: a batch holds at most this many tokens, padding included
+MAX_BATCH_TOKENS = 16384
+MAX_BATCH_SIZE = 256
+# Texts embedded with both backends to measure the drift on export
+DRIFT_CALIBRATION_SIZE = 256
+
+_export_lock = threading.Lock()
+
+
+def onnx_model_dir(model_name: str) -> str:
+    """Export directory of a model, e.g. .cache/onnx/Snowflake--snowflake-arctic-embed-m
+
+    A local weights file (the downloaded fine-tuned model) is named after its
+    file name.
+    """
+    name = model_name.rstrip("/")
+    if os.path.exists(name):
+        name = os.path.basename(name)
+    return os.path.join(ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "--", name))
+
+
+def is_exported(model_dir: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(model_dir, filename))
+        for filename in [INT8_FILENAME, META_FILENAME]
+    )
+
+
+def export_model(
+    model: Any, tokenizer: Any, model_dir: str, normalize: bool = False
+) -> None:
+    """
+    Export a Hugging Face encoder to ONNX and quantize it to int8 with
+    onnxruntime's dynamic quantization (int8 weights, activations quantized
+    on the fly), which needs no calibration data.
+
+    Args:
+        model: The transformers model, returning last_hidden_state.
+        tokenizer: Its tokenizer.
+        model_dir (str): Where model.onnx, model.int8.onnx and meta.json go.
+        normalize (bool): Whether embeddings are L2-normalized after pooling,
+            as the Normalize module of a SentenceTransformer does.
+    """
+    # Imported here, both are only needed to export
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    sample = tokenizer(["column: example"], return_tensors="pt")
+    input_names = [name for name in MODEL_INPUTS if name in sample]
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(model_dir, exist_ok=True)
+    fp32_path = os.path.join(model_dir, FP32_FILENAME)
+    # The TorchScript exporter: dynamic_axes is not understood by the dynamo
+    # exporter, the default since torch 2.9
+    options = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        options["dynamo"] = False
+    # The model is shared with the torch path: export restores the training
+    # mode of the module it is given, so that one must be in eval mode, and
+    # the model goes back to its device afterwards
+    device = next(model.parameters()).device
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates().cpu().eval(),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                name: {0: "batch", 1: "sequence"}
+                for name in input_names + ["last_hidden_state"]
+            },
+            opset_version=OPSET_VERSION,
+            **options,
+        )
+    model.to(device)
+    quantize_dynamic(
+        fp32_path, os.path.join(model_dir, INT8_FILENAME), weight_type=QuantType.QInt8
+    )
+    write_meta(
+        model_dir,
+        {"inputs": input_names, "normalize": normalize, "quantization": "dynamic-int8"},
+    )
+    logger.info(f"[ONNX] Exported and quantized model to {model_dir}")
+
+
+def load_embedder(
+    model_dir: str,
+    model: Any,
+    tokenizer: Any,
+    normalize: bool = False,
+    reference: Optional[Callable[[List[str]], np.ndarray]] = None,
+    calibration_texts: Optional[List[str]] = None,
+) -> "OnnxEmbedder":
+    """
+    The OnnxEmbedder of a model, exported first if needed.
+
+    On export, the first DRIFT_CALIBRATION_SIZE calibration texts are
+    embedded by both `reference` (the torch path) and the int8 model, and
+    the drift_report, with both timings, is logged and stored in meta.json.
+    """
+    with _export_lock:
+        exporting = not is_exported(model_dir)
+        if exporting:
+            export_model(model, tokenizer, model_dir, normalize)
+        embedder = OnnxEmbedder(model_dir, tokenizer)
+
+        if exporting and reference is not None and calibration_texts:
+            texts = calibration_texts[:DRIFT_CALIBRATION_SIZE]
+            start = time.perf_counter()
+            expected = np.asarray(reference(texts))
+            torch_seconds = time.perf_counter() - start
+            actual = embedder.embed(texts)
+            onnx_seconds = time.perf_counter() - start - torch_seconds
+
+            report = drift_report(expected, actual)
+            report.update({"torchSeconds": torch_seconds, "onnxSeconds": onnx_seconds})
+            meta = read_meta(model_dir)
+            meta["drift"] = report
+            write_meta(model_dir, meta)
+            logger.info(f"[ONNX] Drift of {model_dir} from torch: {report}")
+    return embedder
+
+
+def read_meta(model_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(model_dir, META_FILENAME)) as f:
+        return json.load(f)
+
+
+def write_meta(model_dir: str, meta: Dict[str, Any]) -> None:
+    path = os.path.join(model_dir, META_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def length_batches(
+    lengths: np.ndarray,
+    max_tokens: int = MAX_BATCH_TOKENS,
+    max_batch_size: int = MAX_BATCH_SIZE,
+) -> List[np.ndarray]:
+    """
+    Group inputs into batches of similar token length, so that short column
+    serializations are not padded to the length of long ones. Inputs are
+    sorted by length and a batch grows while batch size x longest length
+    stays within max_tokens: batches of short inputs are large, batches of
+    long inputs small.
+
+    Returns:
+        List[np.ndarray]: Input positions of every batch.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches, current = [], []
+    for i in order:
+        if current and (
+            len(current) >= max_batch_size
+            or (len(current) + 1) * lengths[i] > max_tokens
+        ):
+            batches.append(np.array(current))
+            current = []
+        current.append(i)
+    if current:
+        batches.append(np.array(current))
+    return batches
+
+
+class OnnxEmbedder:
+    """
+    CPU inference of an exported, int8-quantized encoder.
+
+    Embeddings are the attention-masked mean of the last hidden states, like
+    the torch zero-shot path, so padding does not change them. Activations
+    are quantized per batch, which still moves them slightly with the batch
+    (cosine above 0.9999).
+    """
+
+    def __init__(self, model_dir: str, tokenizer: Any) -> None:
+        import onnxruntime as ort
+
+        meta = read_meta(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = INFERENCE_SCHEDULER.intra_op_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, INT8_FILENAME),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = meta["inputs"]
+        self.normalize = meta.get("normalize", False)
+        self.tokenizer = tokenizer
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, truncation=True, max_length=MAX_LENGTH)
+        lengths = np.array([len(ids) for ids in encoded["input_ids"]])
+
+        embeddings = None
+        for batch in length_batches(lengths):
+            features = self.tokenizer.pad(
+                {name: [encoded[name][i] for i in batch] for name in self.input_names},
+                return_tensors="np",
+            )
+            hidden = self.session.run(
+                None,
+                {name: features[name].astype(np.int64) for name in self.input_names},
+            )[0]
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch] = pooled
+
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if self.normalize:
+            embeddings /= np.maximum(
+                np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+            )
+        return embeddings
+
+
+def drift_report(
+    reference: np.ndarray, candidate: np.ndarray, k: int = 10
+) -> Dict[str, float]:
+    """
+    How far `candidate` embeddings (e.g. ONNX int8) are from `reference`
+    embeddings (the torch path) of the same texts:
+    - cosine: similarity of each text's two embeddings, mean / min / 5th
+      percentile
+    - neighbourOverlap: mean fraction of each text's k nearest texts that
+      both backends agree on, what clustering and blocking actually see
+    """
+    reference = _normalize(reference)
+    candidate = _normalize(candidate)
+    cosine = np.einsum("ij,ij->i", reference, candidate)
+
+    k = min(k, len(reference) - 1)
+    overlap = 1.0
+    if k > 0:
+        reference_top = _top_neighbours(reference, k)
+        candidate_top = _top_neighbours(candidate, k)
+        overlap = float(
+            np.mean(
+                [
+                    len(np.intersect1d(r, c, assume_unique=True)) / k
+                    for r, c in zip(reference_top, candidate_top)
+                ]
+            )
+        )
+    return {
+        "texts": len(reference),
+        "cosineMean": float(cosine.mean()),
+        "cosineMin": float(cosine.min()),
+        "cosineP05": float(np.percentile(cosine, 5)),
+        "neighbourOverlap": overlap,
+    }
+
+
+def _top_neighbours(embeddings: np.ndarray, k: int) -> np.ndarray:
+    similarities = embeddings @ embeddings.T
+    np.fill_diagonal(similarities, -np.inf)
+    return np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(
+        np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+    )
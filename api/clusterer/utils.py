@@ -1,4 +1,6 @@
 import re
+from itertools import repeat
+from typing import Iterable
 
 import mmh3
 import numpy as np
@@ -7,8 +9,13 @@ import pandas as pd
 from .constants import BINARY_VALUES, KEY_REPRESENTATIONS, NULL_REPRESENTATIONS
 
 PHI_FRACTION = 0.6180339887  # φ - 1
+SAMPLING_HASH_SEED = 42
 np.random.seed(42)
 
+INVALID_CHARACTERS_PATTERN = re.compile(r"[^a-zA-Z0-9\s]")
+CAMEL_CASE_PATTERN = re.compile(r"(?<=[a-z])(?=[A-Z])")
+NULL_STRINGS = {value for value in NULL_REPRESENTATIONS if isinstance(value, str)}
+
 
 def is_null_value(value):
     if isinstance(value, str):
@@ -24,14 +31,13 @@ def is_binary_value(value):
 
 def remove_invalid_characters(input_string):
     # Remove any character that is not a letter, digit, or whitespace
-    pattern = r"[^a-zA-Z0-9\s]"
-    cleaned_string = re.sub(pattern, " ", input_string)
+    cleaned_string = INVALID_CHARACTERS_PATTERN.sub(" ", input_string)
     return cleaned_string
 
 
 def split_camel_case(input_string):
     # Split camel case by adding a space before any uppercase letter that is followed by a lowercase letter
-    split_string = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", input_string)
+    split_string = CAMEL_CASE_PATTERN.sub(" ", input_string)
     return split_string
 
 
@@ -61,9 +67,53 @@ def clean_element(x):
 
 
 def clean_df(df):
-    df = df.apply(lambda col: col.apply(clean_element))
+    """Apply clean_element to every value, column by column in vectorized passes."""
+    return df.apply(clean_series)
+
+
+def clean_series(col):
+    """
+    Vectorized clean_element over a column.
+
+    Each distinct string is cleaned once with the pandas string accessors, then
+    mapped back through the factorized codes. Null-like values in object
+    columns become None, numeric and boolean columns are returned unchanged.
+    """
+    if not _is_text_dtype(col.dtype):
+        if pd.api.types.is_numeric_dtype(col.dtype):
+            return col.copy()
+        return col.apply(clean_element)
+
+    codes, uniques = pd.factorize(col.to_numpy(dtype=object))
+    uniques = np.asarray(uniques, dtype=object)
+    is_str = np.fromiter(
+        (isinstance(value, str) for value in uniques), dtype=bool, count=len(uniques)
+    )
+
+    cleaned = np.empty(len(uniques), dtype=object)
+    cleaned[~is_str] = [clean_element(value) for value in uniques[~is_str]]
+    if is_str.any():
+        strings = pd.Series(uniques[is_str], dtype=object)
+        is_null = strings.str.lower().isin(NULL_STRINGS).to_numpy()
+        strings = (
+            strings.str.replace(CAMEL_CASE_PATTERN, " ", regex=True)
+            .str.strip()
+            .str.lower()
+            .str.replace(INVALID_CHARACTERS_PATTERN, " ", regex=True)
+        )
+        strings = strings.to_numpy(dtype=object)
+        strings[is_null | (strings == "")] = None
+        cleaned[is_str] = strings
+
+    values = np.empty(len(codes), dtype=object)
+    values[:] = None
+    valid = codes >= 0
+    values[valid] = cleaned[codes[valid]]
+    return pd.Series(values, index=col.index, name=col.name).infer_objects()
 
-    return df
+
+def _is_text_dtype(dtype) -> bool:
+    return dtype == object or isinstance(dtype, pd.StringDtype)
 
 
 # def detect_column_type(col, key_threshold=0.8, numeric_threshold=0.90):
@@ -172,6 +222,67 @@ def detect_column_type(col, key_threshold=0.8, numeric_threshold=0.90):
     raise ValueError(f"Could not detect type for column {col.name}")
 
 
+def detect_column_types(df, key_threshold=0.8, numeric_threshold=0.90):
+    """
+    Batched detect_column_type over all columns of a DataFrame.
+
+    Numeric columns are classified with a single frame-wide null check, text
+    columns only look at their distinct values, and the remaining dtypes fall
+    back to detect_column_type.
+
+    Returns:
+        Dict[str, str]: The detected type of each column, in column order.
+    """
+    types = {}
+    numeric_columns = [
+        col for col in df.columns if pd.api.types.is_numeric_dtype(df[col].dtype)
+    ]
+    has_values = df[numeric_columns].notna().any() if numeric_columns else {}
+
+    for col in df.columns:
+        series = df[col]
+        if col in has_values and has_values[col]:
+            types[col] = "numerical"
+        elif _is_text_dtype(series.dtype):
+            types[col] = _detect_text_column_type(series, key_threshold)
+        else:
+            types[col] = detect_column_type(series, key_threshold, numeric_threshold)
+    return types
+
+
+def _detect_text_column_type(col, key_threshold=0.8):
+    """detect_column_type for object and string columns, on distinct values only."""
+    unique_values = col.dropna().unique()
+
+    # Try converting to numeric (int or float)
+    if pd.to_numeric(pd.Series(unique_values), errors="coerce").notna().any():
+        return "numerical"
+
+    col_name = col.name.lower()
+    if "gene" in col_name:
+        return "gene"
+    if "date" in col_name:
+        return "date"
+
+    if len(col) > 0 and len(unique_values) / len(col) > key_threshold:
+        # columns with many distinct values are considered as "keys"
+        return "key"
+
+    if len(unique_values) == 0:
+        return "unknown"
+
+    if any(
+        col_name.startswith(rep) or col_name.endswith(rep)
+        for rep in KEY_REPRESENTATIONS
+    ):
+        return "key"
+
+    # None of the values is numeric, see the first check
+    if len(unique_values) == 2 and all(is_binary_value(val) for val in unique_values):
+        return "binary"
+    return "categorical"
+
+
 def get_type2columns_map(df):
     # TODO: add more types, maybe semantic types
     types2columns_map = {}
@@ -182,9 +293,9 @@ def get_type2columns_map(df):
     types2columns_map["gene"] = []
     types2columns_map["date"] = []
     types2columns_map["Unknown"] = []
+    types2columns_map["unknown"] = []
 
-    for col in df.columns:
-        col_type = detect_column_type(df[col])
+    for col, col_type in detect_column_types(df).items():
         types2columns_map[col_type].append(col)
 
     return types2columns_map
@@ -208,7 +319,53 @@ def fibonacci_hash(x):
     return result
 
 
-def get_samples(values, n=15, mode="priority_sampling"):
+def hash_strings(strings: Iterable[str], seed: int = SAMPLING_HASH_SEED) -> np.ndarray:
+    """
+    Hash many strings at once, same as [mmh3.hash(s, seed) for s in strings].
+
+    Args:
+        strings (Iterable[str]): The strings to hash.
+        seed (int): The murmur3 seed.
+
+    Returns:
+        np.ndarray: The signed 32-bit hashes, in the order of the strings.
+    """
+    # map() keeps the per-string loop inside C, no Python frame per value
+    return np.fromiter(map(mmh3.hash, strings, repeat(seed)), dtype=np.int64)
+
+
+def _top_n_positions(priorities: np.ndarray, n: int) -> np.ndarray:
+    """
+    Positions of the n largest priorities, same as pd.Series.nlargest(n):
+    ordered by descending priority, ties broken by the earlier position.
+    """
+    if n >= len(priorities):
+        candidates = np.arange(len(priorities))
+    else:
+        threshold = priorities[np.argpartition(-priorities, n - 1)[:n]].min()
+        above = np.flatnonzero(priorities > threshold)
+        ties = np.flatnonzero(priorities == threshold)[: n - len(above)]
+        candidates = np.concatenate([above, ties])
+    return candidates[np.lexsort((candidates, -priorities[candidates]))]
+
+
+def _hash_priorities(counts: pd.Series, weighted: bool) -> np.ndarray:
+    """
+    Sampling priorities of the counted values: freq / hash(value) for
+    priority sampling, hash(value) for consistent sampling.
+    """
+    hashes = fibonacci_hash(hash_strings(map(str, counts.index)).astype(np.float64))
+    if not weighted:
+        return hashes
+    if not hashes.all():
+        # Same failure as dividing by a zero hash one value at a time
+        raise ZeroDivisionError("float division by zero")
+    return counts.to_numpy(dtype=np.float64) / hashes
+
+
+def get_samples(
+    values, n=15, mode="priority_sampling", unique_values=None, value_counts=None
+):
     """
     Sample values from a pandas Series using different strategies.
 
@@ -222,13 +379,23 @@ def get_samples(values, n=15, mode="priority_sampling"):
             - 'weighted': weighted sampling based on value counts
             - 'priority_sampling': uses priority sampling based on frequency and hash of the values
             - 'consistent_sampling': consistent uniform sampling based on hash of the values
+        unique_values: precomputed values.dropna().unique(), e.g. from a ColumnProfile
+        value_counts: precomputed values.dropna().value_counts(sort=False)
 
     Returns:
         List of string representations of sampled values
     """
-    unique_values = values.dropna().unique()
+    if unique_values is None:
+        unique_values = values.dropna().unique()
     total_unique = len(unique_values)
 
+    def _value_counts(sort=True):
+        counts = value_counts
+        if counts is None:
+            counts = values.dropna().value_counts(sort=False)
+        # Same as value_counts(sort=True), which sorts the unsorted counts
+        return counts.sort_values(ascending=False) if sort else counts
+
     # If total unique values are fewer than n, return them all
     if total_unique <= n:
         return sorted([str(val) for val in unique_values])
@@ -241,15 +408,13 @@ def get_samples(values, n=15, mode="priority_sampling"):
 
     elif mode == "frequent":
         # Only most frequent values
-        value_counts = values.dropna().value_counts()
-        tokens = value_counts.head(n).index.tolist()
+        tokens = _value_counts().head(n).index.tolist()
         tokens.sort()
 
     elif mode == "mixed":
         # Mix of most frequent and evenly spaced values
         n_frequent = n // 2
-        value_counts = values.dropna().value_counts()
-        most_frequent_values = value_counts.head(n_frequent).index.tolist()
+        most_frequent_values = _value_counts().head(n_frequent).index.tolist()
 
         # Calculate evenly spaced samples for diversity
         n_diverse = n - n_frequent
@@ -262,8 +427,8 @@ def get_samples(values, n=15, mode="priority_sampling"):
 
     elif mode == "weighted":
         # Weighted sampling based on value counts
-        value_counts = values.dropna().value_counts(sort=False)
-        weights = value_counts / value_counts.sum()
+        counts = _value_counts(sort=False)
+        weights = counts / counts.sum()
         sampled_indices = np.random.choice(
             total_unique, size=n, replace=False, p=weights
         )
@@ -271,32 +436,22 @@ def get_samples(values, n=15, mode="priority_sampling"):
         tokens = sampled_values
 
     elif mode == "priority_sampling":
-        value_counts = values.dropna().value_counts(sort=False)
+        counts = _value_counts(sort=False)
 
         # Calculate priorities: qi = freq / hash(value)
-        priorities = pd.Series(
-            {
-                val: freq / fibonacci_hash(mmh3.hash(str(val), 42))
-                for val, freq in value_counts.items()
-            }
-        )
+        priorities = _hash_priorities(counts, weighted=True)
 
         # Select the top elements based on priority scores
-        sampled_values = priorities.nlargest(n).index.tolist()
+        sampled_values = counts.index[_top_n_positions(priorities, n)].tolist()
         tokens = sampled_values
 
     elif mode == "consistent_sampling":
-        value_counts = values.dropna().value_counts(sort=False)
+        counts = _value_counts(sort=False)
 
-        priorities = pd.Series(
-            {
-                val: fibonacci_hash(mmh3.hash(str(val), 42))
-                for val in value_counts.keys()
-            }
-        )
+        priorities = _hash_priorities(counts, weighted=False)
 
         # Select the top elements based on priority scores
-        sampled_values = priorities.nlargest(n).index.tolist()
+        sampled_values = counts.index[_top_n_positions(priorities, n)].tolist()
         tokens = sampled_values
 
     else:
@@ -0,0 +1,7 @@
+from .column_profile import (
+    GDC_TARGET_PROFILES,
+    ColumnProfile,
+    ProfileStore,
+    bucket_column,
+)
+from .row_sample import EXACT_DISTINCT_MAX, SAMPLE_MODES, sample_rows
@@ -0,0 +1,237 @@
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..clusterer.utils import detect_column_type, detect_column_types, get_samples
+from ..providers import LazyProvider
+from ..utils import is_category_by_counts, load_gdc_target
+from .row_sample import EXACT_DISTINCT_MAX
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+
+class ColumnProfile:
+    """Per-column statistics, computed once and shared by every consumer.
+
+    Holds what the encoder, type detection, value bins and unique value
+    lookups used to recompute on every request:
+    - data_type: the detect_column_type class, e.g. "numerical", "categorical"
+    - null_count / count: number of null and non-null values
+    - unique_values: non-null unique values in order of appearance
+    - value_counts: counts of the unique values, in order of appearance
+    - min / max: for int64 and float64 columns
+    - bins: the value histogram served to the frontend
+    Samples are memoized per (mode, n) on first use.
+
+    When `series` is a row sample of `population` (see row_sample.sample_rows),
+    columns with at most EXACT_DISTINCT_MAX distinct, repeated values in the
+    sample are still profiled exactly over the population, so no category is
+    missed and counts are true. Other columns are profiled on the sample, `sampled` is
+    then True and the counts and bins are those of the sample.
+    """
+
+    def __init__(
+        self,
+        series: pd.Series,
+        data_type: Optional[str] = None,
+        population: Optional[pd.Series] = None,
+    ) -> None:
+        self.name = series.name
+        self.dtype = series.dtype
+
+        non_null = series.dropna()
+        self.sampled = population is not None and len(population) > len(series)
+        # Values repeat in the sample and are few: a categorical column
+        if self.sampled and (
+            non_null.nunique() <= min(EXACT_DISTINCT_MAX, len(non_null) - 1)
+        ):
+            series = population
+            non_null = population.dropna()
+            self.sampled = False
+
+        self.count = len(non_null)
+        self.null_count = len(series) - self.count
+        self.unique_values = non_null.unique()
+        self.value_counts = non_null.value_counts(sort=False)
+        self.unique_strings = self.unique_values.astype(str)
+
+        self.data_type = data_type or detect_column_type(series)
+
+        self.min = None
+        self.max = None
+        if non_null.dtype in ["int64", "float64"] and self.count > 0:
+            self.min = non_null.min()
+            self.max = non_null.max()
+
+        self.bins = bucket_column(non_null, self.value_counts, self.min, self.max)
+
+        self._samples: Dict[Tuple[str, int], List[str]] = {}
+
+    @property
+    def n_unique(self) -> int:
+        return len(self.unique_values)
+
+    def is_all_null(self) -> bool:
+        return self.count == 0
+
+    def is_category_candidate(self, unique_threshold=10, ratio_threshold=0.05) -> bool:
+        return is_category_by_counts(
+            self.n_unique, self.count, unique_threshold, ratio_threshold
+        )
+
+    def samples(self, n: int, mode: str) -> List[str]:
+        """Same as clusterer.utils.get_samples, memoized.
+
+        The random and weighted modes are therefore drawn once per profile.
+        """
+        key = (mode, n)
+        if key not in self._samples:
+            self._samples[key] = get_samples(
+                None,
+                n=n,
+                mode=mode,
+                unique_values=self.unique_values,
+                value_counts=self.value_counts,
+            )
+        return self._samples[key]
+
+    def get_unique_values(self, n: int, sort: bool = True) -> List[str]:
+        """The first n unique values as strings, sorted by default."""
+        values = list(self.unique_strings[:n])
+        return sorted(values) if sort else values
+
+
+class ProfileStore:
+    """Column profiles of one DataFrame, invalidated per column on edits.
+
+    `population` is the full DataFrame when `df` is a row sample of it.
+    """
+
+    def __init__(
+        self, df: pd.DataFrame, population: Optional[pd.DataFrame] = None
+    ) -> None:
+        self.df = df
+        self.population = population
+        self.lock = threading.Lock()
+        self.profiles: Dict[str, ColumnProfile] = {}
+
+    def build(self) -> "ProfileStore":
+        """Profile every column, detecting the column types in one batch."""
+        data_types = detect_column_types(self.df)
+        with self.lock:
+            for col in self.df.columns:
+                if col not in self.profiles:
+                    self.profiles[col] = ColumnProfile(
+                        self.df[col], data_types[col], self._population(col)
+                    )
+        return self
+
+    def get(self, col: str) -> ColumnProfile:
+        with self.lock:
+            profile = self.profiles.get(col)
+            if profile is None:
+                profile = ColumnProfile(self.df[col], population=self._population(col))
+                self.profiles[col] = profile
+            return profile
+
+    def _population(self, col: str) -> Optional[pd.Series]:
+        return None if self.population is None else self.population[col]
+
+    def invalidate(self, col: str) -> None:
+        with self.lock:
+            self.profiles.pop(col, None)
+
+    def replace(
+        self,
+        df: pd.DataFrame,
+        population: Optional[pd.DataFrame] = None,
+        invalidated: Iterable[str] = (),
+    ) -> "ProfileStore":
+        """
+        A store of `df`, a copy of this store's DataFrame with the
+        `invalidated` columns edited, sharing the profiles of the others.
+        """
+        store = ProfileStore(df, population)
+        with self.lock:
+            store.profiles = {
+                col: profile
+                for col, profile in self.profiles.items()
+                if col not in invalidated
+            }
+        return store
+
+    def __contains__(self, col: str) -> bool:
+        return col in self.df.columns
+
+
+# Profiles (and value bins) of the GDC target, built once for all sessions
+GDC_TARGET_PROFILES: LazyProvider[ProfileStore] = LazyProvider(
+    "gdc_target_profiles", lambda: ProfileStore(load_gdc_target()).build()
+)
+
+
+def bucket_column(
+    col_obj: pd.Series,
+    value_counts: Optional[pd.Series] = None,
+    min_val: Any = None,
+    max_val: Any = None,
+) -> List[Dict[str, Any]]:
+    """
+    Bucket the non-null values of a column for the value distribution charts.
+
+    Args:
+        col_obj (pd.Series): The column with null values dropped.
+        value_counts (pd.Series, optional): Precomputed value_counts(sort=False).
+        min_val, max_val (optional): Precomputed min and max of numeric columns.
+
+    Returns:
+        List[Dict[str, Any]]: The buckets, e.g. [{"value": "0.00-1.00", "count": 3}, ...]
+    """
+    if value_counts is None:
+        value_counts = col_obj.value_counts(sort=False)
+
+    if col_obj.dtype in ["object", "category", "bool"]:
+        counter = value_counts.sort_values(ascending=False)[:10].to_dict()
+        return [
+            {"value": str(key), "count": int(value)}
+            for key, value in counter.items()
+            if value >= 1
+        ]
+    elif col_obj.dtype in ["int64", "float64"]:
+        if len(col_obj) == 0:
+            return []
+        # If the integer column has few unique values, treat it as categorical
+        if col_obj.dtype == "int64" and len(value_counts) <= 10:
+            counter = value_counts.sort_index()
+            return [
+                {"value": str(val), "count": int(count)}
+                for val, count in counter.items()
+            ]
+        else:
+            if min_val is None or max_val is None:
+                min_val = col_obj.min()
+                max_val = col_obj.max()
+            bins = np.linspace(min_val, max_val, num=10)
+            counter = np.histogram(col_obj, bins=bins)[0]
+            if col_obj.dtype == "float64":
+                return [
+                    {
+                        "value": f"{bins[i]:.2f}-{bins[i+1]:.2f}",
+                        "count": int(counter[i]),
+                    }
+                    for i in range(len(counter))
+                ]
+            else:
+                return [
+                    {
+                        "value": f"{int(bins[i])}-{int(bins[i+1])}",
+                        "count": int(counter[i]),
+                    }
+                    for i in range(len(counter))
+                ]
+    else:
+        logger.warning(f"Column {col_obj.name} is of type {col_obj.dtype}.")
+        return []
@@ -0,0 +1,70 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+ROW_SAMPLE_SEED = 42
+SAMPLE_MODES = ["reservoir", "stratified"]
+# Columns with at most this many distinct values are profiled exactly, see
+# ColumnProfile, and are the strata of the stratified mode
+EXACT_DISTINCT_MAX = 1000
+
+
+def sample_rows(
+    df: pd.DataFrame,
+    n: int,
+    mode: str = "stratified",
+    seed: int = ROW_SAMPLE_SEED,
+) -> pd.DataFrame:
+    """
+    Bounded row sample of a DataFrame, rows kept in their original order.
+
+    - reservoir: n rows uniformly at random. Every row gets a random key and
+      the n smallest keys are kept, the same sample a one-pass reservoir
+      would hold.
+    - stratified: the first row of every distinct value of the low
+      cardinality columns (at most EXACT_DISTINCT_MAX values), so that rare
+      categories are represented, then uniformly random rows up to n.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to sample.
+        n (int): Number of rows to keep, all of them if df is not larger.
+        mode (str): "reservoir" or "stratified".
+        seed (int): Seed of the random keys, the sample is deterministic.
+
+    Returns:
+        pd.DataFrame: A copy of the sampled rows, with their original index.
+    """
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f"Unknown sample mode {mode}, expected one of {SAMPLE_MODES}")
+    if len(df) <= n:
+        return df
+
+    rng = np.random.default_rng(seed)
+    keys = rng.random(len(df))
+
+    if mode == "stratified":
+        # Columns with many distinct values in a uniform sample are no strata,
+        # only the others need a full pass
+        uniform = df.iloc[np.argpartition(keys, n - 1)[:n]]
+        required = np.zeros(len(df), dtype=bool)
+        for col in df.columns:
+            if uniform[col].nunique() > EXACT_DISTINCT_MAX:
+                continue
+            values = df[col]
+            first = ~values.duplicated().to_numpy() & values.notna().to_numpy()
+            if first.sum() <= EXACT_DISTINCT_MAX:
+                required |= first
+        required_positions = np.flatnonzero(required)
+        if len(required_positions) > n:
+            logger.warning(
+                f"[RowSample] {len(required_positions)} rows needed to cover "
+                f"every category, keeping {n} of them"
+            )
+        # Required rows sort first, then the random keys fill up the sample
+        keys[required_positions] -= 1
+
+    positions = np.sort(np.argpartition(keys, n - 1)[:n])
+    return df.iloc[positions].copy()
@@ -0,0 +1,143 @@
+"""Streaming export of the source table harmonized to the accepted GDC targets.
+
+The source is written a chunk of rows at a time, so the export holds one
+chunk instead of a renamed copy of the whole table, and the first bytes are
+sent before the last rows are converted:
+
+    chunks = matching_task.iter_harmonized_chunks()
+    Response(stream_csv(chunks), mimetype=EXPORT_MIMETYPES["csv"])
+"""
+
+import io
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # Optional, Parquet exports are not offered without it
+    pa = None
+
+# Source rows converted and written at once
+EXPORT_CHUNK_ROWS = int(os.environ.get("BDIVIZ_EXPORT_CHUNK_ROWS", "50000"))
+
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (source column, target column, source value -> target value)
+ExportColumn = Tuple[str, str, Dict[str, str]]
+
+
+def export_formats() -> List[str]:
+    return [name for name in EXPORT_MIMETYPES if name != "parquet" or pa is not None]
+
+
+def remap_values(values: pd.Series, mapping: Dict[str, str]) -> pd.Series:
+    """
+    `values` with every value in `mapping` replaced by its target value.
+
+    The chunk is factorized, so the mapping is looked up once per distinct
+    value rather than once per row, and the codes are then mapped with one
+    take. Values are matched by their string form, as value matches are
+    generated from the string unique values of the column; a remapped
+    column holds strings (missing values stay missing).
+    """
+    if not mapping:
+        return values
+    codes, uniques = pd.factorize(values)
+    mapped = np.array(
+        [mapping.get(str(value), str(value)) for value in uniques] + [None],
+        dtype=object,
+    )
+    # Code -1 (missing) takes the trailing None
+    return pd.Series(mapped.take(codes), index=values.index, name=values.name)
+
+
+def harmonize_chunk(chunk: pd.DataFrame, columns: List[ExportColumn]) -> pd.DataFrame:
+    """
+    The target columns of one chunk of source rows. Remapped, object and
+    categorical columns are pandas strings, so the dtypes of a chunk follow
+    from the source dtypes alone and are the same for every chunk.
+    """
+    return pd.DataFrame(
+        {
+            target_col: _as_export_dtype(remap_values(chunk[source_col], mapping))
+            for source_col, target_col, mapping in columns
+        },
+        index=chunk.index,
+    )
+
+
+def _as_export_dtype(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_object_dtype(values.dtype) or isinstance(
+        values.dtype, pd.CategoricalDtype
+    ):
+        return values.astype("string")
+    return values
+
+
+def stream_csv(chunks: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+def stream_parquet(chunks: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    """
+    One Parquet row group per chunk, of chunks from harmonize_chunk. The
+    schema is built from the dtypes of the chunks (an empty frame), not from
+    the values of the first one, so a later chunk cannot fail to convert and
+    cut the file short.
+    """
+    if pa is None:
+        raise RuntimeError("Parquet exports need pyarrow")
+
+    sink = _DrainableSink()
+    writer: Optional["pa_parquet.ParquetWriter"] = None
+    schema = None
+    for chunk in chunks:
+        if schema is None:
+            schema = pa.Schema.from_pandas(chunk.iloc[:0], preserve_index=False)
+            writer = pa_parquet.ParquetWriter(sink, schema)
+        writer.write_table(
+            pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        )
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {"csv": stream_csv, "parquet": stream_parquet}
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file whose written bytes are handed out with drain."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
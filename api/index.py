@@ -1,41 +1,125 @@
 import json
 import logging
+import math
 import os
+import time
+from typing import Dict, Optional
 from uuid import uuid4
 
-import pandas as pd
-from flask import Flask, request
+from flask import Flask, Response, g, request
 
+from .candidate_index import DEFAULT_PAGE_SIZE, decode_cursor
+from .harmonized_export import (
+    EXPORT_CHUNK_ROWS,
+    EXPORT_MIMETYPES,
+    STREAMERS,
+    export_formats,
+)
+from .inference_scheduler import INFERENCE_SCHEDULER, InferenceQueueFull
+from .metrics import CONTENT_TYPE, REQUEST_SECONDS, render
 from .langchain.agent import AGENT
+from .langchain.memory_writer import memory_writer_stats
 
 # langchain
 from .langchain.pydantic import AgentResponse
+from .providers import provider_status, warmup_in_background
+from .responses import conditional_json
+from .matching_task import UserOperation
 from .session_manager import SESSION_MANAGER
+from .session_usage import USAGE
 from .utils import (
+    SourceFileError,
     extract_data_from_request,
     extract_session_name,
     load_gdc_property,
+    load_cached_source,
+    load_gdc_target,
     read_candidate_explanation_json,
     write_candidate_explanation_json,
 )
 
-GDC_DATA_PATH = os.path.join(os.path.dirname(__file__), "./resources/cptac-3.csv")
-
 app = Flask("bdiviz_flask")
 app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024 * 1024
 app.logger.setLevel(logging.INFO)
 
+# Heavy singletons are created on first use, set BDIVIZ_WARMUP=1 to create
+# them in the background right after startup instead. The GDC target profiles
+# (value bins) are cheap and always built at startup.
+if os.environ.get("BDIVIZ_WARMUP", "0") == "1":
+    warmup_in_background()
+else:
+    warmup_in_background(["gdc_target_profiles"])
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    # Agent calls are charged to the session of the request
+    data = request.get_json(silent=True)
+    USAGE.set_current(
+        data.get("session_name", "default") if isinstance(data, dict) else "default"
+    )
+
+
+@app.after_request
+def record_latency(response):
+    if "request_start" in g:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_start,
+            # The route, not the path, so labels stay bounded
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=str(response.status_code),
+        )
+    return response
+
+
+@app.teardown_request
+def clear_usage_session(exc):
+    USAGE.set_current(None)
+
+
+@app.errorhandler(InferenceQueueFull)
+def inference_queue_full(e: InferenceQueueFull):
+    return {"message": "failure", "error": str(e)}, 503
+
+
+@app.errorhandler(SourceFileError)
+def source_file_error(e: SourceFileError):
+    return {"message": "failure", "error": str(e)}, 400
+
+
+@app.route("/api/health", methods=["GET"])
+def health():
+    return {
+        "message": "success",
+        "providers": provider_status(),
+        "inference": INFERENCE_SCHEDULER.stats(),
+        "memory": memory_writer_stats(),
+    }
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+@app.route("/api/admin/sessions", methods=["GET"])
+def admin_sessions():
+    """Approximate memory and cumulative CPU time per session, heaviest first."""
+    return {"message": "success", "sessions": SESSION_MANAGER.usage_report()}
+
 
 @app.route("/api/matching", methods=["POST"])
 def matcher():
     matching_task = SESSION_MANAGER.get_session("default").matching_task
 
-    target = pd.read_csv(GDC_DATA_PATH)
+    target = load_gdc_target()
 
     app.logger.info(request)
 
+    # Also keeps the upload on disk for load_cached_source
     source, _ = extract_data_from_request(request)
-    source.to_csv(".source.csv", index=False)
 
     app.logger.info("Matching task started!")
 
@@ -52,10 +136,10 @@ def get_exact_matches():
     matching_task = SESSION_MANAGER.get_session(session).matching_task
 
     if matching_task.source_df is None or matching_task.target_df is None:
-        if os.path.exists(".source.csv"):
-            source = pd.read_csv(".source.csv")
+        source = load_cached_source()
+        if source is not None:
             matching_task.update_dataframe(
-                source_df=source, target_df=pd.read_csv(GDC_DATA_PATH)
+                source_df=source, target_df=load_gdc_target()
             )
         _ = matching_task.get_candidates()
     results = matching_task.update_exact_matches()
@@ -69,17 +153,62 @@ def get_results():
     matching_task = SESSION_MANAGER.get_session(session).matching_task
 
     if matching_task.source_df is None or matching_task.target_df is None:
-        if os.path.exists(".source.csv"):
-            source = pd.read_csv(".source.csv")
+        source = load_cached_source()
+        if source is not None:
             matching_task.update_dataframe(
-                source_df=source, target_df=pd.read_csv(GDC_DATA_PATH)
+                source_df=source, target_df=load_gdc_target()
             )
         candidates = matching_task.get_candidates()
         # AGENT.remember_candidates(candidates)
 
-    results = matching_task.to_frontend_json()
+    # One consistent state, even if candidates are published meanwhile. The
+    # version lets the frontend follow up with /api/results/delta
+    snapshot = matching_task.snapshot
+    return conditional_json(
+        matching_task.get_state_tag(snapshot),
+        lambda: {
+            "message": "success",
+            "epoch": matching_task.epoch,
+            "version": snapshot.version,
+            "results": matching_task.to_frontend_json(snapshot),
+        },
+    )
 
-    return {"message": "success", "results": results}
+
+@app.route("/api/results/delta", methods=["POST"])
+def get_results_delta():
+    """
+    Changes since the version the frontend last synced, e.g.
+    {"epoch": "3f2a...", "since": 12}. Falls back to a full snapshot, as
+    /api/results returns it, when those changes are no longer in the log.
+    """
+    session = extract_session_name(request)
+    matching_task = SESSION_MANAGER.get_session(session).matching_task
+
+    data = request.json
+    since = int(data.get("since", -1))
+
+    snapshot = matching_task.snapshot
+    version = snapshot.version
+    changes = None
+    if data.get("epoch") == matching_task.epoch:
+        changes = matching_task.get_changes_since(since)
+
+    if changes is None:
+        return {
+            "message": "success",
+            "full": True,
+            "epoch": matching_task.epoch,
+            "version": version,
+            "results": matching_task.to_frontend_json(snapshot),
+        }
+    return {
+        "message": "success",
+        "full": False,
+        "epoch": matching_task.epoch,
+        "version": max([version] + [change["version"] for change in changes]),
+        "changes": changes,
+    }
 
 
 @app.route("/api/value/bins", methods=["POST"])
@@ -88,15 +217,28 @@ def get_unique_values():
     matching_task = SESSION_MANAGER.get_session(session).matching_task
 
     if matching_task.source_df is None or matching_task.target_df is None:
-        if os.path.exists(".source.csv"):
-            source = pd.read_csv(".source.csv")
+        source = load_cached_source()
+        if source is not None:
             matching_task.update_dataframe(
-                source_df=source, target_df=pd.read_csv(GDC_DATA_PATH)
+                source_df=source, target_df=load_gdc_target()
             )
         _ = matching_task.get_candidates()
-    results = matching_task.unique_values_to_frontend_json()
 
-    return {"message": "success", "results": results}
+    # Optional column lists, e.g. only the target columns of the candidates
+    data = request.json or {}
+
+    snapshot = matching_task.snapshot
+    return conditional_json(
+        matching_task.get_state_tag(snapshot),
+        lambda: {
+            "message": "success",
+            "results": matching_task.unique_values_to_frontend_json(
+                source_columns=data.get("sourceColumns"),
+                target_columns=data.get("targetColumns"),
+                snapshot=snapshot,
+            ),
+        },
+    )
 
 
 @app.route("/api/value/matches", methods=["POST"])
@@ -105,15 +247,21 @@ def get_value_matches():
     matching_task = SESSION_MANAGER.get_session(session).matching_task
 
     if matching_task.source_df is None or matching_task.target_df is None:
-        if os.path.exists(".source.csv"):
-            source = pd.read_csv(".source.csv")
+        source = load_cached_source()
+        if source is not None:
             matching_task.update_dataframe(
-                source_df=source, target_df=pd.read_csv(GDC_DATA_PATH)
+                source_df=source, target_df=load_gdc_target()
             )
         _ = matching_task.get_candidates()
-    results = matching_task.value_matches_to_frontend_json()
 
-    return {"message": "success", "results": results}
+    snapshot = matching_task.snapshot
+    return conditional_json(
+        matching_task.get_state_tag(snapshot),
+        lambda: {
+            "message": "success",
+            "results": matching_task.value_matches_to_frontend_json(snapshot),
+        },
+    )
 
 
 @app.route("/api/gdc/ontology", methods=["POST"])
@@ -122,15 +270,20 @@ def get_gdc_ontology():
     matching_task = SESSION_MANAGER.get_session(session).matching_task
 
     if matching_task.source_df is None or matching_task.target_df is None:
-        if os.path.exists(".source.csv"):
-            source = pd.read_csv(".source.csv")
+        source = load_cached_source()
+        if source is not None:
             matching_task.update_dataframe(
-                source_df=source, target_df=pd.read_csv(GDC_DATA_PATH)
+                source_df=source, target_df=load_gdc_target()
             )
         _ = matching_task.get_candidates()
-    results = matching_task._generate_gdc_ontology()
 
-    return {"message": "success", "results": results}
+    return conditional_json(
+        matching_task.get_state_tag(),
+        lambda: {
+            "message": "success",
+            "results": matching_task._generate_gdc_ontology(),
+        },
+    )
 
 
 @app.route("/api/gdc/property", methods=["POST"])
@@ -165,6 +318,142 @@ def get_candidates_results():
         return {"message": "failure", "results": None}
 
 
+@app.route("/api/candidates/results/export", methods=["POST"])
+def export_candidates_results():
+    """
+    The source harmonized to the accepted targets, streamed as CSV or Parquet:
+    the accepted target columns of every row, with the accepted value
+    matches applied. Body: {"format": "csv" | "parquet", "chunkRows": int}.
+    """
+    session = extract_session_name(request)
+    matching_task = SESSION_MANAGER.get_session(session).matching_task
+
+    format = request.json.get("format", "csv")
+    if format not in export_formats():
+        return {"message": "failure", "error": f"Unsupported format {format}"}, 400
+    try:
+        chunk_rows = int(request.json.get("chunkRows", EXPORT_CHUNK_ROWS))
+    except (TypeError, ValueError):
+        chunk_rows = 0
+    if chunk_rows < 1:
+        error = f"Invalid chunkRows: {request.json.get('chunkRows')}"
+        return {"message": "failure", "error": error}, 400
+
+    if matching_task.source_df is None or matching_task.target_df is None:
+        source = load_cached_source()
+        if source is None:
+            return {"message": "failure", "error": "No source uploaded"}, 400
+        matching_task.update_dataframe(source_df=source, target_df=load_gdc_target())
+        matching_task.get_candidates()
+
+    chunks = matching_task.iter_harmonized_chunks(chunk_rows)
+    response = Response(STREAMERS[format](chunks), mimetype=EXPORT_MIMETYPES[format])
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="harmonized.{format}"'
+    )
+    return response
+
+
+@app.route("/api/candidates/query", methods=["POST"])
+def query_candidates():
+    """
+    A window of the aggregated candidates, filtered server-side. Body, all optional:
+    {
+        "sourceColumns": [...], "matchers": [...], "status": ["idle", ...],
+        "threshold": 0.5, "categories": [...], "nodes": [...],
+        "cursor": "<nextCursor of the previous window>", "limit": 200,
+        "matcherWeights": {"magneto_zs_bp": 0.5, ...}
+    }
+    matcherWeights fuses the scores with the client's weights instead of the
+    published ones.
+    """
+    session = extract_session_name(request)
+    matching_task = SESSION_MANAGER.get_session(session).matching_task
+
+    data = request.json or {}
+    # Rejected before conditional_json, an error body must not get an ETag
+    try:
+        weights = _matcher_weights(data)
+        _check_query(data)
+    except ValueError as e:
+        return {"message": "failure", "error": str(e)}, 400
+
+    def build():
+        index = matching_task.get_candidate_index(weights)
+        results = index.query(
+            source_columns=data.get("sourceColumns"),
+            matchers=data.get("matchers"),
+            status=data.get("status"),
+            threshold=data.get("threshold"),
+            categories=data.get("categories"),
+            nodes=data.get("nodes"),
+            cursor=data.get("cursor"),
+            limit=data.get("limit", DEFAULT_PAGE_SIZE),
+        )
+        return {"message": "success", "results": results}
+
+    return conditional_json(matching_task.get_state_tag(), build)
+
+
+@app.route("/api/candidates/sources", methods=["POST"])
+def query_candidate_sources():
+    """
+    The source columns of the aggregated candidates with their status and
+    best score, for the heatmap's source list and pages. Body, optional:
+    {"matcherWeights": {...}} as for /api/candidates/query.
+    """
+    session = extract_session_name(request)
+    matching_task = SESSION_MANAGER.get_session(session).matching_task
+
+    data = request.json or {}
+    try:
+        weights = _matcher_weights(data)
+    except ValueError as e:
+        return {"message": "failure", "error": str(e)}, 400
+
+    def build():
+        index = matching_task.get_candidate_index(weights)
+        return {"message": "success", "results": index.source_columns()}
+
+    return conditional_json(matching_task.get_state_tag(), build)
+
+
+def _matcher_weights(data: dict) -> Optional[Dict[str, float]]:
+    """
+    The "matcherWeights" of a request body, None when it is not given.
+
+    Raises:
+        ValueError: When it is not an object of finite numbers.
+    """
+    weights = data.get("matcherWeights")
+    if weights is None:
+        return None
+    if not isinstance(weights, dict):
+        raise ValueError("matcherWeights must be an object of matcher weights")
+    try:
+        weights = {str(name): float(weight) for name, weight in weights.items()}
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid matcherWeights: {data['matcherWeights']}")
+    if not all(math.isfinite(weight) for weight in weights.values()):
+        raise ValueError(f"Invalid matcherWeights: {data['matcherWeights']}")
+    return weights
+
+
+def _check_query(data: dict) -> None:
+    """Raises ValueError for a /api/candidates/query body query cannot run."""
+    for name in ["sourceColumns", "matchers", "status", "categories", "nodes"]:
+        if data.get(name) is not None and not isinstance(data[name], list):
+            raise ValueError(f"{name} must be a list")
+    for name, convert in [("threshold", float), ("limit", int)]:
+        if data.get(name) is not None:
+            try:
+                convert(data[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {name}: {data[name]}")
+    if data.get("cursor"):
+        decode_cursor(data["cursor"])
+
+
 @app.route("/api/agent", methods=["POST"])
 def ask_agent():
     data = request.json
@@ -375,6 +664,22 @@ def user_operation():
 
     operation_objs = request.json["userOperations"]
 
+    if len(operation_objs) > 1:
+        # Bulk operations: one pass, one weight update, one history entry
+        # and one batch of memory writes
+        matching_task.apply_operations(
+            [
+                UserOperation(
+                    operation_obj["operation"],
+                    operation_obj["candidate"],
+                    operation_obj.get("references", []),
+                )
+                for operation_obj in operation_objs
+            ]
+        )
+        AGENT.remember_operations(operation_objs)
+        return {"message": "success"}
+
     for operation_obj in operation_objs:
         operation = operation_obj["operation"]
         candidate = operation_obj["candidate"]
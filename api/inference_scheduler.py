@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+# Inference runs at once, each with INFERENCE_THREADS intra-op threads
+INFERENCE_SLOTS = int(os.environ.get("BDIVIZ_INFERENCE_SLOTS", "1"))
+INFERENCE_THREADS = int(
+    os.environ.get(
+        "BDIVIZ_INFERENCE_THREADS",
+        str(max(1, (os.cpu_count() or 1) // max(1, INFERENCE_SLOTS))),
+    )
+)
+# Waiting runs beyond this are rejected with InferenceQueueFull
+INFERENCE_QUEUE_SIZE = int(os.environ.get("BDIVIZ_INFERENCE_QUEUE_SIZE", "64"))
+
+# Set before torch is imported, its OpenMP pool is sized on first use
+os.environ.setdefault("OMP_NUM_THREADS", str(INFERENCE_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(INFERENCE_THREADS))
+
+
+class InferenceQueueFull(RuntimeError):
+    pass
+
+
+class _Ticket:
+    def __init__(self, session: str, kind: str) -> None:
+        self.session = session
+        self.kind = kind
+        self.enqueued = time.perf_counter()
+        self.granted = False
+
+
+class InferenceScheduler:
+    """
+    Process-wide gate for model inference (embeddings, Magneto, bdi-kit).
+
+    At most `slots` inference runs execute at once, each using
+    `intra_op_threads` torch / ONNX Runtime threads, so concurrent sessions
+    share the cores instead of each starting a thread per core. Waiting runs
+    are queued per session and slots are granted round-robin across
+    sessions, so a session queueing many runs does not starve the others.
+
+        with INFERENCE_SCHEDULER.slot(session, "embedding"):
+            embeddings = model(...)
+
+    A thread already holding a slot re-enters without queueing again.
+    """
+
+    def __init__(
+        self,
+        slots: int = INFERENCE_SLOTS,
+        intra_op_threads: int = INFERENCE_THREADS,
+        max_queue: int = INFERENCE_QUEUE_SIZE,
+    ) -> None:
+        self.slots = max(1, slots)
+        self.intra_op_threads = max(1, intra_op_threads)
+        self.max_queue = max_queue
+
+        self.condition = threading.Condition()
+        self.queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self.active: Dict[str, int] = {}
+        self.local = threading.local()
+        self.torch_configured = False
+
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds: Deque[float] = deque(maxlen=1000)
+        self.run_seconds: Deque[float] = deque(maxlen=1000)
+
+    @contextmanager
+    def slot(
+        self, session: str = "default", kind: str = "inference"
+    ) -> Iterator[None]:
+        """
+        Wait for an inference slot, fairly shared between sessions.
+
+        Raises:
+            InferenceQueueFull: When max_queue runs are already waiting.
+        """
+        if getattr(self.local, "depth", 0) > 0:
+            self.local.depth += 1
+            try:
+                yield
+            finally:
+                self.local.depth -= 1
+            return
+
+        ticket = self._acquire(session, kind)
+        self._configure_torch()
+        self.local.depth = 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.local.depth = 0
+            self._release(ticket, time.perf_counter() - started)
+
+    def queue_depth(self) -> int:
+        with self.condition:
+            return self._queue_depth()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            waits = sorted(self.wait_seconds)
+            runs = list(self.run_seconds)
+            return {
+                "slots": self.slots,
+                "intraOpThreads": self.intra_op_threads,
+                "active": sum(self.active.values()),
+                "activeBySession": dict(self.active),
+                "queueDepth": self._queue_depth(),
+                "queueBySession": {
+                    session: len(queue) for session, queue in self.queues.items()
+                },
+                "completed": self.completed,
+                "rejected": self.rejected,
+                # Over the last 1000 runs
+                "waitSecondsMean": sum(waits) / len(waits) if waits else 0.0,
+                "waitSecondsP95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "waitSecondsMax": waits[-1] if waits else 0.0,
+                "runSecondsMean": sum(runs) / len(runs) if runs else 0.0,
+            }
+
+    def _acquire(self, session: str, kind: str) -> _Ticket:
+        ticket = _Ticket(session, kind)
+        with self.condition:
+            if self._queue_depth() >= self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFull(
+                    f"{self.max_queue} inference runs are already waiting, "
+                    "try again later."
+                )
+            self.queues.setdefault(session, deque()).append(ticket)
+            self._grant()
+            try:
+                while not ticket.granted:
+                    self.condition.wait()
+            except BaseException:
+                if ticket.granted:
+                    self._finish(ticket)
+                else:
+                    self.queues[session].remove(ticket)
+                    if not self.queues[session]:
+                        del self.queues[session]
+                raise
+            wait = time.perf_counter() - ticket.enqueued
+            self.wait_seconds.append(wait)
+        if wait > 1:
+            logger.info(f"[Inference] {session} waited {wait:.1f}s for a {kind} slot")
+        return ticket
+
+    def _release(self, ticket: _Ticket, run_seconds: float) -> None:
+        with self.condition:
+            self.completed += 1
+            self.run_seconds.append(run_seconds)
+            self._finish(ticket)
+
+    def _finish(self, ticket: _Ticket) -> None:
+        self.active[ticket.session] -= 1
+        if self.active[ticket.session] == 0:
+            del self.active[ticket.session]
+        self._grant()
+
+    def _grant(self) -> None:
+        # Round-robin: the session served goes to the back of the line
+        granted = False
+        while sum(self.active.values()) < self.slots and self.queues:
+            session, queue = self.queues.popitem(last=False)
+            ticket = queue.popleft()
+            if queue:
+                self.queues[session] = queue
+            ticket.granted = True
+            self.active[session] = self.active.get(session, 0) + 1
+            granted = True
+        if granted:
+            self.condition.notify_all()
+
+    def _queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _configure_torch(self) -> None:
+        if self.torch_configured:
+            return
+        self.torch_configured = True
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(self.intra_op_threads)
+
+
+INFERENCE_SCHEDULER = InferenceScheduler()
@@ -17,11 +17,15 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel
 
+from ..metrics import AGENT_SECONDS
+from ..session_usage import USAGE
 from ..tools.candidate_butler import CandidateButler
 from ..tools.rag_researcher import retrieve_from_rag
+from ..providers import LazyProvider
 from ..tools.source_scraper import scraping_websource
 from ..utils import load_gdc_property
 from .memory import MemoryRetriver
+from .memory_writer import MemoryWriter
 from .pydantic import (
     ActionResponse,
     AgentSuggestions,
@@ -50,6 +54,8 @@ class Agent:
 
         # self.memory = MemorySaver()
         self.store = MemoryRetriver()
+        # remember_* only queue the memories, reads of them flush it first
+        self.writer = MemoryWriter(self.store)
 
         self.system_messages = [
             """
@@ -92,6 +98,9 @@ class Agent:
         logger.info(f"[Agent] Explaining the candidate...")
         # logger.info(f"{diagnose}")
 
+        # Remembered judgements and explanations must be visible to the search
+        self.writer.flush()
+
         # search for related false negative / false positive candidates
         related_matches = self.store.search_matches(candidate["sourceColumn"], limit=3)
         related_mismatches = self.store.search_mismatches(
@@ -320,17 +329,28 @@ Candidate: {candidate}
 
     def remember_fp(self, candidate: Dict[str, Any]) -> None:
         logger.info(f"[Agent] Remembering the false positive...")
-        self.store.put_mismatch(candidate)
+        self.writer.put_mismatch(candidate)
 
     def remember_fn(self, candidate: Dict[str, Any]) -> None:
         logger.info(f"[Agent] Remembering the false negative...")
-        self.store.put_match(candidate)
+        self.writer.put_match(candidate)
 
     def remember_explanation(
         self, explanations: List[Dict[str, Any]], user_operation: Dict[str, Any]
     ) -> None:
         logger.info(f"[Agent] Remembering the explanation...")
-        self.store.put_explanation(explanations, user_operation)
+        self.writer.put_explanation(explanations, user_operation)
+
+    def remember_operations(self, operations: List[Dict[str, Any]]) -> None:
+        """
+        remember_fn of the accepted and remember_fp of the rejected
+        candidates of many user operations, embedded in one batch.
+        """
+        logger.info(f"[Agent] Remembering {len(operations)} user operations...")
+        self.writer.put_judgements(
+            [op["candidate"] for op in operations if op["operation"] == "accept"],
+            [op["candidate"] for op in operations if op["operation"] == "reject"],
+        )
 
     def remember_candidates(self, candidates: List[Dict[str, Any]]) -> None:
         logger.info(f"[Agent] Remembering the candidates...")
@@ -340,29 +360,31 @@ Candidate: {candidate}
     def invoke(
         self, prompt: str, tools: List, output_structure: BaseModel
     ) -> BaseModel:
-        output_parser = PydanticOutputParser(pydantic_object=output_structure)
-
-        prompt = self.generate_prompt(prompt, output_parser)
-        agent_executor = create_react_agent(
-            self.llm, tools, store=self.store
-        )  # checkpointer=self.memory
-
-        responses = []
-        for chunk in agent_executor.stream(
-            {
-                "messages": [
-                    SystemMessage(content=self.system_messages[0]),
-                    HumanMessage(content=prompt),
-                ]
-            },
-            self.agent_config,
-        ):
-            logger.info(chunk)
-            logger.info("----")
-            responses.append(chunk)
-
-        final_response = responses[-1]["agent"]["messages"][0].content
-        response = output_parser.parse(final_response)
+        name = output_structure.__name__
+        with AGENT_SECONDS.time(output=name), USAGE.track_current(f"agent:{name}"):
+            output_parser = PydanticOutputParser(pydantic_object=output_structure)
+
+            prompt = self.generate_prompt(prompt, output_parser)
+            agent_executor = create_react_agent(
+                self.llm, tools, store=self.store
+            )  # checkpointer=self.memory
+
+            responses = []
+            for chunk in agent_executor.stream(
+                {
+                    "messages": [
+                        SystemMessage(content=self.system_messages[0]),
+                        HumanMessage(content=prompt),
+                    ]
+                },
+                self.agent_config,
+            ):
+                logger.info(chunk)
+                logger.info("----")
+                responses.append(chunk)
+
+            final_response = responses[-1]["agent"]["messages"][0].content
+            response = output_parser.parse(final_response)
 
         return response
 
@@ -394,4 +416,5 @@ Prompt: {prompt}
         return template
 
 
-AGENT = Agent()
+# Created on first use, loading the LLM client and the memory store is slow
+AGENT = LazyProvider("agent", Agent)
@@ -1,14 +1,18 @@
 import json
 import logging
 import os
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 from langchain.embeddings import init_embeddings
 from langchain.tools import StructuredTool
 from langchain_huggingface import HuggingFaceEmbeddings
+from langgraph.store.base import get_text_at_path
 from langgraph.store.memory import InMemoryStore
 
+from .memory_snapshot import MemorySnapshot, SnapshotEmbeddings
+
 logger = logging.getLogger("bdiviz_flask.sub")
 
 FN_CANDIDATES = [
@@ -99,23 +103,38 @@ class MemoryRetriver:
         "explanations",
     ]
 
-    def __init__(self):
+    def __init__(self, persist: bool = True, seed: bool = False):
         # embeddings = init_embeddings("openai:text-embedding-3-large")
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        # The model is loaded on the first cache miss, restoring the snapshot
+        # below does not need it
+        self.embeddings = SnapshotEmbeddings(
+            lambda: HuggingFaceEmbeddings(
+                model_name="sentence-transformers/all-MiniLM-L6-v2"
+            )
         )
         self.store = InMemoryStore(
             index={
-                "embed": embeddings,
+                "embed": self.embeddings,
                 "dims": 1536,
             }
         )
         self.user_id = "bdi_viz_user"
-
-        # for fp in FP_CANDIDATES:
-        #     self.put_mismatch(fp)
-        # for fn in FN_CANDIDATES:
-        #     self.put_match(fn)
+        self.put_lock = threading.Lock()
+
+        self.snapshot = None
+        if persist:
+            self.snapshot = MemorySnapshot(self.supported_namespaces)
+            self._restore_snapshot()
+
+        # The defaults are persisted like any other memory, so seeding only
+        # embeds them on the very first start
+        if seed:
+            for fp in FP_CANDIDATES:
+                if not self._has_key("mismatches", fp):
+                    self.put_mismatch(fp)
+            for fn in FN_CANDIDATES:
+                if not self._has_key("matches", fn):
+                    self.put_match(fn)
 
         self.query_candidates_tool = StructuredTool.from_function(
             func=self.query_candidates,
@@ -206,34 +225,24 @@ class MemoryRetriver:
         key = f"{value['sourceColumn']}::{value['targetColumn']}"
         self.put((self.user_id, "mismatches"), key, value)
 
-    def put_explanation(
-        self, explanations: List[Dict[str, Any]], user_operation: Dict[str, Any]
-    ) -> None:
-        """
-        Args:
-            explanations (List[Dict[str, Any]]): A list of explanations to store in the memory.
-            {
-                'type': ExplanationType;
-                'content': string;
-                'confidence': number;
-            }
+    @staticmethod
+    def explanation_key(user_operation: Dict[str, Any]) -> str:
+        return f"{user_operation['operation']}::{user_operation['candidate']['sourceColumn']}::{user_operation['candidate']['targetColumn']}"
 
-            user_operation (Dict[str, Any]): The user operation to store in the memory.
-            {
-                'operation': string;
-                'candidate': {
-                    'sourceColumn': string;
-                    'targetColumn': string;
-                };
-            }
+    def explanations_after(
+        self, key: str, puts: List[List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
         """
-
-        key = f"{user_operation['operation']}::{user_operation['candidate']['sourceColumn']}::{user_operation['candidate']['targetColumn']}"
-
-        # Only keep at most 5 most recent explanations
-        existing_explanations = self.store.get((self.user_id, "explanations"), key)
-        if existing_explanations is not None:
-            existing_explanations = existing_explanations.value
+        The explanations stored under `key` once the explanations of each of
+        `puts` are put in turn, oldest first, without writing them.
+        """
+        existing = self.store.get((self.user_id, "explanations"), key)
+        merged = existing.value if existing is not None else None
+        for explanations in puts:
+            if merged is None:
+                merged = explanations
+                continue
+            # Only keep at most 5 most recent explanations
             explanations = [
                 {
                     "type": explanation["type"],
@@ -243,8 +252,8 @@ class MemoryRetriver:
                 }
                 for explanation in explanations
             ]
-            explanations = (explanations + existing_explanations)[:5]
-        self.put((self.user_id, "explanations"), key, explanations)
+            merged = (explanations + merged)[:5]
+        return merged
 
     # Search
     def search_candidates(self, query: Dict[str, Any], limit: int = 10):
@@ -274,13 +283,51 @@ class MemoryRetriver:
     def put(self, namespace: Tuple, key: Optional[str], value: Any):
         if key is None:
             key = str(uuid4())
+        with self.put_lock:
+            self._put(namespace, key, value)
+
+    def put_many(self, items: List[Tuple[Tuple, Optional[str], Any]]) -> None:
+        """
+        Put several (namespace, key, value) memories with one call of the
+        embedding model, instead of one call per put.
+        """
+        items = [
+            (namespace, str(uuid4()) if key is None else key, value)
+            for namespace, key, value in items
+        ]
+        for namespace, key, value in items:
+            self._check(namespace, key, value)
+        if not items:
+            return
+        with self.put_lock:
+            # Embed the texts the store indexes for all values at once, the
+            # puts below then find their vectors in the cache
+            self.embeddings.embed_documents(
+                [text for _, _, value in items for text in self._index_texts(value)]
+            )
+            for namespace, key, value in items:
+                self._put(namespace, key, value)
+
+    def _index_texts(self, value: Any) -> List[str]:
+        """The texts the store embeds for `value`, one per indexed field."""
+        fields = self.store.index_config.get("fields") or ["$"]
+        return [text for field in fields for text in get_text_at_path(value, field)]
+
+    @check_value
+    def _check(self, namespace: Tuple, key: Optional[str], value: Any) -> None:
+        """Raises like put for a missing value or an unsupported namespace."""
+
+    def _put(self, namespace: Tuple, key: str, value: Any) -> None:
         if self.store.get(namespace, key) is not None:
             logger.debug(
                 f"Key {key} already exists in namespace {namespace}, updating value"
             )
             self.store.delete(namespace, key)
 
+        self.embeddings.drain()
         self.store.put(namespace, key, value)
+        if self.snapshot is not None:
+            self.snapshot.append(namespace[1], key, value, self.embeddings.drain())
 
     async def aput(self, namespace: Tuple, key: Optional[str], value: Any):
         if key is None:
@@ -292,7 +339,13 @@ class MemoryRetriver:
             )
             await self.store.adelete(namespace, key)
 
-        await self.store.aput(namespace, key, value)
+        with self.put_lock:
+            self.embeddings.drain()
+            await self.store.aput(namespace, key, value)
+            if self.snapshot is not None:
+                self.snapshot.append(
+                    namespace[1], key, value, self.embeddings.drain()
+                )
 
     def search(self, namespace: Tuple, query: Any, limit: int = 10):
         logger.critical(f"namespace: {namespace}, query: {query}, limit: {limit}")
@@ -301,3 +354,23 @@ class MemoryRetriver:
 
     def clear_namespace(self, namespace: Tuple):
         self.store.delete(namespace)
+        if self.snapshot is not None:
+            self.snapshot.clear(namespace[1])
+
+    # Persistence
+    def _restore_snapshot(self) -> None:
+        snapshot = self.snapshot.load()
+        for namespace, entries in snapshot.items():
+            for key, entry in entries.items():
+                # Seed the cached vectors so the store does not re-embed them
+                self.embeddings.seed(entry["texts"], entry["vectors"])
+                self.store.put((self.user_id, namespace), key, entry["value"])
+            if entries:
+                logger.info(
+                    f"[Memory] Restored {len(entries)} memories in namespace {namespace}"
+                )
+        self.embeddings.drain()
+
+    def _has_key(self, namespace: str, value: Dict[str, Any]) -> bool:
+        key = f"{value['sourceColumn']}::{value['targetColumn']}"
+        return self.store.get((self.user_id, namespace), key) is not None
@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..utils import CACHE_DIR
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+MEMORY_SNAPSHOT_DIR = os.path.join(CACHE_DIR, "memory")
+
+VECTORS_FILENAME = "vectors.f32"
+VALUES_FILENAME = "values.jsonl"
+META_FILENAME = "meta.json"
+
+
+class SnapshotEmbeddings(Embeddings):
+    """Embeddings wrapper that serves vectors restored from disk.
+
+    The wrapped embedding model is only created on the first cache miss, so a
+    warm snapshot can be replayed into the store without loading the model.
+    Every text embedded for documents is remembered until ``drain`` is called,
+    which lets the persistence layer append exactly the vectors the store used.
+    """
+
+    def __init__(self, embeddings_factory: Callable[[], Embeddings]) -> None:
+        self._embeddings_factory = embeddings_factory
+        self._embeddings: Optional[Embeddings] = None
+        self._cache: Dict[str, np.ndarray] = {}
+        self._recent: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        with self._lock:
+            if self._embeddings is None:
+                logger.info("[Memory] Loading embedding model...")
+                self._embeddings = self._embeddings_factory()
+            return self._embeddings
+
+    def seed(self, texts: List[str], vectors: np.ndarray) -> None:
+        for text, vector in zip(texts, vectors):
+            self._cache[text] = vector
+
+    def drain(self) -> Dict[str, np.ndarray]:
+        recent, self._recent = self._recent, {}
+        return recent
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing = [text for text in dict.fromkeys(texts) if text not in self._cache]
+        if missing:
+            vectors = self.embeddings.embed_documents(missing)
+            for text, vector in zip(missing, vectors):
+                self._cache[text] = np.asarray(vector, dtype=np.float32)
+
+        for text in texts:
+            self._recent[text] = self._cache[text]
+        return [self._cache[text].tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+class NamespaceSnapshot:
+    """On-disk snapshot of a single memory namespace.
+
+    Layout of ``<root>/<namespace>/``:
+    - ``vectors.f32``: raw float32 rows, opened as a memory-mapped array on load.
+    - ``values.jsonl``: append-only value log, one record per put or delete.
+      Put records point at the rows in ``vectors.f32`` that hold the
+      embeddings of their texts, later records supersede earlier ones.
+    - ``meta.json``: the embedding dimension of the rows.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.namespace = os.path.basename(path)
+        self.path = path
+        self.vectors_path = os.path.join(self.path, VECTORS_FILENAME)
+        self.values_path = os.path.join(self.path, VALUES_FILENAME)
+        self.meta_path = os.path.join(self.path, META_FILENAME)
+
+        self.dims: Optional[int] = None
+        self.n_rows = 0
+        self.n_records = 0
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            Dict[str, Dict[str, Any]]: The live entries keyed by memory key, e.g.
+            {"Race::race": {"value": {...}, "texts": [...], "vectors": np.ndarray}}
+        """
+        self.n_rows = 0
+        self.n_records = 0
+        if not os.path.exists(self.values_path):
+            return {}
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                self.dims = json.load(f)["dims"]
+
+        vectors = None
+        if self.dims and os.path.exists(self.vectors_path):
+            self.n_rows = os.path.getsize(self.vectors_path) // (4 * self.dims)
+            if self.n_rows > 0:
+                vectors = np.memmap(
+                    self.vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(self.n_rows, self.dims),
+                )
+
+        entries = {}
+        with open(self.values_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write at the tail of the log, ignore it
+                    logger.warning(
+                        f"[Memory] Skipping corrupted record in {self.values_path}"
+                    )
+                    continue
+                self.n_records += 1
+
+                if record["op"] == "delete":
+                    entries.pop(record["key"], None)
+                    continue
+
+                offset, count = record["offset"], len(record["texts"])
+                if vectors is None or offset + count > self.n_rows:
+                    logger.warning(
+                        f"[Memory] Missing vectors for {record['key']} in {self.namespace}"
+                    )
+                    continue
+                entries[record["key"]] = {
+                    "value": record["value"],
+                    "texts": record["texts"],
+                    "vectors": vectors[offset : offset + count],
+                }
+        return entries
+
+    def append(self, key: str, value: Any, texts: List[str], vectors: np.ndarray):
+        os.makedirs(self.path, exist_ok=True)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dims is None and len(vectors) > 0:
+            self.dims = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"dims": self.dims}, f)
+
+        # Vectors first, so a record never points at rows that are not on disk
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        record = {
+            "op": "put",
+            "key": key,
+            "value": value,
+            "texts": texts,
+            "offset": self.n_rows,
+        }
+        with open(self.values_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+        self.n_rows += len(vectors)
+        self.n_records += 1
+
+    def delete(self, key: str) -> None:
+        if not os.path.exists(self.values_path):
+            return
+        with open(self.values_path, "a") as f:
+            f.write(json.dumps({"op": "delete", "key": key}) + "\n")
+        self.n_records += 1
+
+    def compact(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Rewrite the snapshot with only the live entries."""
+        tmp = NamespaceSnapshot(self.path + ".compact")
+        tmp.clear()
+        os.makedirs(tmp.path, exist_ok=True)
+        for key, entry in entries.items():
+            tmp.append(key, entry["value"], entry["texts"], np.array(entry["vectors"]))
+
+        for filename in [VECTORS_FILENAME, VALUES_FILENAME, META_FILENAME]:
+            src = os.path.join(tmp.path, filename)
+            dst = os.path.join(self.path, filename)
+            if os.path.exists(src):
+                os.replace(src, dst)
+            elif os.path.exists(dst):
+                # Not written for an empty snapshot, the old file is stale
+                os.remove(dst)
+        os.rmdir(tmp.path)
+
+        self.dims = tmp.dims
+        self.n_rows = tmp.n_rows
+        self.n_records = tmp.n_records
+
+    def clear(self) -> None:
+        for filename in [VECTORS_FILENAME, VALUES_FILENAME, META_FILENAME]:
+            path = os.path.join(self.path, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        self.dims = None
+        self.n_rows = 0
+        self.n_records = 0
+
+
+class MemorySnapshot:
+    """Persistence layer for ``MemoryRetriver``, one snapshot per namespace."""
+
+    def __init__(self, namespaces: List[str], root: str = MEMORY_SNAPSHOT_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.namespaces = {
+            namespace: NamespaceSnapshot(os.path.join(root, namespace))
+            for namespace in namespaces
+        }
+
+    def load(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        ret = {}
+        with self.lock:
+            for namespace, snapshot in self.namespaces.items():
+                entries = snapshot.load()
+                # Compact once superseded records outnumber the live ones
+                if snapshot.n_records > 2 * max(len(entries), 1):
+                    logger.info(f"[Memory] Compacting {namespace} snapshot...")
+                    snapshot.compact(entries)
+                    entries = snapshot.load()
+                ret[namespace] = entries
+        return ret
+
+    def append(
+        self, namespace: str, key: str, value: Any, embedded: Dict[str, np.ndarray]
+    ) -> None:
+        texts = list(embedded.keys())
+        vectors = np.array([embedded[text] for text in texts], dtype=np.float32)
+        with self.lock:
+            self.namespaces[namespace].append(key, value, texts, vectors)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self.lock:
+            self.namespaces[namespace].delete(key)
+
+    def clear(self, namespace: str) -> None:
+        with self.lock:
+            self.namespaces[namespace].clear()
+
+    def stats(self) -> Dict[str, Tuple[int, int]]:
+        return {
+            namespace: (snapshot.n_records, snapshot.n_rows)
+            for namespace, snapshot in self.namespaces.items()
+        }
@@ -0,0 +1,309 @@
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..session_usage import USAGE
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+# Memories waiting to be written, writers block beyond this
+MEMORY_QUEUE_SIZE = int(os.environ.get("BDIVIZ_MEMORY_QUEUE_SIZE", "1000"))
+# Seconds a writer waits for room in a full queue before dropping its write
+MEMORY_ENQUEUE_TIMEOUT = float(os.environ.get("BDIVIZ_MEMORY_ENQUEUE_TIMEOUT", "30"))
+# Memories embedded in one call of the embedding model
+MEMORY_BATCH_SIZE = int(os.environ.get("BDIVIZ_MEMORY_BATCH_SIZE", "64"))
+# Seconds flush waits for earlier writes before reading memory anyway
+MEMORY_FLUSH_TIMEOUT = float(os.environ.get("BDIVIZ_MEMORY_FLUSH_TIMEOUT", "30"))
+
+MEMORY_WRITERS: List["MemoryWriter"] = []
+
+
+class _PendingWrite:
+    def __init__(
+        self, namespace: Tuple, key: str, seq: int, session: Optional[str]
+    ) -> None:
+        self.namespace = namespace
+        self.key = key
+        # Writes first_seq..seq to this key are coalesced into this one
+        self.first_seq = seq
+        self.seq = seq
+        self.session = session
+        self.enqueued = time.perf_counter()
+        self.value: Any = None
+        # For explanations, the explanations of every coalesced put, oldest
+        # first, merged with the stored ones when written
+        self.explanations: Optional[List[List[Dict[str, Any]]]] = None
+
+
+class MemoryWriter:
+    """
+    Writes agent memories in a background thread, so that requests only pay
+    for queueing them and not for embedding them.
+
+    Writes to a key already waiting are coalesced into the waiting one (the
+    last value wins, explanations are merged by explanations_after), and
+    the worker writes up to `batch_size` memories with one MemoryRetriver
+    put_many call, in the order they were first queued. Reads that must see
+    earlier writes flush first:
+
+        writer.put_mismatch(candidate)
+        writer.flush()
+        store.search_mismatches(...)
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        max_queue: int = MEMORY_QUEUE_SIZE,
+        batch_size: int = MEMORY_BATCH_SIZE,
+        enqueue_timeout: Optional[float] = MEMORY_ENQUEUE_TIMEOUT,
+    ) -> None:
+        self.store = store
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.enqueue_timeout = enqueue_timeout
+
+        self.condition = threading.Condition()
+        self.pending: "OrderedDict[Tuple[Tuple, str], _PendingWrite]" = OrderedDict()
+        self.in_flight: List[_PendingWrite] = []
+        self.seq = 0
+        self.thread: Optional[threading.Thread] = None
+
+        self.applied = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        MEMORY_WRITERS.append(self)
+
+    # Queued versions of the MemoryRetriver puts, the only writers of
+    # judgements and explanations
+    def put_match(self, value: Dict[str, Any]) -> None:
+        self._enqueue((self.store.user_id, "matches"), _candidate_key(value), value)
+
+    def put_mismatch(self, value: Dict[str, Any]) -> None:
+        self._enqueue(
+            (self.store.user_id, "mismatches"), _candidate_key(value), value
+        )
+
+    def put_judgements(
+        self, matches: List[Dict[str, Any]], mismatches: List[Dict[str, Any]]
+    ) -> None:
+        for value in matches:
+            self.put_match(value)
+        for value in mismatches:
+            self.put_mismatch(value)
+
+    def put_explanation(
+        self, explanations: List[Dict[str, Any]], user_operation: Dict[str, Any]
+    ) -> None:
+        """
+        Args:
+            explanations (List[Dict[str, Any]]): A list of explanations to store in the memory.
+            {
+                'type': ExplanationType;
+                'content': string;
+                'confidence': number;
+            }
+
+            user_operation (Dict[str, Any]): The user operation to store in the memory.
+            {
+                'operation': string;
+                'candidate': {
+                    'sourceColumn': string;
+                    'targetColumn': string;
+                };
+            }
+        """
+        self._enqueue(
+            (self.store.user_id, "explanations"),
+            self.store.explanation_key(user_operation),
+            explanations=explanations,
+        )
+
+    def flush(self, timeout: Optional[float] = MEMORY_FLUSH_TIMEOUT) -> bool:
+        """
+        Wait until every write queued before the call is written (or failed).
+
+        Returns:
+            bool: False if `timeout` seconds passed first.
+        """
+        with self.condition:
+            target = self.seq
+            flushed = self.condition.wait_for(
+                lambda: self._oldest_seq() > target, timeout
+            )
+        if not flushed:
+            logger.warning(
+                f"[Memory] Flush timed out after {timeout}s, "
+                f"{self.stats()['depth']} memories still queued"
+            )
+        return flushed
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            oldest = self._oldest()
+            return {
+                "depth": len(self.pending) + len(self.in_flight),
+                "inFlight": len(self.in_flight),
+                "lagSeconds": (
+                    time.perf_counter() - oldest.enqueued if oldest else 0.0
+                ),
+                "applied": self.applied,
+                "coalesced": self.coalesced,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "batches": self.batches,
+            }
+
+    def close(self) -> None:
+        """Write what is still queued, e.g. before the process exits."""
+        if self.thread is not None:
+            self.flush()
+
+    def _enqueue(
+        self,
+        namespace: Tuple,
+        key: str,
+        value: Any = None,
+        explanations: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        session = USAGE.current()
+        with self.condition:
+            self._start()
+            # Backpressure: wait for room unless the write can be coalesced
+            has_room = self.condition.wait_for(
+                lambda: (namespace, key) in self.pending
+                or len(self.pending) < self.max_queue,
+                self.enqueue_timeout,
+            )
+            if not has_room:
+                # The worker is stuck or far behind, do not hang the request
+                self.dropped += 1
+                logger.warning(
+                    f"[Memory] Queue still full after {self.enqueue_timeout}s, "
+                    f"dropping the write to {namespace[-1]} {key}"
+                )
+                return
+            self.seq += 1
+            entry = self.pending.get((namespace, key))
+            if entry is None:
+                entry = _PendingWrite(namespace, key, self.seq, session)
+                self.pending[(namespace, key)] = entry
+            else:
+                entry.seq = self.seq
+                entry.session = session
+                self.coalesced += 1
+
+            if explanations is not None:
+                entry.explanations = (entry.explanations or []) + [explanations]
+            else:
+                entry.value = value
+            self.condition.notify_all()
+
+    def _start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="memory-writer", daemon=True
+            )
+            self.thread.start()
+            atexit.register(self.close)
+
+    def _oldest(self) -> Optional[_PendingWrite]:
+        # In-flight writes were all queued before the pending ones
+        if self.in_flight:
+            return self.in_flight[0]
+        return next(iter(self.pending.values()), None)
+
+    def _oldest_seq(self) -> float:
+        oldest = self._oldest()
+        return oldest.first_seq if oldest else math.inf
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                batch = []
+                while self.pending and len(batch) < self.batch_size:
+                    batch.append(self.pending.popitem(last=False)[1])
+                self.in_flight = batch
+                self.condition.notify_all()
+
+            self._write(batch)
+
+            with self.condition:
+                self.in_flight = []
+                self.condition.notify_all()
+
+    def _write(self, batch: List[_PendingWrite]) -> None:
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        try:
+            # The worker is the only writer, so the merged explanations read
+            # here are still current when put
+            self.store.put_many(
+                [
+                    (
+                        entry.namespace,
+                        entry.key,
+                        (
+                            self.store.explanations_after(
+                                entry.key, entry.explanations
+                            )
+                            if entry.explanations is not None
+                            else entry.value
+                        ),
+                    )
+                    for entry in batch
+                ]
+            )
+        except Exception:
+            logger.exception(f"[Memory] Failed to write {len(batch)} memories")
+            failed, applied = len(batch), 0
+        else:
+            failed, applied = 0, len(batch)
+        cpu = time.thread_time() - cpu
+        wall = time.perf_counter() - wall
+
+        with self.condition:
+            self.applied += applied
+            self.failed += failed
+            self.batches += 1
+        logger.info(
+            f"[Memory] Wrote {applied} memories in {wall:.2f}s "
+            f"({len(self.pending)} queued)"
+        )
+
+        # Charge the sessions that queued the writes, by their share of them
+        sessions = Counter(entry.session for entry in batch if entry.session)
+        for session, count in sessions.items():
+            share = count / len(batch)
+            USAGE.get(session).add("agent:remember", cpu * share, wall * share)
+
+
+def memory_writer_stats() -> Dict[str, Any]:
+    """Queue stats summed over the writers, the lag is that of the oldest write."""
+    stats = [writer.stats() for writer in MEMORY_WRITERS]
+    totals = {
+        name: sum(writer[name] for writer in stats)
+        for name in [
+            "depth",
+            "inFlight",
+            "applied",
+            "coalesced",
+            "failed",
+            "dropped",
+            "batches",
+        ]
+    }
+    totals["lagSeconds"] = max((writer["lagSeconds"] for writer in stats), default=0.0)
+    return totals
+
+
+def _candidate_key(value: Dict[str, Any]) -> str:
+    return f"{value['sourceColumn']}::{value['targetColumn']}"
@@ -1,16 +1,21 @@
 import json
 import logging
 import os
-from typing import Any, Dict, List, TypedDict
+import threading
+from typing import Any, Dict, List, Optional, TypedDict
 
-from langchain import hub
+import numpy as np
 from langchain_community.document_loaders import JSONLoader
 from langchain_core.documents import Document
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from ..utils import CACHE_DIR
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
 JSON_SCHEMA_DIR = os.path.join(os.path.dirname(__file__), "../resources")
 JSON_SCHEMA_FILES = [
     {
@@ -20,6 +25,18 @@ JSON_SCHEMA_FILES = [
     },
 ]
 
+RAG_INDEX_DIR = os.path.join(CACHE_DIR, "rag")
+CHUNKS_FILENAME = "chunks.jsonl"
+EMBEDDINGS_FILENAME = "embeddings.npy"
+PROMPT_FILENAME = "prompt.json"
+META_FILENAME = "meta.json"
+
+# Local copy of the "rlm/rag-prompt" hub prompt, so loading it needs no network
+RAG_PROMPT_TEMPLATE = """You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.
+Question: {question}
+Context: {context}
+Answer:"""
+
 
 # Define state for application
 # class State(TypedDict):
@@ -27,18 +44,39 @@ JSON_SCHEMA_FILES = [
 #     context: List[Document]
 #     answer: str
 class Rag:
+    """Retriever over the prebuilt GDC schema index.
+
+    The index (chunk texts, normalized chunk embeddings and the prompt
+    template) is written once by ``build_index`` and memory-mapped on the
+    first retrieval, so constructing this object costs nothing at import time.
+    """
+
     def __init__(
-        self, embeddings_model: str = "sentence-transformers/all-mpnet-base-v2"
+        self,
+        embeddings_model: str = "sentence-transformers/all-mpnet-base-v2",
+        index_dir: str = RAG_INDEX_DIR,
     ) -> None:
-        self.schemas = self.load_json_schemas()
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
-        )
-        embeddings = HuggingFaceEmbeddings(model_name=embeddings_model)
-        self.vector_store = InMemoryVectorStore(embeddings)
+        self.embeddings_model = embeddings_model
+        self.index_dir = index_dir
+
+        self.lock = threading.Lock()
+        self.embeddings_lock = threading.Lock()
+        self.embeddings: Optional[HuggingFaceEmbeddings] = None
+        self.chunks: Optional[List[Dict[str, Any]]] = None
+        self.chunk_embeddings: Optional[np.ndarray] = None
+        self._prompt: Optional[ChatPromptTemplate] = None
+
+    @property
+    def prompt(self) -> ChatPromptTemplate:
         # Define prompt for question-answering
-        self.prompt = hub.pull("rlm/rag-prompt")
-        self.init_rag()
+        self._ensure_loaded()
+        return self._prompt
+
+    def is_built(self) -> bool:
+        return all(
+            os.path.exists(os.path.join(self.index_dir, filename))
+            for filename in [CHUNKS_FILENAME, EMBEDDINGS_FILENAME, META_FILENAME]
+        )
 
     def load_json_schemas(self) -> List[Document]:
         schemas = []
@@ -53,17 +91,123 @@ class Rag:
             schemas.extend(schema_data)
         return schemas
 
-    def init_rag(self):
-        if self.schemas is None or len(self.schemas) == 0:
+    def build_index(self) -> None:
+        """Split and embed the schemas, then write the index to ``index_dir``."""
+        schemas = self.load_json_schemas()
+        if schemas is None or len(schemas) == 0:
             raise ValueError("No schema data found.")
-        all_splits = self.text_splitter.split_documents(self.schemas)
-        # Index chucks
-        _ = self.vector_store.add_documents(all_splits)
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000, chunk_overlap=200
+        )
+        all_splits = text_splitter.split_documents(schemas)
+
+        logger.info(f"[RAG] Embedding {len(all_splits)} chunks...")
+        embeddings = self._get_embeddings().embed_documents(
+            [doc.page_content for doc in all_splits]
+        )
+        embeddings = self._normalize(np.asarray(embeddings, dtype=np.float32))
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, CHUNKS_FILENAME), "w") as f:
+            for doc in all_splits:
+                f.write(
+                    json.dumps(
+                        {"page_content": doc.page_content, "metadata": doc.metadata}
+                    )
+                    + "\n"
+                )
+        np.save(os.path.join(self.index_dir, EMBEDDINGS_FILENAME), embeddings)
+        with open(os.path.join(self.index_dir, PROMPT_FILENAME), "w") as f:
+            json.dump({"template": RAG_PROMPT_TEMPLATE}, f, indent=4)
+        # Written last, it marks the index as complete
+        with open(os.path.join(self.index_dir, META_FILENAME), "w") as f:
+            json.dump(
+                {
+                    "embeddings_model": self.embeddings_model,
+                    "n_chunks": len(all_splits),
+                    "dims": int(embeddings.shape[1]),
+                },
+                f,
+                indent=4,
+            )
+        logger.info(f"[RAG] Index written to {self.index_dir}")
 
     def retrieve(self, question: str, top_k: int = 3) -> List[Document]:
-        retrieved_docs = self.vector_store.similarity_search(question, k=top_k)
+        self._ensure_loaded()
+        if len(self.chunks) == 0:
+            return []
+
+        query = self._normalize(
+            np.asarray([self._get_embeddings().embed_query(question)], dtype=np.float32)
+        )[0]
+        scores = self.chunk_embeddings @ query
+
+        top_k = min(top_k, len(scores))
+        top_idx = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_idx = top_idx[np.argsort(-scores[top_idx], kind="stable")]
+
+        retrieved_docs = [
+            Document(
+                page_content=self.chunks[idx]["page_content"],
+                metadata=self.chunks[idx]["metadata"],
+            )
+            for idx in top_idx
+        ]
         # docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
         return retrieved_docs
 
+    def _ensure_loaded(self) -> None:
+        if self.chunks is not None:
+            return
+        with self.lock:
+            if self.chunks is not None:
+                return
+            if not self.is_built():
+                logger.warning(
+                    f"[RAG] No prebuilt index found at {self.index_dir}, building it now..."
+                )
+                self.build_index()
+
+            with open(os.path.join(self.index_dir, META_FILENAME), "r") as f:
+                meta = json.load(f)
+            if meta["embeddings_model"] != self.embeddings_model:
+                raise ValueError(
+                    f"RAG index at {self.index_dir} was built with {meta['embeddings_model']}, "
+                    f"expected {self.embeddings_model}."
+                )
+
+            template = RAG_PROMPT_TEMPLATE
+            prompt_path = os.path.join(self.index_dir, PROMPT_FILENAME)
+            if os.path.exists(prompt_path):
+                with open(prompt_path, "r") as f:
+                    template = json.load(f)["template"]
+            self._prompt = ChatPromptTemplate.from_template(template)
+
+            self.chunk_embeddings = np.load(
+                os.path.join(self.index_dir, EMBEDDINGS_FILENAME), mmap_mode="r"
+            )
+            with open(os.path.join(self.index_dir, CHUNKS_FILENAME), "r") as f:
+                self.chunks = [json.loads(line) for line in f if line.strip()]
+            logger.info(f"[RAG] Loaded {len(self.chunks)} chunks from {self.index_dir}")
+
+    def _get_embeddings(self) -> HuggingFaceEmbeddings:
+        with self.embeddings_lock:
+            if self.embeddings is None:
+                self.embeddings = HuggingFaceEmbeddings(
+                    model_name=self.embeddings_model
+                )
+            return self.embeddings
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
 
 RAG = Rag()
+
+
+if __name__ == "__main__":
+    # Offline build step: python -m api.langchain.rag
+    logging.basicConfig(level=logging.INFO)
+    RAG.build_index()
@@ -1,6 +1,5 @@
 from typing import Any, Dict, List
 
-import bdikit as bdi
 import pandas as pd
 
 from .utils import BaseMatcher
@@ -37,6 +36,9 @@ class BDIKitMatcher(BaseMatcher):
             [{"sourceColumn": "source_column_1", "targetColumn": "target_column_1", "score": 0.9, "matcher": "magneto_zs_bp"},
             {"sourceColumn": "source_column_1", "targetColumn": "target_column_15", "score": 0.7, "matcher": "magneto_zs_bp"}, ...]
         """
+        # Imported here, bdikit pulls in torch and its matchers at import time
+        import bdikit as bdi
+
         embedding_candidates = bdi.top_matches(
             source=source,
             target=target,
@@ -1,12 +1,12 @@
 from typing import Any, Dict, List, Tuple
 
 import pandas as pd
-from magneto import Magneto
 
 from ..utils import download_model_pt
 from .utils import BaseMatcher
 
 FT_MODEL_URL = "https://nyu.box.com/shared/static/g2d3r1isdxrrxdcvqfn2orqgjfneejz1.pth"
+FT_MODEL_NAME = "magneto-gdc-v0.1"
 
 
 class MagnetoMatcher(BaseMatcher):
@@ -17,7 +17,8 @@ class MagnetoMatcher(BaseMatcher):
         },
         "magneto_ft": {
             "encoding_mode": "header_values_verbose",
-            "embedding_model": download_model_pt(FT_MODEL_URL, "magneto-gdc-v0.1"),
+            # "embedding_model" is resolved in _get_params, downloading the
+            # fine-tuned model at class definition made every import slow
             "use_bp_reranker": False,
             "use_gpt_reranker": False,
         },
@@ -26,20 +27,27 @@ class MagnetoMatcher(BaseMatcher):
     def __init__(self, name: str, weight: int = 1) -> None:
         if name not in MagnetoMatcher.ALLOWED_MAGNETO_PARAMS:
             raise ValueError(
-                f"Matcher {name} not found in the list of allowed Magneto matchers: {ALLOWED_MAGNETO_PARAMS.keys()}"
+                f"Matcher {name} not found in the list of allowed Magneto matchers: {MagnetoMatcher.ALLOWED_MAGNETO_PARAMS.keys()}"
             )
         super().__init__(name, weight)
 
     def top_matches(
         self, source: pd.DataFrame, target: pd.DataFrame, top_k: int = 20, **kwargs
     ) -> List[Dict[str, Any]]:
-        matcher = Magneto(
-            topk=top_k, **MagnetoMatcher.ALLOWED_MAGNETO_PARAMS[self.name]
-        )
+        # Imported here, magneto pulls in torch and transformers
+        from magneto import Magneto
+
+        matcher = Magneto(topk=top_k, **self._get_params())
         matches = matcher.get_matches(source, target)
         matcher_candidates = self._layer_candidates_magneto(matches, self.name)
         return matcher_candidates
 
+    def _get_params(self) -> Dict[str, Any]:
+        params = dict(MagnetoMatcher.ALLOWED_MAGNETO_PARAMS[self.name])
+        if self.name == "magneto_ft":
+            params["embedding_model"] = download_model_pt(FT_MODEL_URL, FT_MODEL_NAME)
+        return params
+
     def _layer_candidates_magneto(
         self,
         matches: Dict[Tuple[Tuple[str, str], Tuple[str, str]], float],
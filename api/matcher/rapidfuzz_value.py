@@ -23,7 +23,12 @@ class RapidFuzzValueMatcher(BaseMatcher):
         return matcher_candidates
 
     def _get_matches(
-        self, source: pd.DataFrame, target: pd.DataFrame, top_k: int
+        self,
+        source: pd.DataFrame,
+        target: pd.DataFrame,
+        top_k: int,
+        source_profiles=None,
+        target_profiles=None,
     ) -> Dict[str, Dict[str, float]]:
         ret = {}
         source_types = {
@@ -32,13 +37,13 @@ class RapidFuzzValueMatcher(BaseMatcher):
         target_types = {col: self._determine_dtype_gdc(col) for col in target.columns}
 
         source_uniques = {
-            col: source[col].dropna().unique().astype(str).tolist()
+            col: self._unique_strings(source, col, source_profiles)
             for col in source.columns
             if source_types[col] == "string"
         }
 
         target_uniques = {
-            col: target[col].dropna().unique().astype(str).tolist()
+            col: self._unique_strings(target, col, target_profiles)
             for col in target.columns
             if target_types[col] == "string"
         }
@@ -95,6 +100,11 @@ class RapidFuzzValueMatcher(BaseMatcher):
             total_score += max_score
         return total_score / len(source_values)
 
+    def _unique_strings(self, df: pd.DataFrame, col: str, profiles=None) -> List[str]:
+        if profiles is not None:
+            return profiles.get(col).unique_strings.tolist()
+        return df[col].dropna().unique().astype(str).tolist()
+
     def _determine_dtype(self, df: pd.DataFrame, col: str) -> str:
         if pd.api.types.is_numeric_dtype(df[col]):
             return "numeric"
@@ -1,8 +1,11 @@
 import logging
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger("bdiviz_flask.sub")
 
+# (rank, score) by (source column, target column), per matcher
+CandidateRanks = Dict[str, Dict[Tuple[str, str], Tuple[int, float]]]
+
 
 class WeightUpdater:
     def __init__(
@@ -23,6 +26,8 @@ class WeightUpdater:
         self.beta = beta
 
         self.candidates = self._preprocess_candidates(candidates)
+        # Built on the first batch update, see _candidate_ranks
+        self._ranks: Optional[CandidateRanks] = None
         self._normalize_weights()
 
     def update_weights(self, operation: str, source_column: str, target_column: str):
@@ -38,6 +43,47 @@ class WeightUpdater:
         elif operation == "reject":
             self._handle_reject(source_column, target_column)
 
+    def update_weights_batch(self, operations: List[Tuple[str, str, str]]):
+        """
+        Args:
+            operations (List[Tuple[str, str, str]]): (operation, source column,
+                target column) updates applied together, e.g. a bulk accept.
+                The weights are normalized once at the end, not after each.
+        """
+        ranks = self._candidate_ranks()
+        for operation, source_column, target_column in operations:
+            if operation == "accept":
+                rate = self.alpha
+            elif operation == "reject":
+                rate = -self.beta
+            else:
+                continue
+            for matcher, matcher_ranks in ranks.items():
+                if matcher not in self.matchers:
+                    continue
+                found = matcher_ranks.get((source_column, target_column))
+                if found is not None:
+                    rank, score = found
+                    self.matchers[matcher].weight += rate * score / (rank + 1)
+        self._normalize_weights()
+        weights = {name: matcher.weight for name, matcher in self.matchers.items()}
+        logger.info(
+            f"[Batch] Updated weights after {len(operations)} operations: {weights}"
+        )
+
+    def _candidate_ranks(self) -> CandidateRanks:
+        """(rank, score) of the first candidate of each pair, per matcher."""
+        if self._ranks is None:
+            self._ranks = {}
+            for matcher, candidates in self.candidates.items():
+                matcher_ranks = {}
+                for rank, candidate in enumerate(candidates):
+                    matcher_ranks.setdefault(
+                        (candidate[0], candidate[1]), (rank, candidate[2])
+                    )
+                self._ranks[matcher] = matcher_ranks
+        return self._ranks
+
     def _handle_accept(self, source_column: str, target_column: str):
         for matcher, candidates in self.candidates.items():
             if matcher not in self.matchers:
@@ -5,22 +5,38 @@ import logging
 import os
 import random
 import threading
-from typing import Any, Dict, List, Optional, Tuple
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.neighbors import NearestNeighbors
-from torch import Tensor
 
+from .candidate_blocking import CandidateBlocker
+from .candidate_index import CandidateIndex
 from .candidate_quadrants import CandidateQuadrants
-from .clusterer.embedding_clusterer import EmbeddingClusterer
+from .clusterer.column_clusters import (
+    cluster_target_columns,
+    nearest_columns,
+    update_nearest_columns,
+)
+from .column_profile import GDC_TARGET_PROFILES, ProfileStore, sample_rows
+from .harmonized_export import EXPORT_CHUNK_ROWS, ExportColumn, harmonize_chunk
+from .inference_scheduler import INFERENCE_SCHEDULER
 from .matcher.bdikit import BDIKitMatcher
 from .matcher.magneto import MagnetoMatcher
 from .matcher.rapidfuzz import RapidFuzzMatcher
 from .matcher.valentine import ValentineMatcher
 from .matcher_weight.weight_updater import WeightUpdater
-from .utils import is_candidate_for_category, load_gdc_ontology, load_gdc_property
+from .metrics import MATCHER_SECONDS, STAGE_SECONDS, record_cache
+from .session_usage import USAGE, deep_sizeof
+from .utils import (
+    is_gdc_target,
+    load_gdc_ontology,
+    load_gdc_ontology_flat,
+    load_gdc_property,
+)
 
 logger = logging.getLogger("bdiviz_flask.sub")
 
@@ -37,6 +53,21 @@ DEFAULT_PARAMS = {
     "use_gpt_reranker": False,
 }
 
+# Profile and match sources on a row sample of this size, 0 to use every row
+PROFILE_SAMPLE_SIZE = int(os.environ.get("BDIVIZ_PROFILE_SAMPLE_ROWS", "0"))
+PROFILE_SAMPLE_MODE = os.environ.get("BDIVIZ_PROFILE_SAMPLE_MODE", "stratified")
+# Match every source column against this many target columns, 0 for all
+BLOCKING_SHORTLIST_SIZE = int(os.environ.get("BDIVIZ_BLOCKING_SHORTLIST", "0"))
+# Column embeddings kept per task, by column representation
+EMBEDDING_CACHE_SIZE = 20000
+
+# Candidate status after each user operation
+OPERATION_STATUSES = {
+    "accept": "accepted",
+    "reject": "rejected",
+    "discard": "discarded",
+}
+
 
 class MatchingTask:
     def __init__(
@@ -44,9 +75,30 @@ class MatchingTask:
         top_k: int = 20,
         clustering_model="Snowflake/snowflake-arctic-embed-m",
         update_matcher_weights: bool = True,
+        session_name: str = "default",
+        profile_sample_size: int = PROFILE_SAMPLE_SIZE,
+        profile_sample_mode: str = PROFILE_SAMPLE_MODE,
+        blocking_shortlist_size: int = BLOCKING_SHORTLIST_SIZE,
     ) -> None:
+        # Serializes candidate generation and dataframe updates. Readers never
+        # take it, they read the published snapshot, see TaskSnapshot
         self.lock = threading.Lock()
+        # Serializes writers (read, copy, publish), held for short sections
+        self.write_lock = threading.RLock()
         self.top_k = top_k
+        # Inference of this task is scheduled under this name
+        self.session_name = session_name
+        self.profile_sample_size = profile_sample_size
+        self.profile_sample_mode = profile_sample_mode
+        self.blocking_shortlist_size = blocking_shortlist_size
+        self.blocking_report: Optional[Dict[str, Any]] = None
+
+        # State version, bumped on every change visible to the frontend. The
+        # epoch tells versions of different MatchingTask instances apart.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version_lock = threading.Lock()
+        self.change_log = ChangeLog()
+        self._candidate_index: Optional[Tuple[Tuple, CandidateIndex]] = None
 
         self.candidate_quadrants = None
         self.matchers = {
@@ -57,12 +109,153 @@ class MatchingTask:
         }
 
         self.clustering_model = clustering_model
-        self.source_df = None
-        self.target_df = None
-        self.cached_candidates = self._initialize_cache()
+        # Embeddings of the clustering model by column representation, so
+        # re-matching only embeds new or edited columns
+        self._embedding_cache: Dict[str, np.ndarray] = {}
+        # (source columns, embeddings, nearest_columns) of the last run
+        self._source_neighbours: Optional[
+            Tuple[List[str], np.ndarray, np.ndarray]
+        ] = None
+        # (source_df, target_df, source_hash, target_hash) of the last hashing
+        self._hashes: Optional[Tuple[pd.DataFrame, pd.DataFrame, int, int]] = None
+        self.snapshot = TaskSnapshot(
+            cached_candidates=self._initialize_cache(),
+            matchers=self._current_matchers(),
+        )
         self.history = UserOperationHistory()
 
         self.update_matcher_weights = update_matcher_weights
+        # Rebuilt whenever the candidates are replaced, see get_candidates
+        self.weight_updater: Optional[WeightUpdater] = None
+
+        # CPU time of the pipeline stages, see SessionManager.usage_report
+        self.usage = USAGE.get(session_name)
+        self._memory_usage: Optional[Tuple[int, Dict[str, int]]] = None
+
+    @contextmanager
+    def _stage(self, stage: str, matcher: Optional[str] = None) -> Iterator[None]:
+        """
+        Time a stage of candidate generation for /api/metrics and charge it
+        to the session usage. Matchers are timed by name, e.g.
+        _stage("matcher", "magneto_zs").
+        """
+        if matcher is None:
+            timer = STAGE_SECONDS.time(stage=stage)
+        else:
+            timer = MATCHER_SECONDS.time(matcher=matcher)
+            stage = f"{stage}:{matcher}"
+        with timer, self.usage.track(stage):
+            yield
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Approximate bytes held by this task, by part. The shared GDC target
+        and its profiles are not counted. Computed once per state version.
+
+        Returns:
+            Dict[str, int]: e.g. {"sourceDf": 1048576, ..., "total": 2097152}
+        """
+        snapshot = self.snapshot
+        version = snapshot.version
+        cached = self._memory_usage
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        seen = set()
+        if is_gdc_target(snapshot.target_df):
+            seen.update([id(snapshot.target_df), id(snapshot.target_profiles)])
+        parts = {
+            # Dataframes first, the objects below reference them
+            "sourceDf": snapshot.source_df,
+            "sourceSample": snapshot.source_sample,
+            "targetDf": snapshot.target_df,
+            "profiles": [snapshot.source_profiles, snapshot.target_profiles],
+            "candidates": snapshot.cached_candidates.get("candidates"),
+            "valueMatches": snapshot.cached_candidates.get("value_matches"),
+            "history": self.history,
+            "changeLog": self.change_log,
+            "caches": [
+                self._embedding_cache,
+                self._source_neighbours,
+                self._candidate_index,
+                self.candidate_quadrants,
+            ],
+        }
+        usage = {name: deep_sizeof(part, seen) for name, part in parts.items()}
+        usage["total"] = sum(usage.values())
+        self._memory_usage = (version, usage)
+        return usage
+
+    # The state of the published snapshot, read-only: writers use _publish
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    @property
+    def source_df(self) -> Optional[pd.DataFrame]:
+        return self.snapshot.source_df
+
+    @property
+    def source_sample(self) -> Optional[pd.DataFrame]:
+        """The bounded part of source_df the matchers run on, see _sample_source."""
+        return self.snapshot.source_sample
+
+    @property
+    def target_df(self) -> Optional[pd.DataFrame]:
+        return self.snapshot.target_df
+
+    @property
+    def source_profiles(self) -> Optional[ProfileStore]:
+        return self.snapshot.source_profiles
+
+    @property
+    def target_profiles(self) -> Optional[ProfileStore]:
+        return self.snapshot.target_profiles
+
+    @property
+    def cached_candidates(self) -> Dict[str, Any]:
+        return self.snapshot.cached_candidates
+
+    def _publish(
+        self, change: Optional[Dict[str, Any]] = None, **state: Any
+    ) -> "TaskSnapshot":
+        """
+        Publish a new snapshot with the given state replaced, e.g.
+        _publish(change, cached_candidates={...}), under the next version.
+        Published objects are never mutated afterwards, so writers build
+        new ones (copy-on-write) and call this holding write_lock.
+
+        Args:
+            change (Dict[str, Any], optional): The change to record in the
+                change log, e.g. {"type": "status", "candidates": [...]}.
+                Without it the whole state counts as replaced.
+
+        Returns:
+            TaskSnapshot: The new snapshot.
+        """
+        with self.version_lock:
+            version = self.snapshot.version + 1
+            if change is None:
+                self.change_log.reset(version)
+            else:
+                self.change_log.append(version, change)
+            self.snapshot = self.snapshot.replace(
+                version=version, matchers=self._current_matchers(), **state
+            )
+            return self.snapshot
+
+    def bump_version(self, change: Optional[Dict[str, Any]] = None) -> int:
+        """Publish the current state under a new version, see _publish."""
+        return self._publish(change).version
+
+    def get_state_tag(self, snapshot: Optional["TaskSnapshot"] = None) -> str:
+        snapshot = snapshot or self.snapshot
+        return f"{self.epoch}-{snapshot.version}"
+
+    def get_changes_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """The changes after `version`, None if they are no longer all logged."""
+        with self.version_lock:
+            return self.change_log.since(version)
 
     def _initialize_cache(self) -> Dict[str, Any]:
         return {
@@ -77,64 +270,161 @@ class MatchingTask:
     def update_dataframe(
         self, source_df: Optional[pd.DataFrame], target_df: Optional[pd.DataFrame]
     ):
-        with self.lock:
+        with self.lock, self.usage.track("profiling"):
+            snapshot = self.snapshot
+            state = {}
             if source_df is not None:
-                self.source_df = source_df
+                source_sample = self._sample_source(source_df)
+                state["source_df"] = source_df
+                state["source_sample"] = source_sample
+                state["source_profiles"] = ProfileStore(
+                    source_sample,
+                    population=source_df if source_sample is not source_df else None,
+                ).build()
                 logger.info(f"[MatchingTask] Source dataframe updated!")
             if target_df is not None:
-                self.target_df = target_df
+                # The target rarely changes, keep its profiles if it did not
+                target_profiles = snapshot.target_profiles
+                if is_gdc_target(target_df):
+                    target_profiles = GDC_TARGET_PROFILES.get()
+                elif (
+                    snapshot.target_df is None
+                    or target_profiles is None
+                    or (
+                        target_profiles.df is not target_df
+                        and not target_df.equals(snapshot.target_df)
+                    )
+                ):
+                    target_profiles = ProfileStore(target_df).build()
+                state["target_df"] = target_df
+                state["target_profiles"] = target_profiles
                 logger.info(f"[MatchingTask] Target dataframe updated!")
 
-        self._initialize_value_matches()
+            with self.write_lock:
+                source_df = state.get("source_df", snapshot.source_df)
+                source_profiles = state.get("source_profiles", snapshot.source_profiles)
+                self._publish(
+                    cached_candidates={
+                        **self.cached_candidates,
+                        "value_matches": self._initialize_value_matches(
+                            source_df, source_profiles
+                        ),
+                    },
+                    **state,
+                )
+
+    def _sample_source(self, source_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        The rows of the source that profiling and matching look at: all of
+        them, or a sample of profile_sample_size rows for larger sources, so
+        that matching costs the same for 10 thousand or 10 million rows.
+        Candidates are cached against the hash of the full source.
+        """
+        if not self.profile_sample_size or len(source_df) <= self.profile_sample_size:
+            return source_df
+        sample = sample_rows(
+            source_df, self.profile_sample_size, mode=self.profile_sample_mode
+        )
+        logger.info(
+            f"[MatchingTask] Profiling {len(sample)} of {len(source_df)} source "
+            f"rows ({self.profile_sample_mode} sample)"
+        )
+        return sample
 
     def get_candidates(self, is_candidates_cached: bool = True) -> Dict[str, list]:
-        with self.lock:
-            if self.source_df is None or self.target_df is None:
+        if not self.lock.acquire(blocking=False):
+            snapshot = self.snapshot
+            if is_candidates_cached and snapshot.cached_candidates["candidates"]:
+                # Candidates are being generated, serve the last published ones
+                # rather than waiting minutes for the new ones
+                return snapshot.cached_candidates["candidates"]
+            self.lock.acquire()
+        try:
+            snapshot = self.snapshot
+            if snapshot.source_df is None or snapshot.target_df is None:
                 raise ValueError("Source and Target dataframes must be provided.")
 
-            source_hash, target_hash = self._compute_hashes()
-            cached_json = self._import_cache_from_json()
+            source_hash, target_hash = self._compute_hashes(snapshot)
+            with self._stage("cache_import"):
+                cached_json = self._import_cache_from_json()
             candidates = []
+            # Only a changed JSON import and a regeneration publish new
+            # candidates, serving the cache keeps the version (and the ETags)
+            replaced = True
 
             if self._is_cache_valid(cached_json, source_hash, target_hash):
-                self.cached_candidates = cached_json
-                candidates = cached_json["candidates"]
+                record_cache("candidates", True)
+                if cached_json == snapshot.cached_candidates:
+                    # Already published, e.g. exported by the last generation
+                    candidates = snapshot.cached_candidates["candidates"]
+                    replaced = False
+                else:
+                    with self.write_lock:
+                        self._publish(cached_candidates=cached_json)
+                    candidates = cached_json["candidates"]
 
             elif is_candidates_cached and self._is_cache_valid(
-                self.cached_candidates, source_hash, target_hash
+                snapshot.cached_candidates, source_hash, target_hash
             ):
-                candidates = self.get_cached_candidates()
+                record_cache("candidates", True)
+                candidates = snapshot.cached_candidates["candidates"]
+                replaced = False
             else:
+                record_cache("candidates", False)
                 candidates = self._generate_candidates(
-                    source_hash, target_hash, is_candidates_cached
+                    snapshot, source_hash, target_hash, is_candidates_cached
                 )
 
-            if self.update_matcher_weights:
+            if self.update_matcher_weights and (
+                replaced or self.weight_updater is None
+            ):
                 self.weight_updater = WeightUpdater(
                     matchers=self.matchers,
                     candidates=candidates,
                     alpha=0.1,
                     beta=0.1,
                 )
-
+                # The updater normalizes the weights
+                with self.write_lock:
+                    if self._current_matchers() != self.snapshot.matchers:
+                        self.bump_version(
+                            {"type": "matchers", "matchers": self._current_matchers()}
+                        )
             return candidates
+        finally:
+            self.lock.release()
 
     def update_exact_matches(self) -> List[Dict[str, Any]]:
         return self.get_candidates()
 
-    def _compute_hashes(self) -> Tuple[int, int]:
+    def _compute_hashes(self, snapshot: "TaskSnapshot") -> Tuple[int, int]:
+        # Published dataframes are never mutated, so the hashes of the same
+        # objects stay valid
+        hashes = self._hashes
+        if (
+            hashes is not None
+            and hashes[0] is snapshot.source_df
+            and hashes[1] is snapshot.target_df
+        ):
+            return hashes[2], hashes[3]
         source_hash = int(
             hashlib.sha256(
-                pd.util.hash_pandas_object(self.source_df, index=True).values
+                pd.util.hash_pandas_object(snapshot.source_df, index=True).values
             ).hexdigest(),
             16,
         )
         target_hash = int(
             hashlib.sha256(
-                pd.util.hash_pandas_object(self.target_df, index=True).values
+                pd.util.hash_pandas_object(snapshot.target_df, index=True).values
             ).hexdigest(),
             16,
         )
+        self._hashes = (
+            snapshot.source_df,
+            snapshot.target_df,
+            source_hash,
+            target_hash,
+        )
         return source_hash, target_hash
 
     def _is_cache_valid(
@@ -147,37 +437,61 @@ class MatchingTask:
         )
 
     def _generate_candidates(
-        self, source_hash: int, target_hash: int, is_candidates_cached: bool
+        self,
+        snapshot: "TaskSnapshot",
+        source_hash: int,
+        target_hash: int,
+        is_candidates_cached: bool,
     ) -> Dict[str, list]:
-        embedding_clusterer = EmbeddingClusterer(
-            params={
-                "embedding_model": self.clustering_model,
-                "topk": self.top_k,
-                **DEFAULT_PARAMS,
-            }
-        )
-        source_embeddings, target_embeddings = embedding_clusterer.get_embeddings(
-            source_df=self.source_df, target_df=self.target_df
-        )
+        # Imported here, the clusterer loads torch and transformers
+        from .clusterer.embedding_clusterer import EmbeddingClusterer
 
-        source_clusters = self._generate_source_clusters(source_embeddings)
-        target_clusters = self._generate_target_clusters(target_embeddings)
+        with self._stage("embeddings"), INFERENCE_SCHEDULER.slot(
+            self.session_name, "embedding"
+        ):
+            embedding_clusterer = EmbeddingClusterer(
+                params={
+                    "embedding_model": self.clustering_model,
+                    "topk": self.top_k,
+                    **DEFAULT_PARAMS,
+                }
+            )
+            source_embeddings, target_embeddings = embedding_clusterer.get_embeddings(
+                source_df=snapshot.source_sample,
+                target_df=snapshot.target_df,
+                source_profiles=snapshot.source_profiles,
+                target_profiles=snapshot.target_profiles,
+                cache=self._embedding_cache,
+            )
+        if len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.clear()
+
+        with self._stage("source_clusters"):
+            source_clusters = self._generate_source_clusters(source_embeddings)
+        with self._stage("target_clusters"):
+            target_clusters = self._generate_target_clusters(target_embeddings)
+        with self._stage("blocking"):
+            blocks = self._generate_blocks(source_embeddings, target_embeddings)
 
         # Apply candidate quadrants
-        self.candidate_quadrants = CandidateQuadrants(
-            source=self.source_df,
-            target=self.target_df,
-            top_k=self.top_k,
-        )
+        with self._stage("quadrants"):
+            self.candidate_quadrants = CandidateQuadrants(
+                source=snapshot.source_sample,
+                target=snapshot.target_df,
+                top_k=self.top_k,
+                source_profiles=snapshot.source_profiles,
+                target_profiles=snapshot.target_profiles,
+                blocks=blocks,
+            )
 
         layered_candidates = []
         # numeric_columns = []
-        for source_column in self.source_df.columns:
+        for source_column in snapshot.source_df.columns:
             layered_candidates.extend(
                 self.candidate_quadrants.get_easy_target_json(source_column)
             )
 
-            # if pd.api.types.is_numeric_dtype(self.source_df[source_column].dtype):
+            # if pd.api.types.is_numeric_dtype(snapshot.source_df[source_column].dtype):
             #     numeric_columns.append(source_column)
             #     continue
 
@@ -185,16 +499,22 @@ class MatchingTask:
             # if target_df is None:  # No potential matches
             #     continue
         for matcher_name, matcher_instance in self.matchers.items():
-            matcher_candidates = matcher_instance.top_matches(
-                source=self.source_df,
-                target=self.target_df,
-                top_k=self.top_k,
-            )
-            layered_candidates.extend(matcher_candidates)
+            for source_columns, target_columns in blocks or [
+                (snapshot.source_sample.columns, snapshot.target_df.columns)
+            ]:
+                with INFERENCE_SCHEDULER.slot(
+                    self.session_name, matcher_name
+                ), self._stage("matcher", matcher_name):
+                    matcher_candidates = matcher_instance.top_matches(
+                        source=snapshot.source_sample[source_columns],
+                        target=snapshot.target_df[target_columns],
+                        top_k=self.top_k,
+                    )
+                layered_candidates.extend(matcher_candidates)
 
         # if numeric_columns:
         #     target_df = self.candidate_quadrants.get_potential_numeric_target_df()
-        #     source_df = self.source_df[numeric_columns]
+        #     source_df = snapshot.source_df[numeric_columns]
         #     for matcher_name, matcher_instance in self.matchers.items():
         #         logger.info(
         #             f"Running matcher: {matcher_name} on source {numeric_columns}..."
@@ -220,90 +540,179 @@ class MatchingTask:
         ]
 
         # Generate value matches for each candidate
-        for candidate in layered_candidates:
-            self._generate_value_matches(
-                candidate["sourceColumn"], candidate["targetColumn"]
+        with self._stage("value_matches"):
+            value_matches = self._copy_value_matches(
+                snapshot.cached_candidates["value_matches"]
             )
+            for candidate in layered_candidates:
+                self._generate_value_matches(
+                    candidate["sourceColumn"], candidate["targetColumn"], value_matches
+                )
 
+        with self.write_lock:
+            # Source values may have been edited meanwhile, keep those edits
+            value_matches = self._merge_value_matches(
+                self.cached_candidates["value_matches"], value_matches
+            )
+            if is_candidates_cached:
+                cached_candidates = {
+                    "source_hash": source_hash,
+                    "target_hash": target_hash,
+                    "candidates": layered_candidates,
+                    "source_clusters": source_clusters,
+                    "target_clusters": target_clusters,
+                    "value_matches": value_matches,
+                }
+            else:
+                cached_candidates = {
+                    **self.cached_candidates,
+                    "value_matches": value_matches,
+                }
+            self._publish(cached_candidates=cached_candidates)
         if is_candidates_cached:
-            self.cached_candidates = {
-                "source_hash": source_hash,
-                "target_hash": target_hash,
-                "candidates": layered_candidates,
-                "source_clusters": source_clusters,
-                "target_clusters": target_clusters,
-                "value_matches": self.cached_candidates["value_matches"],
-            }
-            self._export_cache_to_json(self.cached_candidates)
+            with self._stage("cache_export"):
+                self._export_cache_to_json(cached_candidates)
 
         return layered_candidates
 
     def _generate_source_clusters(
         self, source_embeddings: np.ndarray
     ) -> Dict[str, List[str]]:
-        knn = NearestNeighbors(
-            n_neighbors=min(10, len(self.source_df.columns)), metric="cosine"
-        )
-        knn.fit(source_embeddings)
-        clusters_idx = [
-            knn.kneighbors([source_embedding], return_distance=False)[0]
-            for source_embedding in source_embeddings
-        ]
+        """
+        The 10 nearest source columns of every source column (itself first).
+        When only some columns changed since the last run, only the affected
+        rows are recomputed.
+        """
+        columns = list(self.source_sample.columns)
+        k = min(10, len(columns))
 
-        clusters = {
-            self.source_df.columns[i]: [
-                self.source_df.columns[idx] for idx in cluster_idx
-            ]
-            for i, cluster_idx in enumerate(clusters_idx)
+        previous = self._source_neighbours
+        if previous is not None and previous[0] == columns and previous[2].shape[1] == k:
+            changed = np.flatnonzero((previous[1] != source_embeddings).any(axis=1))
+            neighbours = update_nearest_columns(previous[2], source_embeddings, changed)
+        else:
+            neighbours = nearest_columns(source_embeddings, k)
+        self._source_neighbours = (columns, source_embeddings, neighbours)
+
+        return {
+            columns[i]: [columns[idx] for idx in row]
+            for i, row in enumerate(neighbours)
         }
-        return clusters
 
-    def _generate_target_clusters(self, target_embeddings: Tensor) -> List[List[str]]:
-        kmeans = KMeans(n_clusters=min(20, len(self.target_df.columns)))
-        kmeans.fit(np.array(target_embeddings))
-        clusters_idx = kmeans.labels_
+    def _generate_blocks(
+        self, source_embeddings: np.ndarray, target_embeddings: np.ndarray
+    ) -> Optional[List[Tuple[List[str], List[str]]]]:
+        """
+        Split matching into (source columns, target columns) blocks, so that
+        every source column is only compared with its blocking_shortlist_size
+        nearest target columns (by embedding) and their neighbours.
 
-        clusters = {}
-        for i, target_column in enumerate(self.target_df.columns):
-            cluster_idx = clusters_idx[i]
-            if cluster_idx not in clusters:
-                clusters[cluster_idx] = []
-            clusters[cluster_idx].append(target_column)
+        Returns:
+            Optional[List[Tuple[List[str], List[str]]]]: The blocks, None to
+            match every source column against every target column.
+        """
+        source_columns = list(self.source_sample.columns)
+        target_columns = list(self.target_df.columns)
+        if (
+            not self.blocking_shortlist_size
+            or len(target_columns) <= self.blocking_shortlist_size
+        ):
+            return None
+        if len(source_embeddings) != len(source_columns) or len(
+            target_embeddings
+        ) != len(target_columns):
+            # Columns with identical encodings share one embedding
+            logger.warning(
+                "[MatchingTask] Embeddings do not line up with the columns, "
+                "matching without blocking"
+            )
+            return None
 
-        return list(clusters.values())
+        blocker = CandidateBlocker(
+            target_embeddings, target_columns, self.blocking_shortlist_size
+        )
+        shortlists = blocker.shortlists(source_embeddings, source_columns)
+        blocks = blocker.blocks(source_embeddings, source_columns, shortlists)
+        self.blocking_report = blocker.report(
+            source_embeddings, source_columns, shortlists, blocks
+        )
+        logger.info(f"[MatchingTask] Blocking: {self.blocking_report}")
+        return blocks
+
+    def _generate_target_clusters(self, target_embeddings: np.ndarray) -> List[List[str]]:
+        return cluster_target_columns(target_embeddings, list(self.target_df.columns))
 
     def _generate_gdc_ontology(self) -> List[Dict]:
         candidates = self.get_cached_candidates()
         return load_gdc_ontology(candidates)
 
-    def _initialize_value_matches(self) -> None:
-        self.cached_candidates["value_matches"] = {}
-        for source_col in self.source_df.columns:
+    @staticmethod
+    def _initialize_value_matches(
+        source_df: pd.DataFrame, source_profiles: ProfileStore
+    ) -> Dict[str, Dict[str, Any]]:
+        value_matches = {}
+        for source_col in source_df.columns:
+            profile = source_profiles.get(source_col)
             source_unique_values = []
             # if the numeric type can be treated as categorical, still generate value matches
-            if pd.api.types.is_numeric_dtype(self.source_df[source_col].dtype):
-                if is_candidate_for_category(self.source_df[source_col]):
-                    source_unique_values = self.get_source_unique_values(
-                        source_col, n=300
-                    )
+            if pd.api.types.is_numeric_dtype(source_df[source_col].dtype):
+                if profile.is_category_candidate():
+                    source_unique_values = profile.get_unique_values(300)
             else:
-                source_unique_values = self.get_source_unique_values(source_col)
+                source_unique_values = profile.get_unique_values(20)
 
-            self.cached_candidates["value_matches"][source_col] = {
+            value_matches[source_col] = {
                 "source_unique_values": source_unique_values,
                 "targets": {},
             }
+        return value_matches
 
-    def _generate_value_matches(self, source_column: str, target_column: str) -> None:
-        if (
-            target_column
-            in self.cached_candidates["value_matches"][source_column]["targets"]
-        ):
+    @staticmethod
+    def _copy_value_matches(
+        value_matches: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """A copy of published value matches that targets can be added to."""
+        return {
+            source_col: {**items, "targets": dict(items["targets"])}
+            for source_col, items in value_matches.items()
+        }
+
+    @staticmethod
+    def _merge_value_matches(
+        published: Dict[str, Dict[str, Any]], generated: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        The targets of `generated` added to `published`, keeping the source
+        values of `published`, which may have been edited since the copy.
+        """
+        return {
+            source_col: {
+                **items,
+                "targets": {
+                    **generated.get(source_col, {}).get("targets", {}),
+                    **items["targets"],
+                },
+            }
+            for source_col, items in published.items()
+        }
+
+    def _generate_value_matches(
+        self,
+        source_column: str,
+        target_column: str,
+        value_matches: Dict[str, Dict[str, Any]],
+    ) -> None:
+        """
+        Match the source values of `source_column` with the values of
+        `target_column`, into `value_matches`, a copy of the published value
+        matches (see _copy_value_matches).
+        """
+        if target_column in value_matches[source_column]["targets"]:
+            record_cache("value_matches", True)
             return
+        record_cache("value_matches", False)
 
-        source_values = self.cached_candidates["value_matches"][source_column][
-            "source_unique_values"
-        ]
+        source_values = value_matches[source_column]["source_unique_values"]
         if not source_values:  # Source unique values are empty
             return
 
@@ -330,79 +739,163 @@ class MatchingTask:
             else:
                 match_results["To"].append("")
 
-        self.cached_candidates["value_matches"][source_column]["targets"][
-            target_column
-        ] = list(match_results["To"])
+        value_matches[source_column]["targets"][target_column] = list(
+            match_results["To"]
+        )
 
     def accept_cached_candidate(self, candidate: Dict[str, Any]) -> None:
-        cached_candidates = self.get_cached_candidates()
-        for cached_candidate in cached_candidates:
-            if (
-                cached_candidate["sourceColumn"] == candidate["sourceColumn"]
+        self._set_statuses(
+            lambda cached_candidate: (
+                "accepted"
+                if cached_candidate["sourceColumn"] == candidate["sourceColumn"]
                 and cached_candidate["targetColumn"] == candidate["targetColumn"]
-            ):
-                cached_candidate["status"] = "accepted"
-        self.set_cached_candidates(cached_candidates)
+                else None
+            )
+        )
 
     def reject_cached_candidate(self, candidate: Dict[str, Any]) -> None:
-        cached_candidates = self.get_cached_candidates()
-        for cached_candidate in cached_candidates:
-            if (
-                cached_candidate["sourceColumn"] == candidate["sourceColumn"]
+        self._set_statuses(
+            lambda cached_candidate: (
+                "rejected"
+                if cached_candidate["sourceColumn"] == candidate["sourceColumn"]
                 and cached_candidate["targetColumn"] == candidate["targetColumn"]
-            ):
-                cached_candidate["status"] = "rejected"
-        self.set_cached_candidates(cached_candidates)
+                else None
+            )
+        )
 
     def discard_cached_column(self, source_col: str) -> None:
-        cached_candidates = self.get_cached_candidates()
-        for candidate in cached_candidates:
-            if candidate["sourceColumn"] == source_col:
-                candidate["status"] = "discarded"
-        self.set_cached_candidates(cached_candidates)
+        self._set_statuses(
+            lambda candidate: (
+                "discarded" if candidate["sourceColumn"] == source_col else None
+            )
+        )
 
     def append_cached_column(self, column_name: str) -> None:
-        cached_candidates = self.get_cached_candidates()
-        for candidate in cached_candidates:
-            if (
-                column_name == candidate["sourceColumn"]
-                and candidate["status"] == "discarded"
-            ):
-                if candidate["matcher"] in ["candidate_quadrants"]:
-                    candidate["status"] = "accepted"
-                else:
-                    candidate["status"] = "idle"
+        self._set_statuses(
+            lambda candidate: (
+                self._restored_status(candidate)
+                if candidate["sourceColumn"] == column_name
+                else None
+            )
+        )
+
+    @staticmethod
+    def _restored_status(candidate: Dict[str, Any]) -> Optional[str]:
+        """The status of a discarded candidate once its column is restored."""
+        if candidate["status"] != "discarded":
+            return None
+        if candidate["matcher"] in ["candidate_quadrants"]:
+            return "accepted"
+        return "idle"
+
+    def _set_statuses(
+        self, status_of: Callable[[Dict[str, Any]], Optional[str]]
+    ) -> None:
+        """
+        Give the cached candidates for which `status_of` returns a status that
+        status. The candidates are copied, not changed in place, and the new
+        list is published with one status change.
+        """
+        with self.write_lock:
+            candidates = []
+            changed = []
+            for candidate in self.get_cached_candidates():
+                status = status_of(candidate)
+                if status is not None:
+                    candidate = {**candidate, "status": status}
+                    changed.append(candidate)
+                candidates.append(candidate)
+            self.set_cached_candidates(candidates, self._status_change(changed))
+
+    def splice_cached_candidates(self, candidates: List[Dict[str, Any]]) -> None:
+        """Replace all cached candidates of the source columns in `candidates`."""
+        sources_to_update = set([candidate["sourceColumn"] for candidate in candidates])
+        with self.write_lock:
+            cached_candidates = [
+                candidate
+                for candidate in self.get_cached_candidates()
+                if candidate["sourceColumn"] not in sources_to_update
+            ]
+            cached_candidates.extend(dict(candidate) for candidate in candidates)
+
+            self.set_cached_candidates(
+                cached_candidates,
+                {
+                    "type": "splice",
+                    "sourceColumns": sorted(sources_to_update),
+                    "candidates": [dict(candidate) for candidate in candidates],
+                },
+            )
 
-        self.set_cached_candidates(cached_candidates)
+    @staticmethod
+    def _status_change(candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "type": "status",
+            "candidates": [
+                {
+                    "sourceColumn": candidate["sourceColumn"],
+                    "targetColumn": candidate["targetColumn"],
+                    "matcher": candidate["matcher"],
+                    "status": candidate["status"],
+                }
+                for candidate in candidates
+            ],
+        }
 
-    def to_frontend_json(self) -> dict:
+    def to_frontend_json(self, snapshot: Optional["TaskSnapshot"] = None) -> dict:
+        snapshot = snapshot or self.snapshot
         return {
-            "candidates": self.get_cached_candidates(),  # sourceColumn, targetColumn, score, matcher
-            "sourceClusters": self._format_source_clusters_for_frontend(),
+            "candidates": snapshot.cached_candidates["candidates"],  # sourceColumn, targetColumn, score, matcher
+            "sourceClusters": self._format_source_clusters_for_frontend(snapshot),
             # "targetClusters": self.get_cached_target_clusters(),  # [["column1", "column2", ...], [], []]
-            "matchers": self.get_matchers(),
+            "matchers": [dict(matcher) for matcher in snapshot.matchers],
         }
 
-    def unique_values_to_frontend_json(self) -> dict:
+    def unique_values_to_frontend_json(
+        self,
+        source_columns: Optional[List[str]] = None,
+        target_columns: Optional[List[str]] = None,
+        snapshot: Optional["TaskSnapshot"] = None,
+    ) -> dict:
+        """
+        Value bins of the source and target columns, all columns by default.
+
+        Args:
+            source_columns (List[str], optional): Only these source columns.
+            target_columns (List[str], optional): Only these target columns,
+                e.g. the target columns of the current candidates.
+                Columns not in the dataframes are skipped.
+            snapshot (TaskSnapshot, optional): The state to read, the
+                published one by default.
+        """
+        snapshot = snapshot or self.snapshot
+        if source_columns is None:
+            source_columns = snapshot.source_df.columns
+        if target_columns is None:
+            target_columns = snapshot.target_df.columns
         return {
             "sourceUniqueValues": [
                 {
                     "sourceColumn": source_col,
-                    "uniqueValues": self.get_source_value_bins(source_col),
+                    "uniqueValues": snapshot.source_profiles.get(source_col).bins,
                 }
-                for source_col in self.source_df.columns
+                for source_col in source_columns
+                if source_col in snapshot.source_df.columns
             ],
             "targetUniqueValues": [
                 {
                     "targetColumn": target_col,
-                    "uniqueValues": self.get_target_value_bins(target_col),
+                    "uniqueValues": snapshot.target_profiles.get(target_col).bins,
                 }
-                for target_col in self.target_df.columns
+                for target_col in target_columns
+                if target_col in snapshot.target_df.columns
             ],
         }
 
-    def value_matches_to_frontend_json(self) -> List[Dict[str, any]]:
-        value_matches = self.cached_candidates["value_matches"]
+    def value_matches_to_frontend_json(
+        self, snapshot: Optional["TaskSnapshot"] = None
+    ) -> List[Dict[str, any]]:
+        value_matches = (snapshot or self.snapshot).cached_candidates["value_matches"]
         ret_json = []
         for source_col, source_items in value_matches.items():
             source_json = {
@@ -420,8 +913,10 @@ class MatchingTask:
             ret_json.append(source_json)
         return ret_json
 
-    def _format_source_clusters_for_frontend(self) -> List[Dict[str, Any]]:
-        source_clusters = self.get_cached_source_clusters()
+    def _format_source_clusters_for_frontend(
+        self, snapshot: "TaskSnapshot"
+    ) -> List[Dict[str, Any]]:
+        source_clusters = snapshot.cached_candidates["source_clusters"] or {}
         return [
             {"sourceColumn": source_col, "cluster": cluster}
             for source_col, cluster in source_clusters.items()
@@ -438,70 +933,32 @@ class MatchingTask:
             with open(output_path, "r") as f:
                 return json.load(f)
 
-    def _bucket_column(self, df: pd.DataFrame, col: str) -> List[Dict[str, Any]]:
-        col_obj = df[col].dropna()
-        if col_obj.dtype in ["object", "category", "bool"]:
-            counter = col_obj.value_counts()[:10].to_dict()
-            return [
-                {"value": str(key), "count": int(value)}
-                for key, value in counter.items()
-                if value >= 1
-            ]
-        elif col_obj.dtype in ["int64", "float64"]:
-            col_obj = col_obj.dropna()  # Drop NaN values
-            if len(col_obj) == 0:
-                return []
-            unique_vals = col_obj.unique()
-            # If the integer column has few unique values, treat it as categorical
-            if col_obj.dtype == "int64" and len(unique_vals) <= 10:
-                counter = col_obj.value_counts().sort_index()
-                return [
-                    {"value": str(val), "count": int(count)}
-                    for val, count in counter.items()
-                ]
-            else:
-                min_val = col_obj.min()
-                max_val = col_obj.max()
-                bins = np.linspace(min_val, max_val, num=10)
-                counter = np.histogram(col_obj, bins=bins)[0]
-                if col_obj.dtype == "float64":
-                    return [
-                        {
-                            "value": f"{bins[i]:.2f}-{bins[i+1]:.2f}",
-                            "count": int(counter[i]),
-                        }
-                        for i in range(len(counter))
-                    ]
-                else:
-                    return [
-                        {
-                            "value": f"{int(bins[i])}-{int(bins[i+1])}",
-                            "count": int(counter[i]),
-                        }
-                        for i in range(len(counter))
-                    ]
-        else:
-            logger.warning(f"Column {col} is of type {col_obj.dtype}.")
-            return []
-
     def undo(self) -> Optional["UserOperation"]:
         logger.info("Undoing last operation...")
-        operation = self.history.undo_last_operation()
-        if operation:
-            self.undo_operation(
-                operation.operation, operation.candidate, operation.references
-            )
-            return operation._json_serialize()
+        with self.write_lock:
+            operation = self.history.undo_last_operation()
+            if isinstance(operation, UserOperationBatch):
+                self.undo_operations(operation.operations)
+                return operation._json_serialize()
+            if operation:
+                self.undo_operation(
+                    operation.operation, operation.candidate, operation.references
+                )
+                return operation._json_serialize()
         return None
 
     def redo(self) -> Optional["UserOperation"]:
         logger.info("Redoing last operation...")
-        operation = self.history.redo_last_operation()
-        if operation:
-            self.apply_operation(
-                operation.operation, operation.candidate, operation.references
-            )
-            return operation._json_serialize()
+        with self.write_lock:
+            operation = self.history.redo_last_operation()
+            if isinstance(operation, UserOperationBatch):
+                self.apply_operations(operation.operations)
+                return operation._json_serialize()
+            if operation:
+                self.apply_operation(
+                    operation.operation, operation.candidate, operation.references
+                )
+                return operation._json_serialize()
         return None
 
     def apply_operation(
@@ -512,42 +969,129 @@ class MatchingTask:
     ) -> None:
         logger.info(f"Applying operation: {operation}, on candidate: {candidate}...")
 
-        candidates = self.get_cached_candidates()
-        if self.update_matcher_weights:
-            self.weight_updater.update_weights(
-                operation, candidate["sourceColumn"], candidate["targetColumn"]
+        with self.write_lock:
+            candidates = self.get_cached_candidates()
+            if self.update_matcher_weights:
+                self.weight_updater.update_weights(
+                    operation, candidate["sourceColumn"], candidate["targetColumn"]
+                )
+                self.bump_version(
+                    {"type": "matchers", "matchers": self._current_matchers()}
+                )
+
+            # Add operation to history
+            self.history.add_operation(
+                UserOperation(operation, candidate, references)
             )
 
-        # Add operation to history
-        self.history.add_operation(UserOperation(operation, candidate, references))
-
-        if operation == "accept":
-            self.accept_cached_candidate(candidate)
-            # self.set_cached_candidates(
-            #     [
-            #         cached_candidate
-            #         for cached_candidate in candidates
-            #         if (cached_candidate["sourceColumn"] != candidate["sourceColumn"])
-            #         or (cached_candidate["targetColumn"] == candidate["targetColumn"])
-            #     ] + [candidate]
-            # )
-        elif operation == "reject":
-            self.reject_cached_candidate(candidate)
-            # self.set_cached_candidates(
-            #     [
-            #         cached_candidate
-            #         for cached_candidate in candidates
-            #         if not (
-            #             cached_candidate["sourceColumn"] == candidate["sourceColumn"]
-            #             and cached_candidate["targetColumn"]
-            #             == candidate["targetColumn"]
-            #         )
-            #     ]
-            # )
-        elif operation == "discard":
-            self.discard_cached_column(candidate["sourceColumn"])
-        else:
-            raise ValueError(f"Operation {operation} not supported.")
+            if operation == "accept":
+                self.accept_cached_candidate(candidate)
+                # self.set_cached_candidates(
+                #     [
+                #         cached_candidate
+                #         for cached_candidate in candidates
+                #         if (cached_candidate["sourceColumn"] != candidate["sourceColumn"])
+                #         or (cached_candidate["targetColumn"] == candidate["targetColumn"])
+                #     ] + [candidate]
+                # )
+            elif operation == "reject":
+                self.reject_cached_candidate(candidate)
+                # self.set_cached_candidates(
+                #     [
+                #         cached_candidate
+                #         for cached_candidate in candidates
+                #         if not (
+                #             cached_candidate["sourceColumn"] == candidate["sourceColumn"]
+                #             and cached_candidate["targetColumn"]
+                #             == candidate["targetColumn"]
+                #         )
+                #     ]
+                # )
+            elif operation == "discard":
+                self.discard_cached_column(candidate["sourceColumn"])
+            else:
+                raise ValueError(f"Operation {operation} not supported.")
+
+    def apply_operations(self, operations: List["UserOperation"]) -> None:
+        """
+        Apply several user operations at once, e.g. a bulk accept: the
+        statuses change in one pass over the cached candidates, the matcher
+        weights are updated once, and the history gets one entry that undo
+        and redo treat as a whole. Later operations win, as if applied in
+        order.
+        """
+        for operation in operations:
+            if operation.operation not in OPERATION_STATUSES:
+                raise ValueError(f"Operation {operation.operation} not supported.")
+        logger.info(f"Applying {len(operations)} operations...")
+
+        with self.write_lock:
+            if self.update_matcher_weights:
+                self.weight_updater.update_weights_batch(
+                    [
+                        (
+                            operation.operation,
+                            operation.candidate["sourceColumn"],
+                            operation.candidate["targetColumn"],
+                        )
+                        for operation in operations
+                    ]
+                )
+                self.bump_version(
+                    {"type": "matchers", "matchers": self._current_matchers()}
+                )
+
+            self.history.add_operation(UserOperationBatch(operations))
+            self._set_statuses(self._operation_statuses(operations))
+
+    def undo_operations(self, operations: List["UserOperation"]) -> None:
+        """Undo operations applied with apply_operations, in one pass."""
+        logger.info(f"Undoing {len(operations)} operations...")
+        with self.write_lock:
+            self._set_statuses(self._operation_statuses(operations, undo=True))
+
+    def _operation_statuses(
+        self, operations: List["UserOperation"], undo: bool = False
+    ) -> Callable[[Dict[str, Any]], Optional[str]]:
+        """
+        The status_of (see _set_statuses) of applying `operations` in order,
+        or of undoing them in reverse order, as undo_operation would one by
+        one. Operations are keyed by pair, or by source column for discards,
+        so the pass over the candidates does not scan the operations.
+        """
+        pairs: Dict[Tuple[str, str], List[Tuple[int, UserOperation]]] = {}
+        columns: Dict[str, List[Tuple[int, UserOperation]]] = {}
+        for order, operation in enumerate(operations):
+            candidate = operation.candidate
+            if operation.operation == "discard":
+                entries = columns.setdefault(candidate["sourceColumn"], [])
+            else:
+                entries = pairs.setdefault(
+                    (candidate["sourceColumn"], candidate["targetColumn"]), []
+                )
+            entries.append((order, operation))
+
+        def status_of(candidate: Dict[str, Any]) -> Optional[str]:
+            steps = pairs.get(
+                (candidate["sourceColumn"], candidate["targetColumn"]), []
+            ) + columns.get(candidate["sourceColumn"], [])
+            if not steps:
+                return None
+            steps.sort(key=lambda step: step[0])
+            if not undo:
+                return OPERATION_STATUSES[steps[-1][1].operation]
+
+            status = candidate["status"]
+            for _, operation in reversed(steps):
+                if operation.operation == "discard":
+                    restored = self._restored_status({**candidate, "status": status})
+                    status = restored or status
+                else:
+                    # The status the frontend sent is the one before the operation
+                    status = operation.candidate["status"]
+            return status
+
+        return status_of
 
     def undo_operation(
         self,
@@ -569,13 +1113,14 @@ class MatchingTask:
         #         + references
         #     )
         last_status = candidate["status"]
-        if operation in ["accept", "reject"]:
-            candidate["status"] = last_status
-            self.update_cached_candidate(candidate)
-        elif operation == "discard":
-            self.append_cached_column(candidate["sourceColumn"])
-        else:
-            raise ValueError(f"Operation {operation} not supported.")
+        with self.write_lock:
+            if operation in ["accept", "reject"]:
+                candidate["status"] = last_status
+                self.update_cached_candidate(candidate)
+            elif operation == "discard":
+                self.append_cached_column(candidate["sourceColumn"])
+            else:
+                raise ValueError(f"Operation {operation} not supported.")
 
     def get_source_df(self) -> pd.DataFrame:
         return self.source_df
@@ -584,29 +1129,30 @@ class MatchingTask:
         return self.target_df
 
     def get_source_value_bins(self, source_col: str) -> List[Dict[str, Any]]:
-        if self.source_df is None or source_col not in self.source_df.columns:
+        snapshot = self.snapshot
+        if snapshot.source_df is None or source_col not in snapshot.source_df.columns:
             raise ValueError(
                 f"Source column {source_col} not found in the source dataframe."
             )
-        return self._bucket_column(self.source_df, source_col)
+        return snapshot.source_profiles.get(source_col).bins
 
     def get_source_unique_values(self, source_col: str, n: int = 20) -> List[str]:
-        if self.source_df is None or source_col not in self.source_df.columns:
+        snapshot = self.snapshot
+        if snapshot.source_df is None or source_col not in snapshot.source_df.columns:
             raise ValueError(
                 f"Source column {source_col} not found in the source dataframe."
             )
         # if pd.api.types.is_numeric_dtype(self.source_df[source_col].dtype):
         #     return []
-        return sorted(
-            list(self.source_df[source_col].dropna().unique().astype(str)[:n])
-        )
+        return snapshot.source_profiles.get(source_col).get_unique_values(n)
 
     def get_target_value_bins(self, target_col: str) -> List[Dict[str, Any]]:
-        if self.target_df is None or target_col not in self.target_df.columns:
+        snapshot = self.snapshot
+        if snapshot.target_df is None or target_col not in snapshot.target_df.columns:
             raise ValueError(
                 f"Target column {target_col} not found in the target dataframe."
             )
-        return self._bucket_column(self.target_df, target_col)
+        return snapshot.target_profiles.get(target_col).bins
 
     def get_target_unique_values(self, target_col: str, n: int = 300) -> List[str]:
         if self.target_df is None or target_col not in self.target_df.columns:
@@ -628,28 +1174,69 @@ class MatchingTask:
                     #     target_values = random.sample(target_enum, n)
                     # else:
                     target_values = target_enum
-        return [str(target_value) for target_value in target_values] or list(
-            self.target_df[target_col].dropna().unique().astype(str)[:n]
-        )
+        return [
+            str(target_value) for target_value in target_values
+        ] or self.target_profiles.get(target_col).get_unique_values(n, sort=False)
 
     def get_cached_candidates(self) -> List[Dict[str, Any]]:
         return self.cached_candidates["candidates"]
 
-    def set_cached_candidates(self, candidates: List[Dict[str, Any]]) -> None:
-        self.cached_candidates["candidates"] = candidates
+    def set_cached_candidates(
+        self, candidates: List[Dict[str, Any]], change: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Args:
+            candidates (List[Dict[str, Any]]): The new cached candidates, not
+                to be mutated once set.
+            change (Dict[str, Any], optional): What changed, for the change log.
+                Without it the candidates count as replaced altogether.
+        """
+        with self.write_lock:
+            self._publish(
+                change,
+                cached_candidates={**self.cached_candidates, "candidates": candidates},
+            )
 
     def get_value_matches(self) -> Dict[str, Dict[str, Any]]:
         return self.cached_candidates["value_matches"]
 
     def update_cached_candidate(self, candidate: List[Dict[str, Any]]) -> None:
-        candidates = self.get_cached_candidates()
-        for index, c in enumerate(candidates):
-            if (
-                c["sourceColumn"] == candidate["sourceColumn"]
+        self._set_statuses(
+            lambda c: (
+                candidate["status"]
+                if c["sourceColumn"] == candidate["sourceColumn"]
                 and c["targetColumn"] == candidate["targetColumn"]
-            ):
-                candidates[index]["status"] = candidate["status"]
-        self.set_cached_candidates(candidates)
+                else None
+            )
+        )
+
+    def get_candidate_index(
+        self, weights: Optional[Dict[str, float]] = None
+    ) -> CandidateIndex:
+        """
+        The index over the cached candidates, rebuilt once per state version.
+
+        Args:
+            weights (Dict[str, float], optional): Matcher weights to fuse the
+                scores with, e.g. while the user moves the weight sliders,
+                instead of the published ones.
+        """
+        snapshot = self.snapshot
+        if weights is None:
+            weights = {
+                matcher["name"]: matcher["weight"] for matcher in snapshot.matchers
+            }
+        key = (snapshot.version, tuple(sorted(weights.items())))
+        cached = self._candidate_index
+        if cached is None or cached[0] != key:
+            index = CandidateIndex(
+                snapshot.cached_candidates["candidates"],
+                weights,
+                load_gdc_ontology_flat(),
+            )
+            cached = (key, index)
+            self._candidate_index = cached
+        return cached[1]
 
     def get_cached_source_clusters(self) -> Dict[str, List[str]]:
         return self.cached_candidates["source_clusters"] or {}
@@ -658,23 +1245,28 @@ class MatchingTask:
         return self.cached_candidates["target_clusters"] or []
 
     def get_matchers(self) -> List[Dict[str, any]]:
+        return [dict(matcher) for matcher in self.snapshot.matchers]
+
+    def _current_matchers(self) -> List[Dict[str, any]]:
+        """The matcher weights to publish, get_matchers returns the published ones."""
         return [
             {"name": key, "weight": item.weight} for key, item in self.matchers.items()
         ]
 
     def get_accepted_candidates(self) -> pd.DataFrame:
+        snapshot = self.snapshot
         candidates_set = set()
-        for candidate in self.get_cached_candidates():
+        for candidate in snapshot.cached_candidates["candidates"]:
             if candidate["status"] == "accepted":
                 candidates_set.add(
                     (candidate["sourceColumn"], candidate["targetColumn"])
                 )
 
         target_columns = []
-        ret_df = self.source_df.copy()
+        ret_df = snapshot.source_df.copy()
         for source_col, target_col in candidates_set:
             target_columns.append(target_col)
-            ret_df[target_col] = self.source_df[source_col]
+            ret_df[target_col] = snapshot.source_df[source_col]
 
         return ret_df[target_columns]
 
@@ -693,8 +1285,10 @@ class MatchingTask:
             ]
         }
         """
+        snapshot = self.snapshot
+        all_value_matches = snapshot.cached_candidates["value_matches"]
         candidates_set = set()
-        for candidate in self.get_cached_candidates():
+        for candidate in snapshot.cached_candidates["candidates"]:
             if candidate["status"] == "accepted":
                 candidates_set.add(
                     (candidate["sourceColumn"], candidate["targetColumn"])
@@ -702,42 +1296,204 @@ class MatchingTask:
 
         ret = []
         for source_col, target_col in candidates_set:
-            if source_col not in self.get_value_matches():
+            if source_col not in all_value_matches:
                 continue
-            if target_col not in self.get_value_matches()[source_col]["targets"]:
+            if target_col not in all_value_matches[source_col]["targets"]:
                 value_matches = []
             else:
-                value_matches = self.get_value_matches()[source_col]["targets"][
-                    target_col
-                ]
+                value_matches = all_value_matches[source_col]["targets"][target_col]
+            source_profile = snapshot.source_profiles.get(source_col)
+            source_values = source_profile.get_unique_values(20)
             ret.append(
                 {
                     "sourceColumn": source_col,
                     "targetColumn": target_col,
                     "valueMatches": [
                         {"from": from_val, "to": to_val}
-                        for from_val, to_val in zip(
-                            self.get_source_unique_values(source_col), value_matches
-                        )
+                        for from_val, to_val in zip(source_values, value_matches)
                     ],
                 }
             )
         return ret
 
+    def get_accepted_columns(
+        self, snapshot: Optional["TaskSnapshot"] = None
+    ) -> List[ExportColumn]:
+        """
+        The (source column, target column, value mapping) of every accepted
+        candidate, one per target column like get_accepted_candidates. The
+        value mapping holds the source values matched to a target value,
+        other values are exported as they are.
+        """
+        snapshot = snapshot or self.snapshot
+        all_value_matches = snapshot.cached_candidates["value_matches"]
+        columns: Dict[str, ExportColumn] = {}
+        for candidate in snapshot.cached_candidates["candidates"]:
+            if candidate["status"] != "accepted":
+                continue
+            source_col = candidate["sourceColumn"]
+            target_col = candidate["targetColumn"]
+            items = all_value_matches.get(source_col, {"targets": {}})
+            mapping = {
+                from_val: to_val
+                for from_val, to_val in zip(
+                    items.get("source_unique_values", []),
+                    items["targets"].get(target_col, []),
+                )
+                if to_val
+            }
+            columns[target_col] = (source_col, target_col, mapping)
+        return list(columns.values())
+
+    def iter_harmonized_chunks(
+        self, chunk_rows: int = EXPORT_CHUNK_ROWS
+    ) -> Iterator[pd.DataFrame]:
+        """
+        The accepted target columns of the whole source, `chunk_rows` rows at
+        a time, with the accepted value matches applied (see
+        harmonized_export). The state is read when called, so a stream is
+        not affected by operations made while it is consumed.
+        """
+        snapshot = self.snapshot
+        return self._harmonized_chunks(
+            snapshot.source_df, self.get_accepted_columns(snapshot), chunk_rows
+        )
+
+    @staticmethod
+    def _harmonized_chunks(
+        source_df: pd.DataFrame, columns: List[ExportColumn], chunk_rows: int
+    ) -> Iterator[pd.DataFrame]:
+        chunk_rows = max(1, chunk_rows)
+        # An empty source still yields one chunk, for the header or schema
+        for start in range(0, max(len(source_df), 1), chunk_rows):
+            yield harmonize_chunk(source_df.iloc[start : start + chunk_rows], columns)
+
     def set_source_value_matches(
         self, source_col: str, from_val: str, to_val: str
-    ) -> None:
-        self.cached_candidates["value_matches"][source_col]["source_unique_values"] = [
-            to_val if val == from_val else val
-            for val in self.cached_candidates["value_matches"][source_col][
-                "source_unique_values"
-            ]
-        ]
+    ) -> Dict[str, Dict[str, Any]]:
+        """The value matches with `from_val` renamed in `source_col`, a copy."""
+        value_matches = dict(self.get_value_matches())
+        items = value_matches[source_col]
+        value_matches[source_col] = {
+            **items,
+            "source_unique_values": [
+                to_val if val == from_val else val
+                for val in items["source_unique_values"]
+            ],
+        }
+        return value_matches
 
     def set_source_value(self, column: str, from_val: str, to_val: str) -> None:
         logger.info(f"Setting value {from_val} to {to_val} in column {column}...")
-        self.source_df[column] = self.source_df[column].replace(from_val, to_val)
-        self.set_source_value_matches(column, from_val, to_val)
+        with self.write_lock:
+            snapshot = self.snapshot
+            # Shallow copies with the column replaced, the published
+            # dataframes stay as they are for their readers
+            source_df = snapshot.source_df.copy(deep=False)
+            source_df[column] = source_df[column].replace(from_val, to_val)
+            source_sample = source_df
+            if snapshot.source_sample is not snapshot.source_df:
+                source_sample = snapshot.source_sample.copy(deep=False)
+                source_sample[column] = source_sample[column].replace(
+                    from_val, to_val
+                )
+            self._publish(
+                {"type": "value", "column": column, "from": from_val, "to": to_val},
+                source_df=source_df,
+                source_sample=source_sample,
+                source_profiles=snapshot.source_profiles.replace(
+                    source_sample,
+                    population=source_df if source_sample is not source_df else None,
+                    invalidated=[column],
+                ),
+                cached_candidates={
+                    **snapshot.cached_candidates,
+                    "value_matches": self.set_source_value_matches(
+                        column, from_val, to_val
+                    ),
+                },
+            )
+
+
+class TaskSnapshot:
+    """
+    The state of a MatchingTask as of one version: dataframes, profiles,
+    cached candidates (with clusters and value matches) and matcher weights.
+
+    Snapshots and everything they reference are never mutated once
+    published. Writers build new objects and publish a new snapshot with
+    MatchingTask._publish, so readers holding one see a consistent state
+    without locking, however long a recompute takes.
+    """
+
+    __slots__ = (
+        "version",
+        "source_df",
+        "source_sample",
+        "target_df",
+        "source_profiles",
+        "target_profiles",
+        "cached_candidates",
+        "matchers",
+    )
+
+    def __init__(
+        self,
+        version: int = 0,
+        source_df: Optional[pd.DataFrame] = None,
+        source_sample: Optional[pd.DataFrame] = None,
+        target_df: Optional[pd.DataFrame] = None,
+        source_profiles: Optional[ProfileStore] = None,
+        target_profiles: Optional[ProfileStore] = None,
+        cached_candidates: Optional[Dict[str, Any]] = None,
+        matchers: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        self.version = version
+        self.source_df = source_df
+        self.source_sample = source_sample
+        self.target_df = target_df
+        self.source_profiles = source_profiles
+        self.target_profiles = target_profiles
+        self.cached_candidates = cached_candidates or {}
+        self.matchers = matchers or []
+
+    def replace(self, **state: Any) -> "TaskSnapshot":
+        """A new snapshot with the given state replaced."""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(state)
+        return TaskSnapshot(**values)
+
+
+class ChangeLog:
+    """Versioned changes of a MatchingTask, for delta syncs of the frontend.
+
+    Entries look like {"version": 12, "type": "status", "candidates": [...]},
+    with the types:
+    - status: new statuses of candidates, keyed by source, target and matcher
+    - splice: all candidates of some source columns replaced (agent updates)
+    - matchers: new matcher weights
+    - value: a source value edited, from -> to
+    Only the latest `max_entries` are kept, and a reset (new dataframes or
+    re-matching) drops them all; clients behind `floor` need a full snapshot.
+    """
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        self.entries = deque(maxlen=max_entries)
+        self.floor = 0
+
+    def append(self, version: int, change: Dict[str, Any]) -> None:
+        if len(self.entries) == self.entries.maxlen:
+            self.floor = self.entries[0]["version"]
+        self.entries.append({"version": version, **change})
+
+    def reset(self, version: int) -> None:
+        self.entries.clear()
+        self.floor = version
+
+    def since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        if version < self.floor:
+            return None
+        return [entry for entry in self.entries if entry["version"] > version]
 
 
 class UserOperationHistory:
@@ -785,3 +1541,23 @@ class UserOperation:
             "operation": self.operation,
             "candidate": self.candidate,
         }
+
+
+class UserOperationBatch(UserOperation):
+    """Operations applied together by apply_operations, one history entry.
+
+    Serialized like a single operation on the last candidate, so timelines
+    that expect one candidate per entry still work, plus all operations.
+    """
+
+    def __init__(self, operations: List[UserOperation]) -> None:
+        super().__init__("batch", operations[-1].candidate, [])
+        self.operations = operations
+
+    def _json_serialize(self) -> Dict[str, Any]:
+        return {
+            **super()._json_serialize(),
+            "operations": [
+                operation._json_serialize() for operation in self.operations
+            ],
+        }
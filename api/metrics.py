@@ -0,0 +1,252 @@
+"""Process-wide metrics in the Prometheus text exposition format.
+
+A minimal registry (counters, histograms and callback gauges) so that no
+client library is needed; ``render`` produces what ``/api/metrics`` serves.
+"""
+
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .inference_scheduler import INFERENCE_SCHEDULER
+from .langchain.memory_writer import memory_writer_stats
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a cached lookup to a full matching run
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+LabelValues = Tuple[str, ...]
+
+REGISTRY: List["_Metric"] = []
+# Called with (metric name, labels, start, end) after every Histogram.time
+# block, e.g. by the pipeline benchmark to attribute memory to stages
+SPAN_LISTENERS: List[Callable[[str, Dict[str, str], float, float], None]] = []
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.labelnames, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """The sample lines of the metric, without HELP and TYPE."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+        return [
+            f"{self.name}{self._format_labels(key)} {_number(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket (the last one is +Inf), and sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.observe(end - start, **labels)
+            for listener in SPAN_LISTENERS:
+                listener(self.name, labels, start, end)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = {key: (list(c), t[0]) for key, (c, t) in self.values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = self._format_labels(key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = self._format_labels(key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge read when rendered, from a callback returning values by labels."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        callback: Callable[[], Dict[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{self._format_labels(key)} {_number(value)}"
+            for key, value in sorted(self.callback().items())
+        ]
+
+
+STAGE_SECONDS = Histogram(
+    "bdiviz_matching_stage_seconds",
+    "Time spent in each stage of candidate generation.",
+    ["stage"],
+)
+MATCHER_SECONDS = Histogram(
+    "bdiviz_matcher_seconds",
+    "Time spent in BaseMatcher.top_matches, per matcher.",
+    ["matcher"],
+)
+AGENT_SECONDS = Histogram(
+    "bdiviz_agent_invoke_seconds",
+    "Time spent in Agent.invoke, per output structure.",
+    ["output"],
+)
+REQUEST_SECONDS = Histogram(
+    "bdiviz_http_request_seconds",
+    "Latency of API requests.",
+    ["endpoint", "method", "status"],
+)
+CACHE_REQUESTS = Counter(
+    "bdiviz_cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+
+
+def _cache_hit_ratios() -> Dict[LabelValues, float]:
+    with CACHE_REQUESTS.lock:
+        values = dict(CACHE_REQUESTS.values)
+    ratios = {}
+    for cache in sorted({cache for cache, _ in values}):
+        hits = values.get((cache, "hit"), 0)
+        total = hits + values.get((cache, "miss"), 0)
+        ratios[(cache,)] = hits / total if total else 0.0
+    return ratios
+
+
+CACHE_HIT_RATIO = Gauge(
+    "bdiviz_cache_hit_ratio",
+    "Share of cache lookups that were hits, by cache.",
+    _cache_hit_ratios,
+    ["cache"],
+)
+
+INFERENCE_ACTIVE = Gauge(
+    "bdiviz_inference_active",
+    "Inference runs holding a slot.",
+    lambda: {(): INFERENCE_SCHEDULER.stats()["active"]},
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "bdiviz_inference_queue_depth",
+    "Inference runs waiting for a slot.",
+    lambda: {(): INFERENCE_SCHEDULER.queue_depth()},
+)
+MEMORY_QUEUE_DEPTH = Gauge(
+    "bdiviz_memory_queue_depth",
+    "Agent memories queued or being written.",
+    lambda: {(): memory_writer_stats()["depth"]},
+)
+MEMORY_QUEUE_LAG = Gauge(
+    "bdiviz_memory_queue_lag_seconds",
+    "Age of the oldest agent memory not yet written.",
+    lambda: {(): memory_writer_stats()["lagSeconds"]},
+)
+
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    """Count `count` lookups of `cache`, e.g. record_cache("embeddings", False, 12)."""
+    if count:
+        CACHE_REQUESTS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+def render(metrics: Optional[List[_Metric]] = None) -> str:
+    return "\n".join(metric.render() for metric in metrics or REGISTRY) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+T = TypeVar("T")
+
+PROVIDERS: Dict[str, "LazyProvider"] = {}
+
+
+class LazyProvider(Generic[T]):
+    """Thread-safe, lazily created singleton.
+
+    The factory runs on the first attribute access (or on ``warmup``), and
+    attribute access is forwarded to the created instance, so a provider can
+    replace a module-level singleton without touching its call sites:
+
+        AGENT = LazyProvider("agent", Agent)
+        AGENT.explain(...)  # creates the Agent on first use
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]) -> None:
+        self._name = name
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        self._init_seconds: Optional[float] = None
+        PROVIDERS[name] = self
+
+    def get(self) -> T:
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                logger.info(f"[Provider] Initializing {self._name}...")
+                start = time.perf_counter()
+                self._instance = self._factory()
+                self._init_seconds = time.perf_counter() - start
+                logger.info(
+                    f"[Provider] {self._name} initialized in {self._init_seconds:.2f}s"
+                )
+            return self._instance
+
+    def is_initialized(self) -> bool:
+        return self._instance is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self._name,
+            "initialized": self.is_initialized(),
+            "initSeconds": self._init_seconds,
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not defined on the provider itself
+        return getattr(self.get(), name)
+
+
+def warmup(names: Optional[List[str]] = None) -> Dict[str, float]:
+    """Initialize the registered providers, all of them by default.
+
+    Returns:
+        Dict[str, float]: Seconds spent initializing each provider.
+    """
+    timings = {}
+    for name, provider in PROVIDERS.items():
+        if names is not None and name not in names:
+            continue
+        start = time.perf_counter()
+        provider.get()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def warmup_in_background(names: Optional[List[str]] = None) -> threading.Thread:
+    def _run():
+        try:
+            timings = warmup(names)
+            logger.info(f"[Provider] Warmup finished: {timings}")
+        except Exception as e:
+            logger.error(f"[Provider] Warmup failed: {e}")
+
+    thread = threading.Thread(target=_run, name="bdiviz-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def provider_status() -> List[Dict[str, Any]]:
+    return [provider.status() for provider in PROVIDERS.values()]
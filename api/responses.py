@@ -0,0 +1,253 @@
+import gzip
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, current_app, request
+
+from .metrics import record_cache
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is used when brotli is not installed
+    brotli = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional, Arrow responses are not offered without it
+    pa = None
+
+logger = logging.getLogger("bdiviz_flask.sub")
+
+JSON_MIMETYPE = "application/json"
+# Lists of records as dictionary-encoded columns, see to_columnar
+COLUMNAR_JSON_MIMETYPE = "application/vnd.bdiviz.columnar+json"
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def make_etag(state_tag: str, mimetype: str = JSON_MIMETYPE) -> str:
+    """
+    Weak ETag of a response: the state version plus a digest of the request
+    path, body and response format, since the body selects what is returned
+    (e.g. columns).
+
+    Args:
+        state_tag (str): The version of the state the response is built from,
+            e.g. MatchingTask.get_state_tag().
+        mimetype (str): The negotiated response format.
+    """
+    request_digest = hashlib.sha1(
+        b"\0".join(
+            [request.path.encode("utf-8"), request.get_data(), mimetype.encode()]
+        )
+    ).hexdigest()[:16]
+    return f'W/"{state_tag}-{request_digest}"'
+
+
+def conditional_json(
+    state_tag: str, build_payload: Callable[[], Dict[str, Any]]
+) -> Response:
+    """
+    JSON response that honors If-None-Match, Accept and Accept-Encoding.
+
+    The payload is only built when the client's ETag is stale, so polling an
+    unchanged state costs a version lookup and an empty 304 response.
+
+    Clients opt into a compact encoding of payload["results"] through Accept:
+    - application/vnd.bdiviz.columnar+json: JSON with lists of records
+      turned into dictionary-encoded columns (to_columnar)
+    - application/vnd.apache.arrow.stream: an Arrow IPC stream, when pyarrow
+      is installed (to_arrow_stream)
+
+    Args:
+        state_tag (str): The version of the state the payload is built from.
+            It must change whenever the payload would change.
+        build_payload (Callable[[], Dict[str, Any]]): Builds the response dict.
+
+    Returns:
+        Response: 304 Not Modified, or the (possibly compressed) JSON body.
+            406 if the client only accepts Arrow and the payload is not
+            Arrow-encodable.
+    """
+    mimetype = _negotiate_format()
+    etag = make_etag(state_tag, mimetype)
+    not_modified = etag in _if_none_match()
+    record_cache("etag", not_modified)
+    if not_modified:
+        response = Response(status=304)
+    else:
+        encoded = _encode(build_payload(), mimetype)
+        if encoded is None:
+            # Only Arrow is acceptable, and the payload cannot be encoded as such
+            response = Response(
+                current_app.json.dumps(
+                    {"message": "failure", "error": "Results not Arrow-encodable"}
+                ),
+                status=406,
+                mimetype=JSON_MIMETYPE,
+            )
+            response.vary.add("Accept")
+            return response
+        body, mimetype = encoded
+        response = Response(body, mimetype=mimetype)
+        _compress(response, body)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept")
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def to_columnar(value: Any) -> Any:
+    """
+    Encode every list of records in `value` column by column, e.g.
+        [{"sourceColumn": "a", "score": 0.5}, {"sourceColumn": "a", "score": 0.2}]
+    becomes
+        {"$columnar": {"length": 2, "columns": {
+            "sourceColumn": {"dictionary": ["a"], "codes": [0, 0]},
+            "score": {"values": [0.5, 0.2]},
+        }}}
+    Keys are sent once per list instead of once per record, and string columns
+    are dictionary-encoded, null is code -1. Other values are kept as they are.
+    """
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if not isinstance(value, list):
+        return value
+    if not value or not all(isinstance(item, dict) for item in value):
+        return [to_columnar(item) for item in value]
+
+    keys = list(dict.fromkeys(key for record in value for key in record))
+    columns = {}
+    for key in keys:
+        column = [record.get(key) for record in value]
+        if all(item is None or isinstance(item, str) for item in column):
+            dictionary: Dict[str, int] = {}
+            codes = [
+                -1 if item is None else dictionary.setdefault(item, len(dictionary))
+                for item in column
+            ]
+            columns[key] = {"dictionary": list(dictionary), "codes": codes}
+        else:
+            columns[key] = {"values": [to_columnar(item) for item in column]}
+    return {"$columnar": {"length": len(value), "columns": columns}}
+
+
+def to_arrow_stream(
+    results: Any, metadata: Optional[Dict[str, Any]] = None
+) -> bytes:
+    """
+    Arrow IPC stream of `results` with every string dictionary-encoded: one
+    row per record for a list of records, a single row otherwise.
+
+    Args:
+        results (Any): payload["results"].
+        metadata (Dict[str, Any], optional): The other payload keys, stored
+            JSON-encoded in the schema metadata, e.g. {"message": "success"}.
+    """
+    records = results if isinstance(results, list) else [results]
+    table = pa.Table.from_pylist(records)
+    table = pa.table(
+        {
+            name: _dictionary_encode(table.column(name).combine_chunks())
+            for name in table.column_names
+        }
+    )
+    table = table.replace_schema_metadata(
+        {key: current_app.json.dumps(value) for key, value in (metadata or {}).items()}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _dictionary_encode(array: "pa.Array") -> "pa.Array":
+    dtype = array.type
+    mask = array.is_null() if array.null_count else None
+    if pa.types.is_string(dtype):
+        return array.dictionary_encode()
+    if pa.types.is_struct(dtype):
+        children = [
+            _dictionary_encode(array.field(i)) for i in range(dtype.num_fields)
+        ]
+        return pa.StructArray.from_arrays(
+            children,
+            fields=[
+                pa.field(dtype.field(i).name, child.type)
+                for i, child in enumerate(children)
+            ],
+            mask=mask,
+        )
+    if pa.types.is_list(dtype):
+        return pa.ListArray.from_arrays(
+            array.offsets, _dictionary_encode(array.values), mask=mask
+        )
+    return array
+
+
+def _negotiate_format() -> str:
+    offered = [JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE]
+    if pa is not None:
+        offered.append(ARROW_STREAM_MIMETYPE)
+    return request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+
+
+def _encode(payload: Dict[str, Any], mimetype: str) -> Optional[Tuple[bytes, str]]:
+    """
+    The body of `payload` in `mimetype` and its actual mimetype, None if it
+    is not Arrow-encodable and the client accepts no other format.
+    """
+    if mimetype == ARROW_STREAM_MIMETYPE:
+        try:
+            metadata = {k: v for k, v in payload.items() if k != "results"}
+            return to_arrow_stream(payload.get("results"), metadata), mimetype
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            # e.g. lists mixing strings and numbers, fall back to the format
+            # the client prefers next
+            logger.warning(f"[Response] {request.path} not Arrow-encodable: {e}")
+            mimetype = request.accept_mimetypes.best_match(
+                [JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE]
+            )
+            if mimetype is None:
+                return None
+    if mimetype == COLUMNAR_JSON_MIMETYPE:
+        payload = {**payload, "results": to_columnar(payload.get("results"))}
+    return current_app.json.dumps(payload).encode("utf-8"), mimetype
+
+
+def _if_none_match() -> set:
+    header = request.headers.get("If-None-Match", "")
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+
+def _compress(response: Response, body: bytes) -> None:
+    if len(body) < MIN_COMPRESS_SIZE:
+        return
+    encoding = _choose_encoding()
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    else:
+        return
+    response.headers["Content-Encoding"] = encoding
+    logger.debug(
+        f"[Response] {request.path}: {len(body)} -> "
+        f"{response.content_length} bytes ({encoding})"
+    )
+
+
+def _choose_encoding() -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"] > 0:
+        return "br"
+    if accepted["gzip"] > 0:
+        return "gzip"
+    return None
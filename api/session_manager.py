@@ -1,7 +1,14 @@
+import os
+import time
 from collections import deque
-from typing import Dict, List
+from typing import Any, Dict, List
 
 from .matching_task import MatchingTask
+from .providers import LazyProvider
+from .session_usage import USAGE
+
+# When full, evict the largest of this many least recently used sessions
+EVICTION_CANDIDATES = int(os.environ.get("BDIVIZ_EVICTION_CANDIDATES", "3"))
 
 
 class SessionManager:
@@ -11,7 +18,7 @@ class SessionManager:
     Each session have:
     - A unique name
     - A MatchingTask object
-    -
+    - Its CPU and memory usage, see usage_report
     """
 
     def __init__(self):
@@ -22,24 +29,39 @@ class SessionManager:
     def add_session(self, session_name: str) -> None:
         if session_name in self.sessions:
             # Move the session to the end of the queue
-            self.queue.remove(session_name)
+            if session_name in self.queue:
+                self.queue.remove(session_name)
             self.queue.append(session_name)
         else:
-            if len(self.sessions) >= self.max_sessions:
-                # Remove the least recently used session
-                lru_session = self.queue.popleft()
-                del self.sessions[lru_session]
+            if len(self.sessions) >= self.max_sessions and self.queue:
+                self.remove_session(self._eviction_candidate())
             # Add the new session
             self.sessions[session_name] = Session(session_name)
             self.queue.append(session_name)
 
+    def _eviction_candidate(self) -> str:
+        """
+        The session that frees the most memory among the EVICTION_CANDIDATES
+        least recently used ones.
+        """
+        candidates = list(self.queue)[: max(EVICTION_CANDIDATES, 1)]
+        return max(
+            candidates,
+            key=lambda name: self.sessions[name].matching_task.memory_usage()["total"],
+        )
+
     def get_session(self, session_name: str) -> "Session":
-        return self.sessions.get(session_name)
+        session = self.sessions.get(session_name)
+        if session is not None:
+            session.last_used = time.time()
+        return session
 
     def remove_session(self, session_name: str) -> None:
         if session_name in self.sessions:
             del self.sessions[session_name]
-            self.queue.remove(session_name)
+            if session_name in self.queue:
+                self.queue.remove(session_name)
+            USAGE.discard(session_name)
 
     def get_active_sessions(self) -> List[str]:
         return list(self.sessions.keys())
@@ -47,11 +69,40 @@ class SessionManager:
     def get_session_count(self) -> int:
         return len(self.sessions)
 
+    def usage_report(self) -> List[Dict[str, Any]]:
+        """
+        Approximate memory and cumulative CPU time of every session, heaviest
+        first.
+
+        Returns:
+            List[Dict[str, Any]]: [{"name", "created", "lastUsed",
+            "memoryBytes": {part: bytes, "total"}, "cpu": {"cpuSeconds",
+            "wallSeconds", "stages"}}, ...]
+        """
+        report = [
+            {
+                "name": session.name,
+                "created": session.created,
+                "lastUsed": session.last_used,
+                "memoryBytes": session.matching_task.memory_usage(),
+                "cpu": session.usage.to_json(),
+            }
+            for session in list(self.sessions.values())
+        ]
+        report.sort(key=lambda entry: entry["memoryBytes"]["total"], reverse=True)
+        return report
+
 
 class Session:
     def __init__(self, name: str):
         self.name = name
-        self.matching_task = MatchingTask()
+        self.matching_task = MatchingTask(session_name=name)
+        self.created = time.time()
+        self.last_used = self.created
+
+    @property
+    def usage(self):
+        return USAGE.get(self.name)
 
 
-SESSION_MANAGER = SessionManager()
+SESSION_MANAGER = LazyProvider("session_manager", SessionManager)
@@ -0,0 +1,139 @@
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import FunctionType, MethodType, ModuleType
+from typing import Any, Dict, Iterator, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+
+class SessionUsage:
+    """
+    CPU and wall time one session spent, by pipeline stage or agent call.
+
+    CPU time is that of the thread running the stage (time.thread_time), so
+    work in native thread pools, e.g. torch intra-op threads, only shows in
+    the wall time.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def track(self, stage: str) -> Iterator[None]:
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.thread_time() - cpu, time.perf_counter() - wall)
+
+    def add(self, stage: str, cpu_seconds: float, wall_seconds: float) -> None:
+        with self.lock:
+            entry = self.stages.setdefault(
+                stage, {"calls": 0, "cpuSeconds": 0.0, "wallSeconds": 0.0}
+            )
+            entry["calls"] += 1
+            entry["cpuSeconds"] += cpu_seconds
+            entry["wallSeconds"] += wall_seconds
+
+    def cpu_seconds(self) -> float:
+        with self.lock:
+            return sum(entry["cpuSeconds"] for entry in self.stages.values())
+
+    def to_json(self) -> Dict[str, Any]:
+        with self.lock:
+            stages = {stage: dict(entry) for stage, entry in self.stages.items()}
+        return {
+            "cpuSeconds": sum(entry["cpuSeconds"] for entry in stages.values()),
+            "wallSeconds": sum(entry["wallSeconds"] for entry in stages.values()),
+            "stages": stages,
+        }
+
+
+class UsageRegistry:
+    """
+    SessionUsage of every session, by name.
+
+    Code shared by all sessions, like the agent, charges the session of the
+    current request, set per thread with set_current:
+
+        with USAGE.track_current("agent:explain"):
+            ...
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.usages: Dict[str, SessionUsage] = {}
+        self.local = threading.local()
+
+    def get(self, session: str) -> SessionUsage:
+        with self.lock:
+            if session not in self.usages:
+                self.usages[session] = SessionUsage()
+            return self.usages[session]
+
+    def discard(self, session: str) -> None:
+        with self.lock:
+            self.usages.pop(session, None)
+
+    def set_current(self, session: Optional[str]) -> None:
+        self.local.session = session
+
+    def current(self) -> Optional[str]:
+        return getattr(self.local, "session", None)
+
+    @contextmanager
+    def track_current(self, stage: str) -> Iterator[None]:
+        session = self.current()
+        if session is None:
+            yield
+            return
+        with self.get(session).track(stage):
+            yield
+
+
+USAGE = UsageRegistry()
+
+# Not owned by whoever references them
+_NOT_SIZED = (type, ModuleType, FunctionType, MethodType, threading.Thread)
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """
+    Approximate bytes held by `obj` and everything it references: pandas
+    memory_usage(deep=True), numpy buffers, containers and instance
+    attributes. Objects reached twice, or whose id is in `seen`, are counted
+    once, so parts sized with the same `seen` do not overlap.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if item is None or id(item) in seen or isinstance(item, _NOT_SIZED):
+            continue
+        seen.add(id(item))
+
+        if isinstance(item, pd.DataFrame):
+            total += int(item.memory_usage(deep=True, index=True).sum())
+        elif isinstance(item, (pd.Series, pd.Index)):
+            total += int(item.memory_usage(deep=True))
+        elif isinstance(item, np.ndarray):
+            total += item.nbytes
+            if item.dtype == object:
+                stack.extend(item.ravel().tolist())
+        else:
+            total += sys.getsizeof(item)
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            elif isinstance(item, (list, tuple, set, frozenset, deque)):
+                stack.extend(item)
+            elif hasattr(item, "__dict__"):
+                stack.append(vars(item))
+    return total
@@ -0,0 +1,135 @@
+"""Import-time and time-to-healthy report for the Flask app.
+
+Usage (from the repository root):
+    python -m api.startup_profile [--top 25] [--warmup] [--json]
+
+- Import time is measured with ``python -X importtime`` in a fresh interpreter
+  and reported per module (self and cumulative microseconds).
+- Time-to-healthy is the wall time from spawning a fresh interpreter until
+  ``GET /api/health`` answers through the Flask test client.
+- With ``--warmup``, the report also includes how long each lazy provider
+  takes to initialize.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+HEALTH_PROBE = """
+import json, time
+start = time.perf_counter()
+from api.index import app
+imported = time.perf_counter()
+response = app.test_client().get("/api/health")
+healthy = time.perf_counter()
+result = {
+    "status": response.status_code,
+    "import_seconds": imported - start,
+    "health_seconds": healthy - imported,
+}
+if WARMUP:
+    from api.providers import warmup
+    result["warmup_seconds"] = warmup()
+print(json.dumps(result))
+"""
+
+
+def profile_imports(module: str = "api.index") -> List[Dict[str, Any]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append(
+            {
+                # Nested imports are indented by two spaces per level
+                "module": name[1:].rstrip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    return rows
+
+
+def profile_health(warmup: bool = False) -> Dict[str, Any]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", f"WARMUP = {warmup}\n{HEALTH_PROBE}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Health probe failed:\n{proc.stderr[-2000:]}")
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = elapsed
+    return result
+
+
+def build_report(top: int = 25, warmup: bool = False) -> Dict[str, Any]:
+    imports = profile_imports()
+    top_level = [row for row in imports if not row["module"].startswith(" ")]
+    return {
+        "total_import_us": sum(row["cumulative_us"] for row in top_level),
+        "slowest_cumulative": sorted(
+            imports, key=lambda row: row["cumulative_us"], reverse=True
+        )[:top],
+        "slowest_self": sorted(imports, key=lambda row: row["self_us"], reverse=True)[
+            :top
+        ],
+        "health": profile_health(warmup),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    health = report["health"]
+    print(f"Total import time:  {report['total_import_us'] / 1e6:.3f}s")
+    print(f"Import api.index:   {health['import_seconds']:.3f}s")
+    print(f"First /api/health:  {health['health_seconds'] * 1e3:.1f}ms")
+    print(f"Time to healthy:    {health['process_seconds']:.3f}s (incl. interpreter)")
+    if "warmup_seconds" in health:
+        print("Warmup:")
+        for name, seconds in health["warmup_seconds"].items():
+            print(f"  {name:<30}{seconds:>10.3f}s")
+
+    print("\nSlowest imports (cumulative):")
+    print(f"  {'cumulative [ms]':>15}  {'self [ms]':>10}  module")
+    for row in report["slowest_cumulative"]:
+        print(
+            f"  {row['cumulative_us'] / 1e3:>15.1f}  {row['self_us'] / 1e3:>10.1f}  {row['module'].strip()}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--warmup", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = build_report(args.top, args.warmup)
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -80,16 +80,7 @@ class CandidateButler:
         logger.info(
             f"[Candidate Butler] Update candidates to the matching task {candidates}......"
         )
-        cached_candidates = self.matching_task.get_cached_candidates()
-        sources_to_update = set([candidate["sourceColumn"] for candidate in candidates])
-        cached_candidates = [
-            candidate
-            for candidate in cached_candidates
-            if candidate["sourceColumn"] not in sources_to_update
-        ]
-        cached_candidates.extend(candidates)
-
-        self.matching_task.set_cached_candidates(cached_candidates)
+        self.matching_task.splice_cached_candidates(candidates)
 
         return {"status": "success"}
 
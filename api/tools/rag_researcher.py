@@ -4,7 +4,7 @@ from typing import Dict, List, Tuple
 
 from langchain_core.tools import tool
 
-# from ..langchain.rag import RAG
+from ..langchain.rag import RAG
 
 logger = logging.getLogger("bdiviz_flask.sub")
 
@@ -19,9 +19,7 @@ def retrieve_from_rag(query: str, topk: int = 2) -> List[str]:
     Returns:
         List[str]: Related context from the biomedical schema.
     """
-    # related_documents = RAG.retrieve(query, topk)
-    # context = [doc.page_content for doc in related_documents]
-    # print(f"[RAG Researcher] Retrieved the related context: {context}")
-    # logger.info(f"[RAG Researcher] Retrieved the related context: {context}")
-    # return context
-    return []
+    related_documents = RAG.retrieve(query, topk)
+    context = [doc.page_content for doc in related_documents]
+    logger.info(f"[RAG Researcher] Retrieved the related context: {context}")
+    return context
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import re
+import threading
 from io import StringIO
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -34,11 +35,48 @@ def extract_session_name(request) -> str:
     return session_name
 
 
+class SourceFileError(ValueError):
+    pass
+
+
 def extract_data_from_request(request):
+    """
+    Read the uploaded source table. Either a streamed multipart file field
+    `source_file` (CSV or Parquet, stored as the cached source, see
+    load_cached_source) or the legacy `source_csv` form string.
+
+    Payload bodies are never logged, only their size.
+
+    Raises:
+        SourceFileError: When the uploaded file cannot be parsed, the cached
+            source is then left as it was.
+    """
     source_df = None
     target_df = None
 
-    logger.info(request.form["source_csv"])
+    if "source_file" in request.files:
+        upload = request.files["source_file"]
+        source_format = get_source_format(upload.filename)
+        path = SOURCE_PATHS[source_format]
+        # Werkzeug spools large parts to disk, save() copies them in chunks
+        tmp_path = path + ".upload"
+        upload.save(tmp_path)
+        size = os.path.getsize(tmp_path)
+        logger.info(
+            f"[Upload] Received {source_format} source "
+            f"{upload.filename!r} ({size} bytes)"
+        )
+        try:
+            source_df = read_source_file(tmp_path, source_format)
+        except Exception as e:
+            os.remove(tmp_path)
+            logger.warning(f"[Upload] Could not parse {upload.filename!r}: {e}")
+            raise SourceFileError(
+                f"Could not read {upload.filename!r} as {source_format}: {e}"
+            ) from e
+        clear_cached_source()
+        os.replace(tmp_path, path)
+        return source_df, target_df
 
     if request.form is None:
         return None
@@ -48,12 +86,91 @@ def extract_data_from_request(request):
     type = form["type"]
     if type == "csv_input":
         source_csv = form["source_csv"]
+        logger.info(f"[Upload] Received csv_input source ({len(source_csv)} chars)")
         source_csv_string_io = StringIO(source_csv)
         source_df = pd.read_csv(source_csv_string_io, sep=",")
+        clear_cached_source()
+        source_df.to_csv(SOURCE_CSV_PATH, index=False)
 
     return source_df, target_df
 
 
+SOURCE_CSV_PATH = ".source.csv"
+SOURCE_PARQUET_PATH = ".source.parquet"
+SOURCE_PATHS = {"csv": SOURCE_CSV_PATH, "parquet": SOURCE_PARQUET_PATH}
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def get_source_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".parquet", ".pq")):
+        return "parquet"
+    return "csv"
+
+
+def read_source_file(path: str, source_format: str = "csv") -> pd.DataFrame:
+    """
+    Read a source table from disk, with the multithreaded Arrow readers when
+    pyarrow is installed and pandas otherwise.
+
+    The CSV options reproduce pd.read_csv: pandas' null markers, empty strings
+    as null, no timestamp inference, and all-null columns as float64. Arrow
+    buffers are released while converting, so the peak stays close to one
+    copy of the data.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pa_parquet
+    except ImportError:
+        logger.info("[Upload] pyarrow not available, reading with pandas")
+        if source_format == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+
+    if source_format == "parquet":
+        table = pa_parquet.read_table(path)
+    else:
+        from pandas._libs.parsers import STR_NA_VALUES
+
+        table = pa_csv.read_csv(
+            path,
+            read_options=pa_csv.ReadOptions(
+                use_threads=True, block_size=CSV_BLOCK_SIZE
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                null_values=sorted(STR_NA_VALUES),
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=True,
+                timestamp_parsers=[],
+            ),
+        )
+        table = table.cast(
+            pa.schema(
+                [
+                    pa.field(field.name, pa.float64())
+                    if pa.types.is_null(field.type)
+                    else field
+                    for field in table.schema
+                ]
+            )
+        )
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+def load_cached_source() -> Optional[pd.DataFrame]:
+    """The last uploaded source table, None if there is none."""
+    for source_format, path in SOURCE_PATHS.items():
+        if os.path.exists(path):
+            return read_source_file(path, source_format)
+    return None
+
+
+def clear_cached_source() -> None:
+    for path in SOURCE_PATHS.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+
 @check_cache_dir
 def sanitize_filename(name: str) -> str:
     return re.sub(r"[^a-zA-Z0-9_-]", "_", name)
@@ -116,14 +233,46 @@ def download_model_pt(url: str, model_name: str) -> str:
     return model_path
 
 
+GDC_DATA_PATH = os.path.join(os.path.dirname(__file__), "./resources/cptac-3.csv")
+
+_gdc_target_df: Optional[pd.DataFrame] = None
+_gdc_target_lock = threading.Lock()
+
+
+def load_gdc_target() -> pd.DataFrame:
+    """The GDC target dataframe, read once and shared by every session.
+
+    Sessions must treat it as read-only, its column profiles are shared too.
+    """
+    global _gdc_target_df
+    with _gdc_target_lock:
+        if _gdc_target_df is None:
+            _gdc_target_df = pd.read_csv(GDC_DATA_PATH)
+        return _gdc_target_df
+
+
+def is_gdc_target(df: pd.DataFrame) -> bool:
+    return df is not None and df is _gdc_target_df
+
+
 GDC_ONTOLOGY_FLAT_PATH = os.path.join(
     os.path.dirname(__file__), "./resources/gdc_ontology_flat.json"
 )
 
+_gdc_ontology_flat: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def load_gdc_ontology_flat() -> Dict[str, Dict[str, Any]]:
+    """The flat GDC ontology keyed by column name, read once. Do not modify it."""
+    global _gdc_ontology_flat
+    if _gdc_ontology_flat is None:
+        with open(GDC_ONTOLOGY_FLAT_PATH, "r") as f:
+            _gdc_ontology_flat = json.load(f)
+    return _gdc_ontology_flat
+
 
 def load_gdc_ontology(candidates: List[Dict[str, Any]]) -> List[Dict]:
-    with open(GDC_ONTOLOGY_FLAT_PATH, "r") as f:
-        gdc_ontology_flat = json.load(f)
+    gdc_ontology_flat = load_gdc_ontology_flat()
 
     hiarchies = {}
     target_columns = set()
@@ -183,11 +332,18 @@ def is_candidate_for_category(
     Returns:
         bool: True if the column is a candidate for categorical treatment.
     """
-    unique_count = series.nunique()
-    total_count = series.count()
+    return is_category_by_counts(
+        series.nunique(), series.count(), unique_threshold, ratio_threshold
+    )
+
+
+def is_category_by_counts(
+    unique_count: int, total_count: int, unique_threshold=10, ratio_threshold=0.05
+) -> bool:
+    """Same as is_candidate_for_category, from precomputed counts."""
     unique_ratio = unique_count / total_count if total_count > 0 else 0
 
-    print(
+    logger.debug(
         f"Unique count: {unique_count}, Total count: {total_count}, Unique ratio: {unique_ratio:.2f}"
     )
 
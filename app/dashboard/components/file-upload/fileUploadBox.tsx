@@ -24,7 +24,8 @@ export function Dropzone(props: DropzoneProps) {
             }
         },
         accept: {
-            'text/csv': ['.csv']
+            'text/csv': ['.csv'],
+            'application/vnd.apache.parquet': ['.parquet', '.pq']
         },
         maxFiles: 1
     });
@@ -56,7 +57,7 @@ export function Dropzone(props: DropzoneProps) {
                     }
                 }}
             >
-                <input type="file" name={name} required={required} style={{ display: 'none' }} ref={hiddenInputRef} accept=".csv"/>
+                <input type="file" name={name} required={required} style={{ display: 'none' }} ref={hiddenInputRef} accept=".csv,.parquet,.pq"/>
                 <input {...getInputProps()} />
                 <Typography variant="body1" sx={{
                     fontSize: '0.9rem',
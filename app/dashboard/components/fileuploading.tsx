@@ -31,33 +31,30 @@ const FileUploading: React.FC<FileUploadingProps> = ({ callback }) => {
         const file = formData.get("my-file");
 
         if (file) {
-            const fileReader = new FileReader();
-            fileReader.onloadend = async (e) => {
-                if (e.target) {
-                    const csv = e.target.result as string;
+            // Stream the file itself, the server parses CSV or Parquet from disk
+            const uploadData = new FormData();
+            uploadData.append("type", "file_input");
+            uploadData.append("source_file", file as Blob, (file as File).name);
 
-                    const formData = new FormData();
-                    formData.append("type", "csv_input");
-                    formData.append("source_csv", csv);
-
-                    setIsLoadingGlobal(true);
-                    axios.post("/api/matching", 
-                        formData, 
-                    {
-                        ...customHeader,
-                        timeout: 300000, // 3 minutes in milliseconds
-                    }).then((response) => {
-                        console.log(response);
-                        if (response.status === 200) {
-                            getCachedResults({
-                                callback: callback
-                            });
-                        }
-                        setIsLoadingGlobal(false);
-                    })
+            setIsLoadingGlobal(true);
+            axios.post("/api/matching",
+                uploadData,
+            {
+                ...customHeader,
+                timeout: 300000, // 3 minutes in milliseconds
+            }).then((response) => {
+                console.log(response);
+                if (response.status === 200) {
+                    getCachedResults({
+                        callback: callback
+                    });
                 }
-            };
-            fileReader.readAsText(file as Blob);
+                setIsLoadingGlobal(false);
+            }).catch((error) => {
+                // e.g. 400 for a file that cannot be parsed
+                console.error("Error uploading the source:", error.response?.data?.error ?? error);
+                setIsLoadingGlobal(false);
+            })
         }
     }
 
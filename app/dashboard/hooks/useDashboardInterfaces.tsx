@@ -1,5 +1,5 @@
-import { useState, useEffect, useMemo } from 'react';
-import * as d3 from "d3";
+import { useState, useEffect, useMemo, useRef } from 'react';
+import { getSourceColumns, queryCandidates } from '@/app/lib/heatmap/heatmap-helper';
 
 type DashboardInterfacesState = {
     filteredSourceCluster: string[];
@@ -44,33 +44,26 @@ export const {
 
         // useWhatChanged([filters.sourceColumn, filters.selectedMatchers, filters.similarSources, filters.candidateThreshold, filters.candidateType]);
 
-        const weightedCandidates = useMemo(() => {
-            const aggregatedCandidates = Array.from(d3.group(candidates, d => d.sourceColumn + d.targetColumn), ([_, items]) => {
-                return {
-                    sourceColumn: items[0].sourceColumn,
-                    targetColumn: items[0].targetColumn,
-                    matchers: items.map(d => d.matcher).filter((m): m is string => m !== undefined),
-                    score: d3.sum(items, d => d.score * (matchers.find(m => m.name === d.matcher)?.weight ?? 1)),
-                    status: items.some(item => item.status === 'accepted') ? 'accepted' : items.some(item => item.status === 'rejected') ? 'rejected' : (items.every(item => item.status === 'discarded') ? 'discarded' : 'idle'),
-                };
-            }).flat().sort((a, b) => b.score - a.score);
+        // Aggregated, weighted and filtered server-side (/api/candidates/query),
+        // only the rows of the visible source columns are loaded
+        const [filteredSourceColumns, setFilteredSourceColumns] = useState<SourceColumn[]>([]);
+        const [weightedAggregatedCandidates, setWeightedAggregatedCandidates] = useState<AggregatedCandidate[]>([]);
+        const sourceColumnsRequest = useRef(0);
+        const candidatesRequest = useRef(0);
 
-            return aggregatedCandidates;
+        // `candidates` changes whenever the results are refetched, e.g. after a user operation
+        useEffect(() => {
+            const request = ++sourceColumnsRequest.current;
+            getSourceColumns({
+                matchers,
+                callback: (sourceColumns: SourceColumn[]) => {
+                    if (request === sourceColumnsRequest.current) {
+                        setFilteredSourceColumns(sourceColumns);
+                    }
+                },
+            }).catch(() => {});
         }, [candidates, matchers]);
 
-        const filteredSourceColumns = useMemo(() => {
-            const groupedSourceColumns = Array.from(d3.group(weightedCandidates, d => d.sourceColumn), ([name, items]: [string, Candidate[]]) => {
-                return {
-                    name,
-                    status: items.some(item => item.status === 'accepted') ? 'complete' : (items.every(item => item.status === 'discarded') ? 'ignored' : 'incomplete'),
-                    maxScore: Math.floor(((d3.max(items, d => d.score) ?? 0) / 0.1)) * 0.1,
-                } as SourceColumn;
-            });
-
-            return groupedSourceColumns;
-        }, [weightedCandidates]);
-
-
         useEffect(() => {
             setTotalPages(Math.ceil(filteredSourceColumns.length / pageSize));
         }, [filteredSourceColumns, pageSize, setTotalPages]);
@@ -98,25 +91,28 @@ export const {
                 }
             }
             return [];
-        }, [sourceClusters, filters.sourceColumn, filters.similarSources, pageNumber, pageSize]);
-
-        const weightedAggregatedCandidates = useMemo(() => {
+        }, [sourceClusters, filteredSourceColumns, filters.sourceColumn, filters.similarSources, pageNumber, pageSize]);
 
-            let filteredData = [...weightedCandidates];
-            if (filteredSourceCluster && filteredSourceCluster.length > 0) {
-                filteredData = filteredData.filter((d) => filteredSourceCluster.includes(d.sourceColumn));
-            }
-
-            if (filters?.candidateThreshold) {
-                filteredData = filteredData.filter((d) => d.score >= filters.candidateThreshold);
-            }
-
-            if (filters.status.length > 0) {
-                filteredData = filteredData.filter((d) => filters.status.includes(d.status));
+        useEffect(() => {
+            const request = ++candidatesRequest.current;
+            if (filters.sourceColumn === 'all' && filteredSourceCluster.length === 0) {
+                // The page is empty, or its source columns are not loaded yet
+                setWeightedAggregatedCandidates([]);
+                return;
             }
-
-            return filteredData;
-        }, [weightedCandidates, filteredSourceCluster, filters.candidateThreshold, filters.status]);
+            queryCandidates({
+                sourceColumns: filteredSourceCluster && filteredSourceCluster.length > 0 ? filteredSourceCluster : undefined,
+                threshold: filters?.candidateThreshold || undefined,
+                status: filters.status.length > 0 ? filters.status : undefined,
+                matchers,
+                callback: (newCandidates: AggregatedCandidate[]) => {
+                    // Drop the response of a query superseded by a newer one
+                    if (request === candidatesRequest.current) {
+                        setWeightedAggregatedCandidates(newCandidates);
+                    }
+                },
+            }).catch(() => {});
+        }, [candidates, matchers, filteredSourceCluster, filters.sourceColumn, filters.candidateThreshold, filters.status]);
 
         return {
             filteredSourceCluster,
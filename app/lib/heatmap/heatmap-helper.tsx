@@ -5,6 +5,61 @@ import http from 'http';
 import https from 'https';
 import { resolve } from "path";
 
+// Last response of each conditional endpoint, revalidated with If-None-Match
+const etagCache = new Map<string, { etag: string; data: any }>();
+
+// Lists of records sent as dictionary-encoded columns, see api/responses.py
+const COLUMNAR_JSON_MIMETYPE = "application/vnd.bdiviz.columnar+json";
+
+const decodeColumnar = (value: any): any => {
+    if (Array.isArray(value)) {
+        return value.map(decodeColumnar);
+    }
+    if (value === null || typeof value !== "object") {
+        return value;
+    }
+    if (!("$columnar" in value)) {
+        return Object.fromEntries(Object.entries(value).map(([key, item]) => [key, decodeColumnar(item)]));
+    }
+    const { length, columns } = value["$columnar"];
+    const records: any[] = Array.from({ length }, () => ({}));
+    Object.entries(columns).forEach(([key, column]: [string, any]) => {
+        if (column.dictionary) {
+            column.codes.forEach((code: number, i: number) => {
+                records[i][key] = code < 0 ? null : column.dictionary[code];
+            });
+        } else {
+            column.values.forEach((item: any, i: number) => {
+                records[i][key] = decodeColumnar(item);
+            });
+        }
+    });
+    return records;
+};
+
+const postWithETag = (url: string, body: object, cacheKey: string = url) => {
+    const cached = etagCache.get(cacheKey);
+    return axios.post(url, body, {
+        headers: {
+            "Accept": `${COLUMNAR_JSON_MIMETYPE}, application/json;q=0.9`,
+            ...(cached ? { "If-None-Match": cached.etag } : {}),
+        },
+        validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    }).then((response) => {
+        if (response.status === 304 && cached) {
+            return { ...response, data: cached.data };
+        }
+        if (String(response.headers["content-type"]).startsWith(COLUMNAR_JSON_MIMETYPE)) {
+            response.data = decodeColumnar(response.data);
+        }
+        const etag = response.headers["etag"];
+        if (etag) {
+            etagCache.set(cacheKey, { etag, data: response.data });
+        }
+        return response;
+    });
+};
+
 interface getCachedResultsProps {
     callback: (newCandidates: Candidate[], newSourceCluster: SourceCluster[], newMatchers: Matcher[]) => void;
 }
@@ -14,7 +69,7 @@ const getCachedResults = (prop: getCachedResultsProps) => {
         const httpAgent = new http.Agent({ keepAlive: true });
         const httpsAgent = new https.Agent({ keepAlive: true });
 
-        axios.post("/api/results", {
+        postWithETag("/api/results", {
             httpAgent,
             httpsAgent,
             timeout: 10000000, // Set timeout to unlimited
@@ -61,19 +116,103 @@ const getCachedResults = (prop: getCachedResultsProps) => {
     });
 };
 
+// Largest window /api/candidates/query returns, see api/candidate_index
+const QUERY_PAGE_SIZE = 5000;
+
+interface queryCandidatesProps {
+    callback: (candidates: AggregatedCandidate[], total: number) => void;
+    sourceColumns?: string[]; // Only these source columns, all by default
+    status?: string[];
+    threshold?: number;
+    matchers?: Matcher[]; // Fuse scores with these weights instead of the published ones
+}
+
+const matcherWeights = (matchers?: Matcher[]) => {
+    if (!matchers || matchers.length === 0) {
+        return undefined;
+    }
+    return Object.fromEntries(matchers.map((matcher) => [matcher.name, matcher.weight]));
+};
+
+// The aggregated candidates matching the filters, fetched window by window
+const queryCandidates = (prop: queryCandidatesProps) => {
+    return new Promise<void>(async (resolve, reject) => {
+        const filters = {
+            sourceColumns: prop.sourceColumns,
+            status: prop.status,
+            threshold: prop.threshold,
+            matcherWeights: matcherWeights(prop.matchers),
+            limit: QUERY_PAGE_SIZE,
+        };
+        const candidates: AggregatedCandidate[] = [];
+        let cursor: string | null = null;
+        let total = 0;
+        try {
+            do {
+                const body: object = cursor ? { ...filters, cursor } : filters;
+                const response = await postWithETag("/api/candidates/query", body, `/api/candidates/query${JSON.stringify(body)}`);
+                const results = response.data?.results;
+                if (!results || !Array.isArray(results.candidates)) {
+                    throw new Error(response.data?.error ?? "Invalid results format");
+                }
+                candidates.push(...(results.candidates as AggregatedCandidate[]));
+                total = results.total;
+                cursor = results.nextCursor;
+            } while (cursor);
+        } catch (error) {
+            console.error("Error querying candidates:", error);
+            reject(error);
+            return;
+        }
+        console.log("queryCandidates finished!");
+        prop.callback(candidates, total);
+        resolve();
+    });
+};
+
+interface getSourceColumnsProps {
+    callback: (sourceColumns: SourceColumn[]) => void;
+    matchers?: Matcher[];
+}
+
+// Every source column with its status and best score, without its candidates
+const getSourceColumns = (prop: getSourceColumnsProps) => {
+    return new Promise<void>((resolve, reject) => {
+        const body = { matcherWeights: matcherWeights(prop.matchers) };
+        postWithETag("/api/candidates/sources", body, `/api/candidates/sources${JSON.stringify(body)}`).then((response) => {
+            const results = response.data?.results;
+            if (results && Array.isArray(results)) {
+                console.log("getSourceColumns finished!");
+                prop.callback(results as SourceColumn[]);
+                resolve();
+            } else {
+                console.error("Invalid results format");
+                reject(new Error("Invalid results format"));
+            }
+        }).catch((error) => {
+            console.error("Error getting source columns:", error);
+            reject(error);
+        });
+    });
+};
+
 interface getUniqueValuesProps {
     callback: (sourceUniqueValuesArray: SourceUniqueValues[], targetUniqueValuesArray: TargetUniqueValues[]) => void;
+    sourceColumns?: string[]; // Only these source columns, all by default
+    targetColumns?: string[]; // Only these target columns, e.g. the candidates' targets
 }
 
 const getValueBins = (prop: getUniqueValuesProps) => {
     return new Promise<void>((resolve, reject) => {
         const httpAgent = new http.Agent({ keepAlive: true });
         const httpsAgent = new https.Agent({ keepAlive: true });
-        axios.post(`/api/value/bins`, {
+        postWithETag(`/api/value/bins`, {
+            sourceColumns: prop.sourceColumns,
+            targetColumns: prop.targetColumns,
             httpAgent,
             httpsAgent,
             timeout: 10000000, // Set timeout to unlimited
-        }).then((response) => {
+        }, `/api/value/bins${JSON.stringify([prop.sourceColumns, prop.targetColumns])}`).then((response) => {
             const results = response.data?.results;
             if (results.sourceUniqueValues && Array.isArray(results.sourceUniqueValues) && results.targetUniqueValues && Array.isArray(results.targetUniqueValues)) {
                 const sourceUniqueValuesArray = results.sourceUniqueValues.map((result: object) => {
@@ -117,7 +256,7 @@ const getValueMatches = (prop: getValueMatchesProps) => {
     return new Promise<void>((resolve, reject) => {
         const httpAgent = new http.Agent({ keepAlive: true });
         const httpsAgent = new https.Agent({ keepAlive: true });
-        axios.post(`/api/value/matches`, {
+        postWithETag(`/api/value/matches`, {
             httpAgent,
             httpsAgent,
             timeout: 10000000, // Set timeout to unlimited
@@ -193,7 +332,7 @@ const getTargetOntology = (prop: targetOntologyProps) => {
     return new Promise<void>((resolve, reject) => {
         const httpAgent = new http.Agent({ keepAlive: true });
         const httpsAgent = new https.Agent({ keepAlive: true });
-        axios.post("/api/gdc/ontology", {
+        postWithETag("/api/gdc/ontology", {
             httpAgent,
             httpsAgent,
             timeout: 10000000, // Set timeout to unlimited
@@ -431,4 +570,4 @@ interface updateSourceValueProps {
 
 
 
-export { getCachedResults, getValueBins, getValueMatches, getUserOperationHistory, getTargetOntology, applyUserOperation, undoUserOperation, redoUserOperation, getExactMatches, getGDCAttribute, getCandidatesResult };
\ No newline at end of file
+export { getCachedResults, queryCandidates, getSourceColumns, getValueBins, getValueMatches, getUserOperationHistory, getTargetOntology, applyUserOperation, undoUserOperation, redoUserOperation, getExactMatches, getGDCAttribute, getCandidatesResult };
\ No newline at end of file